@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from data_processor import DataProcessor
+from forest_evaluator import FLAT_MAX_ROWS
+from packet_analyzer import PacketAnalyzer, ALL_COLUMNS
+from pcapng_reader import PcapngReader
+from traffic_classifier import TrafficClassifier
+from traffic_visualizer import TrafficVisualizer
+
+DATA_DIR = BASE_DIR / "data"
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+OUTPUT_DIR = BASE_DIR / "results" / "benchmarks"
+
+# Packets per input and timed repetitions of every benchmark, per tier. The parser reads the
+# bundled captures repeated (as extra pcapng sections) up to the tier size; the other stages get
+# packets resampled from them
+TIERS = {
+    "small": {"packets": 10_000, "repeats": 7, "predictions": 500},
+    "medium": {"packets": 100_000, "repeats": 3, "predictions": 1_000},
+    "large": {"packets": 1_000_000, "repeats": 1, "predictions": 2_000},
+}
+
+# A metric this much worse than its baseline is a regression
+DEFAULT_THRESHOLD = 0.25
+
+# Metrics compared against the baseline, and whether higher values are better
+COMPARED_METRICS = {"items_per_s": True, "latency_p50_s": False, "peak_mib": False}
+
+# Rows per batch of the classifier throughput benchmarks: the flattened forest's batch limit, and a
+# batch well above it (predicted by the scikit-learn forest)
+PREDICT_BATCH_ROWS = FLAT_MAX_ROWS
+PREDICT_LARGE_BATCH_ROWS = 50_000
+
+# Timed runs a latency percentile needs before it is reported (the p99 of 7 runs is just their maximum)
+PERCENTILE_MIN_REPEATS = {95: 20, 99: 100}
+
+# Seed of the resampled packets and of the benchmark forest
+SEED = 0
+
+
+def measure(run, items, repeats):
+    """
+    Times a benchmark body and measures its peak memory.
+
+    The body runs once under tracemalloc (Python and NumPy allocations; also a warm-up), then
+    `repeats` times untraced.
+
+    Args:
+        run (callable): Benchmark body, run without arguments.
+        items (int): Items (packets, rows) one run processes.
+        repeats (int): Timed runs.
+
+    Returns:
+        dict: items, repeats, items_per_s (from the median run), latency_p50_s, latency_p95_s,
+            latency_p99_s (None with fewer than PERCENTILE_MIN_REPEATS runs), latency_max_s (per
+            run) and peak_mib.
+    """
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return summarize_times(times, items, peak)
+
+
+def summarize_times(times, items, peak_bytes):
+    """Throughput and latency percentiles of a list of run times (seconds)."""
+    times = np.asarray(times, dtype=np.float64)
+    median = float(np.median(times))
+    tail = {f"latency_p{q}_s": float(np.percentile(times, q)) if len(times) >= repeats else None
+            for q, repeats in PERCENTILE_MIN_REPEATS.items()}
+    return {
+        "items": int(items),
+        "repeats": len(times),
+        "items_per_s": items / median if median > 0 else None,
+        "latency_p50_s": median,
+        **tail,
+        "latency_max_s": float(times.max()),
+        "peak_mib": peak_bytes / (1 << 20),
+    }
+
+
+def bundled_captures():
+    """The .pcapng files in data/, in name order."""
+    return sorted(DATA_DIR.glob("*.pcapng"))
+
+
+def scaled_capture(captures, packets, directory):
+    """
+    Writes a capture of at least `packets` packets by repeating the bundled captures, each copy
+    a new pcapng section (timestamps restart with every copy).
+
+    Returns:
+        tuple: (path, packets in it).
+    """
+    counts = [len(PcapngReader(str(capture)).read_columns()["timestamp"]) for capture in captures]
+    path = Path(directory) / "scaled.pcapng"
+    total = 0
+    with open(path, "wb") as out:
+        while total < packets:
+            for capture, count in zip(captures, counts):
+                out.write(capture.read_bytes())
+                total += count
+    return path, total
+
+
+def scaled_packets(df, packets, seed=SEED):
+    """
+    A packet table of `packets` rows resampled (with replacement) from a parsed one, with the
+    timestamps rebuilt from the resampled inter-packet times so they keep increasing.
+    """
+    rng = np.random.default_rng(seed)
+    scaled = df.iloc[rng.integers(0, len(df), packets)].reset_index(drop=True)
+    gaps = scaled["inter_packet_time"].fillna(0).clip(lower=0).to_numpy(dtype=np.float64)
+    scaled["timestamp"] = df["timestamp"].min() + np.cumsum(gaps)
+    return scaled
+
+
+def benchmark_forest(seed=SEED):
+    """A random forest shaped like the trained classifier (100 trees, the 4 comparison features)."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(mean=[12, 5, 6, -3], sigma=2.0, size=(20_000, 4))
+    y = np.digitize(np.log(X[:, 0]) - np.log(X[:, 1]) + rng.normal(0, 1, len(X)), [5, 6, 7])
+    return RandomForestClassifier(n_estimators=100, max_depth=20, random_state=42).fit(X, y), X
+
+
+def run_suite(tier):
+    """
+    Runs every benchmark of a tier.
+
+    Returns:
+        dict: {benchmark name: measure() metrics}.
+    """
+    settings = TIERS[tier]
+    packets, repeats = settings["packets"], settings["repeats"]
+    captures = bundled_captures()
+    if not captures:
+        raise FileNotFoundError(f"No .pcapng files found in {DATA_DIR}")
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Step 1: Parsing - PacketAnalyzer.extract_features (native backend) on the scaled capture
+        capture, capture_packets = scaled_capture(captures, packets, tmp)
+        parse = lambda: PacketAnalyzer(str(capture), backend="native", columns=ALL_COLUMNS).extract_features()
+        print(f"🔹 parse: {capture_packets} packets")
+        results["parse"] = measure(parse, capture_packets, repeats)
+        parsed = parse()
+
+        # Step 2: Cleaning - DataProcessor.clean_dataframe, with 5% of the numbers missing
+        df = scaled_packets(parsed, packets)
+        raw = df.copy()
+        rng = np.random.default_rng(SEED)
+        for col in ("packet_size", "tcp_seq", "tcp_window", "inter_packet_time"):
+            raw.loc[rng.random(len(raw)) < 0.05, col] = np.nan
+        print(f"🔹 clean: {packets} packets")
+        results["clean"] = measure(lambda: DataProcessor.clean_dataframe(raw.copy()), packets, repeats)
+
+        # Step 3: Per-capture summary - the comparison metrics of process_pcap_file
+        from main import summarize_packets
+        print(f"🔹 summary: {packets} packets")
+        results["summary"] = measure(lambda: summarize_packets(df.copy(), "BENCH"), packets, repeats)
+
+        # Step 4: Rendering - the per-application graphs, all redrawn every run
+        graph_dir = os.path.join(tmp, "graphs")
+        print(f"🔹 render: {packets} packets")
+        results["render"] = measure(
+            lambda: TrafficVisualizer.plot_traffic_characteristics(df, "BENCH", graph_dir, graphs="all"),
+            packets, repeats)
+
+    # Step 5: Inference - single-flow latency and batch throughput, on both sides of FLAT_MAX_ROWS
+    model, X = benchmark_forest()
+    classifier = TrafficClassifier(model, feature_columns=[0, 1, 2, 3])
+    rows = X[:settings["predictions"]]
+    tracemalloc.start()
+    classifier.predict(rows[:1])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        classifier.predict(row[None, :])
+        times.append(time.perf_counter() - start)
+    print(f"🔹 predict_single: {len(rows)} predictions")
+    results["predict_single"] = summarize_times(times, 1, peak)
+    batch = X[:PREDICT_BATCH_ROWS]
+    print(f"🔹 predict_batch: {len(batch)} rows per batch")
+    results["predict_batch"] = measure(lambda: classifier.predict(batch), len(batch), max(repeats, 5))
+    large_batch = X[np.arange(PREDICT_LARGE_BATCH_ROWS) % len(X)]
+    print(f"🔹 predict_large_batch: {len(large_batch)} rows per batch")
+    results["predict_large_batch"] = measure(lambda: classifier.predict(large_batch), len(large_batch), repeats)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares benchmark metrics with their baseline.
+
+    Args:
+        results (dict): {benchmark: metrics} of this run.
+        baseline (dict): {benchmark: metrics} to compare with (benchmarks missing from it are skipped).
+        threshold (float): Relative change of a metric, in its bad direction, that is a regression.
+
+    Returns:
+        pd.DataFrame: One row per compared metric: benchmark, metric, baseline, current, change
+            (relative, positive = better) and regression.
+    """
+    rows = []
+    for name, metrics in results.items():
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = baseline.get(name, {}).get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before if higher_is_better else (before - after) / before
+            rows.append({"benchmark": name, "metric": metric, "baseline": before, "current": after,
+                         "change": change, "regression": change < -threshold})
+    return pd.DataFrame(rows, columns=["benchmark", "metric", "baseline", "current", "change", "regression"])
+
+
+def environment():
+    """Machine and library versions the numbers were measured with."""
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(description="Time the parser, cleaning, summary, graphs and classifier")
+    parser.add_argument("--tier", choices=list(TIERS), default="small",
+                        help="Input size: " + ", ".join(f"{name} ({tier['packets']:,} packets)" for name, tier in TIERS.items()))
+    parser.add_argument("--output", default=None,
+                        help="JSON report (default: results/benchmarks/<tier>.json)")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="Baseline JSON (default: benchmarks/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Relative slowdown (or memory growth) reported as a regression (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the tier's baseline")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_suite(args.tier)
+    report = {"tier": args.tier, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(),
+              "benchmarks": results}
+
+    output = Path(args.output) if args.output else OUTPUT_DIR / f"{args.tier}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(pd.DataFrame(results).T[["items", "items_per_s", "latency_p50_s", "latency_p95_s", "peak_mib"]].to_string())
+    print(f"✅ Report saved in {output}")
+
+    baselines = json.loads(Path(args.baseline).read_text()) if os.path.exists(args.baseline) else {}
+    if args.update_baseline:
+        baselines[args.tier] = report
+        tmp_file = args.baseline + ".tmp"
+        Path(tmp_file).write_text(json.dumps(baselines, indent=2))
+        shutil.move(tmp_file, args.baseline)
+        print(f"✅ Baseline of the {args.tier} tier saved in {args.baseline}")
+    elif args.tier in baselines:
+        comparison = compare(results, baselines[args.tier]["benchmarks"], args.threshold)
+        print(comparison.to_string(index=False))
+        regressions = comparison[comparison["regression"]]
+        if not regressions.empty:
+            print(f"❌ {len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"✅ No regression beyond {args.threshold:.0%}")
+    else:
+        print(f"⚠ No {args.tier} baseline in {args.baseline}: run with --update-baseline to store one")
@@ -4,9 +4,10 @@ class DataCleaner:
     Handles missing values and cleans only relevant dataset columns.
     """
 
-    def __init__(self, df, feature_columns):
+    def __init__(self, df, feature_columns, verbose=True):
         self.df = df
         self.feature_columns = feature_columns
+        self.verbose = verbose  # False for the chunks of the chunked pipeline
 
     def clean_data(self):
         """Cleans only the columns used in feature selection."""
@@ -17,7 +18,8 @@ class DataCleaner:
             for col in self.feature_columns:
                 self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
 
-            print("Relevant data cleaned successfully.")
+            if self.verbose:
+                print("Relevant data cleaned successfully.")
             return self.df
         except Exception as e:
             print(f"Error during data cleaning: {e}")
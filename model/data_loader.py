@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 
+# Rows per chunk read by iter_chunks()
+DEFAULT_CHUNK_ROWS = 500_000
 
 class DataLoader:
 	"""
@@ -32,3 +34,10 @@ class DataLoader:
 		except Exception as e:
 			print(f"Error loading data: {e}")
 			return None
+
+	def iter_chunks(self, columns, dtypes=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+		"""Reads the CSV file in chunks of chunk_rows rows, parsing only the given columns into the given dtypes."""
+		if not self.file_path.endswith(".csv"):
+			raise ValueError(f"Chunked reading needs a CSV file, got {self.file_path}")
+		with pd.read_csv(self.file_path, usecols=columns, dtype=dtypes, chunksize=chunk_rows) as reader:
+			yield from reader
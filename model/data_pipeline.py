@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DataLoader, DEFAULT_CHUNK_ROWS
+from data_cleaner import DataCleaner
+from feature_engineering import FeatureEngineer
+
+# Raw columns the features are built from, with explicit types. Counts are read as floats: they
+# stay in the CSV parser's fast path and keep missing values as NaN until cleaning drops the row
+# (nullable integer columns parse about 3x slower). float64 holds byte counts exactly up to 2^53,
+# float32 packet counts up to 2^24
+RAW_DTYPES = {
+    "BYTES": "float64",
+    "BYTES_REV": "float64",
+    "PACKETS": "float32",
+    "PACKETS_REV": "float32",
+    "PKT_LENGTHS_MEAN": "float32",
+    "INTERVALS_MEAN": "float32",
+    "TYPE": "category",
+}
+
+# Engineered features (see FeatureEngineer) and their types in the feature file
+FEATURE_DTYPES = {
+    "Flow_Size": "uint64",
+    "Flow_Volume": "uint32",
+    "Avg_Packet_Size": "float32",
+    "Inter_Packet_Time_Mean": "float32",
+}
+FEATURE_COLUMNS = list(FEATURE_DTYPES)
+TARGET_COLUMN = "TYPE"
+
+
+class FeaturePipeline:
+    """
+    Builds the training feature set from a dataset larger than memory.
+
+    The raw CSV is read in chunks of chunk_rows rows, parsing only RAW_DTYPES's columns with
+    compact types; each chunk is cleaned (DataCleaner) and engineered (FeatureEngineer), and only
+    the features and the label are appended to a Parquet file, one row group per chunk. At most
+    one raw chunk is in memory at a time, and training reads just the (typed, compressed) feature
+    columns back.
+    """
+
+    def __init__(self, source_file, feature_file, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Args:
+            source_file (str): Raw labelled dataset (CSV).
+            feature_file (str): Parquet file the feature set is written to.
+            chunk_rows (int): Raw rows per chunk.
+        """
+        self.source_file = source_file
+        self.feature_file = feature_file
+        self.chunk_rows = chunk_rows
+
+    def is_current(self):
+        """True if the feature file exists and is not older than the raw dataset."""
+        return os.path.exists(self.feature_file) and (not os.path.exists(self.source_file) or
+                                                      os.path.getmtime(self.feature_file) >= os.path.getmtime(self.source_file))
+
+    def build(self):
+        """
+        Streams the raw dataset into the feature file (written to a temporary file, then renamed).
+
+        Returns:
+            tuple: (raw rows read, feature rows written).
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not os.path.exists(self.source_file):
+            raise FileNotFoundError(f"Dataset not found at {self.source_file}")
+        os.makedirs(os.path.dirname(os.path.abspath(self.feature_file)), exist_ok=True)
+
+        schema = pa.schema([(name, pa.from_numpy_dtype(np.dtype(dtype))) for name, dtype in FEATURE_DTYPES.items()]
+                           + [(TARGET_COLUMN, pa.string())])
+        tmp_file = self.feature_file + ".tmp"
+        rows_read = rows_written = 0
+        try:
+            with pq.ParquetWriter(tmp_file, schema, compression="snappy") as writer:
+                for chunk in DataLoader(self.source_file).iter_chunks(list(RAW_DTYPES), RAW_DTYPES, self.chunk_rows):
+                    rows_read += len(chunk)
+                    features = self._process_chunk(chunk)
+                    if features.empty:
+                        continue
+                    writer.write_table(pa.Table.from_pandas(features, schema=schema, preserve_index=False))
+                    rows_written += len(features)
+            os.replace(tmp_file, self.feature_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        print(f"✅ {rows_written} of {rows_read} rows written to {self.feature_file}")
+        return rows_read, rows_written
+
+    def load(self, columns=None):
+        """
+        Reads the feature set (or some of its columns) for training.
+
+        Returns:
+            pd.DataFrame: Features in FEATURE_DTYPES types, with the label as a categorical.
+        """
+        import pyarrow.parquet as pq
+
+        columns = columns or FEATURE_COLUMNS + [TARGET_COLUMN]
+        categorical = [TARGET_COLUMN] if TARGET_COLUMN in columns else None
+        table = pq.read_table(self.feature_file, columns=columns, read_dictionary=categorical)
+        return table.to_pandas()
+
+    @staticmethod
+    def _process_chunk(chunk):
+        """Cleans and engineers one raw chunk; returns its feature columns and label."""
+        numeric_columns = [col for col in RAW_DTYPES if col != TARGET_COLUMN]
+        chunk = DataCleaner(chunk.dropna(subset=[TARGET_COLUMN]), numeric_columns, verbose=False).clean_data()
+        if chunk is None or chunk.empty:
+            return pd.DataFrame(columns=FEATURE_COLUMNS + [TARGET_COLUMN])
+        chunk = FeatureEngineer(chunk, verbose=False).extract_features()
+        features = chunk[FEATURE_COLUMNS].astype(FEATURE_DTYPES)
+        features[TARGET_COLUMN] = chunk[TARGET_COLUMN].astype(str)
+        return features
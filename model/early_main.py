@@ -0,0 +1,115 @@
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DataLoader
+from data_cleaner import DataCleaner
+from data_splitter import DataSplitter
+from train_model import ModelTrainer
+
+# Define file paths (built by `python src/main.py --early-dataset`)
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+data_file_path = os.path.join(MODEL_DIR, "..", "processed_data", "early_flows.csv")
+report_path = os.path.join(MODEL_DIR, "..", "processed_data", "early_accuracy.csv")
+target_column = "TYPE"
+
+# Packet counts a companion model is trained and scored for
+PACKET_COUNTS = (1, 2, 4, 8, 16, 32)
+
+# Packet feature columns of the dataset: Packet_Size_1, Packet_Direction_1, Inter_Packet_Time_1, ...
+PACKET_COLUMN = re.compile(r"^(Packet_Size|Packet_Direction|Inter_Packet_Time)_(\d+)$")
+
+
+def early_model_path(packets):
+    """File of the companion model that classifies flows on their first `packets` packets."""
+    return os.path.join(MODEL_DIR, f"early_model_{packets}.pkl")
+
+
+def prefix_columns(columns, packets):
+    """Feature columns of the first `packets` packets, in dataset order."""
+    return [col for col in columns if PACKET_COLUMN.match(col) and int(PACKET_COLUMN.match(col).group(2)) <= packets]
+
+
+def train_early_models(df, packet_counts=PACKET_COUNTS):
+    """
+    Trains one model per packet count on the first N packets of each flow and scores it.
+
+    Args:
+        df (pd.DataFrame): Cleaned early-flow dataset (one row per flow, TYPE labels).
+        packet_counts (tuple): Values of N.
+
+    Returns:
+        pd.DataFrame: One row per N: accuracy on the test set, the share of test flows decided at
+            their N-th packet (the others expire first and are decided on what they sent) and the
+            median capture time from a flow's first packet to its N-th.
+    """
+    available = max(int(PACKET_COLUMN.match(col).group(2)) for col in df.columns if PACKET_COLUMN.match(col))
+    report = []
+    for packets in packet_counts:
+        if packets > available:
+            print(f"⚠ The dataset only has the first {available} packets of each flow, skipping N={packets}")
+            continue
+        feature_columns = prefix_columns(df.columns, packets)
+
+        # Step 1: Split on the flows' first N packets
+        print(f"\n🔹 N={packets}: Splitting Data")
+        data_splitter = DataSplitter(df[feature_columns + ["Flow_Volume", target_column]], target_column)
+        X_train, X_test, y_train, y_test = data_splitter.split_data()
+        if X_train is None or X_train.empty or X_test.empty:
+            print("❌ Error: Data split failed, training or test set is empty.")
+            continue
+        volume = X_test["Flow_Volume"].to_numpy()
+        X_train, X_test = X_train[feature_columns], X_test[feature_columns]
+
+        # Step 2: Train and score the companion model
+        model_trainer = ModelTrainer(X_train, X_test, y_train, y_test, model_path=early_model_path(packets))
+        model = model_trainer.train()
+        reached = volume >= packets
+        time_to_decision = X_test[[f"Inter_Packet_Time_{i}" for i in range(1, packets + 1)]].sum(axis=1)[reached]
+        report.append({
+            "Packets": packets,
+            "Accuracy": model.score(X_test, y_test),
+            "Decided_Early": reached.mean(),
+            "Time_To_Nth_Packet_Median": float(np.median(time_to_decision)) if reached.any() else None,
+            "Train_Flows": len(X_train),
+            "Test_Flows": len(X_test),
+        })
+    return pd.DataFrame(report)
+
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(description="Train early-classification models on the first N packets of each flow")
+    parser.add_argument("--packets", type=int, nargs="+", default=list(PACKET_COUNTS),
+                        help=f"Values of N to train and score (default: {' '.join(map(str, PACKET_COUNTS))})")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Step 1: Load Data
+    print("\n🔹 Step 1: Loading Data")
+    df = DataLoader(data_file_path).load_data()
+    if df is None or df.empty:
+        print("❌ Error: Failed to load data or dataset is empty. Run `python src/main.py --early-dataset` first.")
+        exit()
+
+    # Step 2: Data Cleaning - the labels stay strings
+    print("\n🔹 Step 2: Cleaning Data")
+    packet_columns = prefix_columns(df.columns, max(args.packets))
+    df = DataCleaner(df, packet_columns + ["Flow_Volume"]).clean_data()
+    if df is None or df.empty:
+        print("❌ Error: Data cleaning failed, dataset is empty.")
+        exit()
+    df[target_column] = df[target_column].astype(str)
+
+    # Step 3: One model per N, and the accuracy of each
+    report = train_early_models(df, tuple(args.packets))
+    print("\n🔹 Accuracy per number of packets:")
+    print(report.to_string(index=False))
+    report.to_csv(report_path, index=False)
+    print(f"\n✅ Report saved in {os.path.abspath(report_path)}")
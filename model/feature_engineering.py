@@ -3,8 +3,9 @@ class FeatureEngineer:
     Processes raw data and extracts relevant features for model training.
     """
 
-    def __init__(self, df):
+    def __init__(self, df, verbose=True):
         self.df = df
+        self.verbose = verbose  # False for the chunks of the chunked pipeline
 
     def extract_features(self):
         """Creates Flow_Size, Flow_Volume, Avg_Packet_Size, Inter_Packet_Time_Mean, RTT."""
@@ -19,7 +20,8 @@ class FeatureEngineer:
         for feature, columns in feature_mappings.items():
             missing_columns = [col for col in columns if col not in self.df.columns]
             if missing_columns:
-                print(f"Warning: Missing columns {missing_columns} for '{feature}', skipping this feature.")
+                if self.verbose:
+                    print(f"Warning: Missing columns {missing_columns} for '{feature}', skipping this feature.")
                 continue  # Skip this feature if required columns are missing
 
             if len(columns) == 2:
@@ -27,5 +29,6 @@ class FeatureEngineer:
             else:
                 self.df[feature] = self.df[columns[0]]
 
-        print("Feature extraction completed.")
+        if self.verbose:
+            print("Feature extraction completed.")
         return self.df
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+# Shared file helpers (FileManager.write_atomic) live in src/
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+from file_manager import FileManager
+
+# Define file paths: the promoted model is the one src/main.py classifies with
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(MODEL_DIR, "my_trained_model.pkl")
+SNAPSHOT_DIR = os.path.join(MODEL_DIR, "snapshots")
+TARGET_COLUMN = "TYPE"
+
+# Trees added per update, trained on the new rows plus a replay sample of earlier ones
+DEFAULT_UPDATE_TREES = 20
+
+# Rows of earlier data replayed into every update (split evenly between the classes), so the new
+# trees still see every class; the update cost depends on this and the new data, not on the history
+DEFAULT_REPLAY_ROWS = 20_000
+
+# Holdout accuracy a candidate may lose against the promoted model and still be promoted
+DEFAULT_TOLERANCE = 0.0
+
+
+class IncrementalTrainer:
+    """
+    Grows the trained forest with new labelled data instead of retraining it from scratch.
+
+    An update fits a few trees on the new rows plus a bounded, class-stratified replay sample of
+    all earlier rows, appends them to the promoted forest (dropping the oldest trees beyond
+    max_trees) and saves the result as a new numbered snapshot. The snapshot replaces
+    my_trained_model.pkl only if its accuracy on a held-out set is no worse (within tolerance) than
+    the promoted model's. snapshots/manifest.json records every version, its parent, size, holdout
+    accuracy and whether it was promoted, so any earlier version can be promoted back.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, snapshot_dir=SNAPSHOT_DIR, update_trees=DEFAULT_UPDATE_TREES,
+                 replay_rows=DEFAULT_REPLAY_ROWS, max_trees=None, tolerance=DEFAULT_TOLERANCE, seed=42):
+        """
+        Args:
+            model_path (str): The promoted model (a pickled RandomForestClassifier).
+            snapshot_dir (str): Directory of the versioned snapshots, the manifest and the replay sample.
+            update_trees (int): Trees added per update.
+            replay_rows (int): Size of the replay sample of earlier rows.
+            max_trees (int): Forest size cap; the oldest trees are dropped first (None: no cap).
+            tolerance (float): Holdout accuracy a candidate may lose and still be promoted.
+            seed (int): Base seed of the replay sample and of the new trees.
+        """
+        self.model_path = model_path
+        self.snapshot_dir = snapshot_dir
+        self.update_trees = update_trees
+        self.replay_rows = replay_rows
+        self.max_trees = max_trees
+        self.tolerance = tolerance
+        self.seed = seed
+        self.manifest_path = os.path.join(snapshot_dir, "manifest.json")
+        self.replay_path = os.path.join(snapshot_dir, "replay.parquet")
+
+    def history(self):
+        """Every snapshot version, oldest first (see the class docstring)."""
+        return pd.DataFrame(self._load_manifest())
+
+    def start(self, model, X, y):
+        """
+        Registers a model trained from scratch (e.g. by ModelTrainer) as the promoted version, and
+        seeds the replay sample with its training data.
+
+        Returns:
+            dict: The manifest entry of the new version.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self._save_replay(self._sample(X.assign(**{TARGET_COLUMN: np.asarray(y)}), version=0))
+        entry = self._snapshot(model, parent=None, rows=len(X), accuracy=None, seconds=0.0)
+        self._promote(entry["version"])
+        return entry
+
+    def update(self, X_new, y_new, X_holdout, y_holdout):
+        """
+        Adds trees trained on new labelled rows, and promotes the result if it passes the holdout check.
+
+        Args:
+            X_new, y_new: New training rows (same feature columns as the model).
+            X_holdout, y_holdout: Held-out rows the candidate and the promoted model are scored on.
+
+        Returns:
+            dict: The manifest entry of the new version (version, accuracy, promoted_accuracy,
+                promoted, trees, seconds...).
+        """
+        start = time.perf_counter()
+        entries = self._load_manifest()
+        current = next((entry for entry in reversed(entries) if entry["promoted"]), None)
+        if current is None:
+            raise RuntimeError("No promoted version yet: register the trained model with start() first")
+        model = self._load_model(self.model_path)
+        version = entries[-1]["version"] + 1
+
+        # Step 1: New rows plus the replay sample; a label the forest has never seen needs a full retrain
+        new = X_new.assign(**{TARGET_COLUMN: np.asarray(y_new)})
+        unknown = sorted(set(new[TARGET_COLUMN]) - set(model.classes_))
+        if unknown:
+            raise ValueError(f"New classes {unknown}: retrain the model from scratch (ModelTrainer)")
+        replay = self._load_replay()
+        training = pd.concat([new, replay.drop(columns="priority")], ignore_index=True)
+        missing = sorted(set(model.classes_) - set(training[TARGET_COLUMN]))
+        if missing:
+            raise ValueError(f"Neither the new rows nor the replay sample have the classes {missing}")
+
+        # Step 2: Fit the new trees with the forest's own settings and append them
+        params = dict(model.get_params(), n_estimators=self.update_trees, warm_start=False,
+                      random_state=self.seed + version)
+        features = list(X_new.columns)
+        added = RandomForestClassifier(**params).fit(training[features], training[TARGET_COLUMN])
+        model.estimators_ = model.estimators_ + added.estimators_
+        if self.max_trees is not None and len(model.estimators_) > self.max_trees:
+            model.estimators_ = model.estimators_[-self.max_trees:]
+        model.n_estimators = len(model.estimators_)
+
+        # Step 3: Holdout check against the promoted model
+        accuracy = model.score(X_holdout[features], y_holdout)
+        promoted_accuracy = self._load_model(self.model_path).score(X_holdout[features], y_holdout)
+        self._save_replay(self._sample(pd.concat([replay, self._with_priority(new, version)], ignore_index=True),
+                                       version))
+        entry = self._snapshot(model, parent=current["version"], rows=len(X_new), accuracy=accuracy,
+                               seconds=time.perf_counter() - start, promoted_accuracy=promoted_accuracy)
+        if accuracy >= promoted_accuracy - self.tolerance:
+            self._promote(entry["version"])
+            entry["promoted"] = True
+            print(f"✅ Version {version} promoted: holdout accuracy {accuracy:.3f} "
+                  f"(was {promoted_accuracy:.3f}), {model.n_estimators} trees")
+        else:
+            print(f"⚠ Version {version} kept as a snapshot only: holdout accuracy {accuracy:.3f} "
+                  f"< {promoted_accuracy:.3f}")
+        return entry
+
+    def promote(self, version):
+        """Makes a snapshot (e.g. an earlier version, to roll back) the promoted model."""
+        if not any(entry["version"] == version for entry in self._load_manifest()):
+            raise ValueError(f"No snapshot version {version}")
+        self._promote(version)
+        print(f"✅ Version {version} promoted")
+
+    def _snapshot(self, model, parent, rows, accuracy, seconds, promoted_accuracy=None):
+        """Saves a model as the next version and records it in the manifest (not promoted yet)."""
+        entries = self._load_manifest()
+        version = entries[-1]["version"] + 1 if entries else 1
+        path = self._snapshot_path(version)
+        FileManager.write_atomic(path, lambda f: pickle.dump(model, f))
+        entry = {
+            "version": version,
+            "parent": parent,
+            "file": os.path.basename(path),
+            "trees": len(model.estimators_),
+            "rows": rows,
+            "accuracy": accuracy,
+            "promoted_accuracy": promoted_accuracy,
+            "seconds": seconds,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "promoted": False,
+        }
+        self._save_manifest(entries + [entry])
+        return entry
+
+    def _promote(self, version):
+        """Copies a snapshot over the promoted model (a fresh copy, so src/ re-exports its flattened forest)."""
+        with open(self._snapshot_path(version), "rb") as snapshot:
+            FileManager.write_atomic(self.model_path, lambda f: shutil.copyfileobj(snapshot, f))
+        entries = self._load_manifest()
+        for entry in entries:
+            entry["promoted"] = entry["version"] == version
+        self._save_manifest(entries)
+
+    def _sample(self, rows, version):
+        """
+        Keeps at most replay_rows rows, the same number per class, by lowest random priority.
+
+        Each row keeps the priority it got when it arrived, so the sample stays a uniform sample of
+        each class's whole history however many updates it went through.
+        """
+        if "priority" not in rows.columns:
+            rows = self._with_priority(rows, version)
+        per_class = max(self.replay_rows // max(rows[TARGET_COLUMN].nunique(), 1), 1)
+        rows = rows.sort_values("priority", kind="stable")
+        return rows.groupby(TARGET_COLUMN, sort=False, observed=True).head(per_class).reset_index(drop=True)
+
+    def _with_priority(self, rows, version):
+        return rows.assign(priority=np.random.default_rng(self.seed + version).random(len(rows)))
+
+    def _load_replay(self):
+        return pd.read_parquet(self.replay_path)
+
+    def _save_replay(self, replay):
+        replay = replay.assign(**{TARGET_COLUMN: replay[TARGET_COLUMN].astype(str)})
+        FileManager.write_atomic(self.replay_path, lambda f: replay.to_parquet(f, index=False))
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _save_manifest(self, entries):
+        FileManager.write_atomic(self.manifest_path, lambda f: f.write(json.dumps(entries, indent=2).encode()))
+
+    def _snapshot_path(self, version):
+        name = os.path.splitext(os.path.basename(self.model_path))[0]
+        return os.path.join(self.snapshot_dir, f"{name}.v{version:04d}.pkl")
+
+    @staticmethod
+    def _load_model(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def _load_features(path):
+    """Feature set of a labelled dataset: raw CSVs go through the chunked FeaturePipeline first."""
+    from data_pipeline import FeaturePipeline
+
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    feature_file = os.path.splitext(path)[0] + "_features.parquet"
+    pipeline = FeaturePipeline(path, feature_file)
+    if not pipeline.is_current():
+        pipeline.build()
+    return pipeline.load()
+
+
+if __name__ == "__main__":
+    from data_pipeline import FEATURE_COLUMNS
+
+    parser = argparse.ArgumentParser(description="Add trees trained on new labelled data to the trained forest")
+    parser.add_argument("new_data", help="New labelled rows: a raw dataset CSV or a feature-set Parquet file")
+    parser.add_argument("--holdout", required=True, help="Held-out labelled rows (same formats) for the promotion check")
+    parser.add_argument("--trees", type=int, default=DEFAULT_UPDATE_TREES,
+                        help=f"Trees added by this update (default: {DEFAULT_UPDATE_TREES})")
+    parser.add_argument("--max-trees", type=int, default=None, help="Drop the oldest trees beyond this forest size")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Holdout accuracy the update may lose and still be promoted (default: 0)")
+    args = parser.parse_args()
+
+    new_rows = _load_features(args.new_data)
+    holdout = _load_features(args.holdout)
+    trainer = IncrementalTrainer(update_trees=args.trees, max_trees=args.max_trees, tolerance=args.tolerance)
+    print(f"\n🔹 Updating the model with {len(new_rows)} new rows")
+    trainer.update(new_rows[FEATURE_COLUMNS], new_rows[TARGET_COLUMN], holdout[FEATURE_COLUMNS], holdout[TARGET_COLUMN])
+    print(trainer.history().to_string(index=False))
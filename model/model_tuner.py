@@ -0,0 +1,201 @@
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import KFold, StratifiedKFold
+
+# Shared file helpers (FileManager.write_atomic) live in src/
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+from file_manager import FileManager
+
+# Default search space: forest size, depth and leaf settings
+PARAM_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 10, 20],
+    "min_samples_leaf": [1, 2, 5],
+    "max_features": ["sqrt", None],
+}
+
+# Cross-validation folds and their seed (part of the cache key, like the data)
+DEFAULT_FOLDS = 5
+DEFAULT_SEED = 42
+
+# Fold splits and per-fold scores (and, with keep_models, fitted models) live here between runs
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tuning_cache")
+
+
+class ModelTuner:
+    """
+    Cross-validated random-forest parameter search that runs on all cores and resumes.
+
+    Every (candidate, fold) pair is an independent task run by a joblib process pool. The fold
+    assignment of the data is saved once, and each finished task saves its scores and timings
+    (and, with keep_models, its fitted model) under a key of the data, the folds and the
+    candidate's parameters. A search that is interrupted, or re-run with a larger grid, only fits
+    the pairs that are not in the cache.
+    """
+
+    def __init__(self, X, y, folds=DEFAULT_FOLDS, seed=DEFAULT_SEED, cache_dir=DEFAULT_CACHE_DIR, n_jobs=-1,
+                 keep_models=False):
+        """
+        Args:
+            X (pd.DataFrame): Training features.
+            y (pd.Series): Training labels.
+            folds (int): Cross-validation folds.
+            seed (int): Seed of the fold split and of every forest.
+            cache_dir (str): Directory of the cached folds, scores and models.
+            n_jobs (int): Worker processes (-1: one per core).
+            keep_models (bool): Also cache the fitted model of every (candidate, fold) pair (the cache
+                grows by one forest per pair, without a size cap; off by default).
+        """
+        self.X = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+        self.y = np.asarray(y).astype(str)
+        self.folds = folds
+        self.seed = seed
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+        self.keep_models = keep_models
+        self.data_key = ModelTuner._digest(self.X.tobytes(), self.y.tobytes(), str(self.X.shape))
+        self.best_params = None  # Set by search()
+
+    @staticmethod
+    def candidates(param_grid):
+        """Expands a grid ({name: [values]}) into one parameter dict per candidate."""
+        names = sorted(param_grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+    def fold_ids(self):
+        """
+        Fold of every training row, split once and then read from the cache.
+
+        Returns:
+            np.ndarray: Fold number (0 .. folds - 1) per row.
+        """
+        path = os.path.join(self.cache_dir, f"folds_{self._digest(self.data_key, self.folds, self.seed)}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+
+        # Stratified when every class can appear in every fold
+        _, counts = np.unique(self.y, return_counts=True)
+        if counts.min() >= self.folds:
+            splitter = StratifiedKFold(self.folds, shuffle=True, random_state=self.seed)
+        else:
+            splitter = KFold(self.folds, shuffle=True, random_state=self.seed)
+        fold_ids = np.empty(len(self.y), dtype=np.int8)
+        for fold, (_, test_rows) in enumerate(splitter.split(self.X, self.y)):
+            fold_ids[test_rows] = fold
+        FileManager.write_atomic(path, lambda f: np.save(f, fold_ids))
+        return fold_ids
+
+    def search(self, param_grid=PARAM_GRID):
+        """
+        Scores every candidate of a grid with cross-validation, fitting only the uncached folds.
+
+        Returns:
+            pd.DataFrame: One row per candidate, best first: its parameters, candidate (position in
+                the grid), mean_accuracy, std_accuracy, fit_seconds (wall-clock seconds of its fits,
+                summed over folds), predict_seconds and cached (folds read from the cache instead of fitted).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fold_ids = self.fold_ids()
+        candidates = ModelTuner.candidates(param_grid)
+
+        # Step 1: Read the finished (candidate, fold) pairs, queue the others
+        results, tasks = {}, []
+        for i, params in enumerate(candidates):
+            for fold in range(self.folds):
+                key = self._task_key(params, fold)
+                cached = self._load_result(key)
+                if cached is not None:
+                    results[(i, fold)] = dict(cached, cached=True)
+                else:
+                    tasks.append((i, fold, key))
+        print(f"🔹 {len(candidates)} candidates x {self.folds} folds: "
+              f"{len(results)} cached, {len(tasks)} to fit")
+
+        # Step 2: Fit the queued pairs in parallel; every finished pair is cached at once
+        if tasks:
+            parallel = joblib.Parallel(n_jobs=self.n_jobs, return_as="generator_unordered")
+            done = 0
+            for i, fold, result in parallel(
+                    joblib.delayed(_fit_fold)(self.X, self.y, fold_ids, fold, candidates[i], self.seed,
+                                              self._result_path(key), self._model_path(key) if self.keep_models else None, i)
+                    for i, fold, key in tasks):
+                results[(i, fold)] = dict(result, cached=False)
+                done += 1
+                print(f"🔹 [{done}/{len(tasks)}] {candidates[i]} fold {fold}: "
+                      f"accuracy {result['accuracy']:.3f} in {result['fit_seconds']:.2f} s")
+
+        # Step 3: One row per candidate
+        rows = []
+        for i, params in enumerate(candidates):
+            per_fold = [results[(i, fold)] for fold in range(self.folds)]
+            accuracy = np.array([result['accuracy'] for result in per_fold])
+            rows.append(dict(params,
+                             candidate=i,
+                             mean_accuracy=accuracy.mean(),
+                             std_accuracy=accuracy.std(),
+                             fit_seconds=sum(result['fit_seconds'] for result in per_fold),
+                             predict_seconds=sum(result['predict_seconds'] for result in per_fold),
+                             cached=sum(result['cached'] for result in per_fold)))
+        report = pd.DataFrame(rows)
+        for name in sorted(param_grid):
+            report[name] = pd.Series([params[name] for params in candidates], dtype=object)  # Keeps None as None
+        report = report.sort_values(["mean_accuracy", "fit_seconds"], ascending=[False, True]).reset_index(drop=True)
+        self.best_params = candidates[report["candidate"].iloc[0]]
+        return report
+
+    def load_model(self, params, fold):
+        """Returns the cached model of a (candidate, fold) pair, or None."""
+        path = self._model_path(self._task_key(params, fold))
+        return joblib.load(path) if os.path.exists(path) else None
+
+    def _task_key(self, params, fold):
+        return self._digest(self.data_key, self.folds, self.seed, fold, json.dumps(params, sort_keys=True))
+
+    def _result_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _model_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def _load_result(self, key):
+        try:
+            with open(self._result_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _digest(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else repr(part).encode())
+            digest.update(b"|")
+        return digest.hexdigest()[:32]
+
+
+def _fit_fold(X, y, fold_ids, fold, params, seed, result_path, model_path, candidate):
+    """Pool task: fits one candidate on all folds but one, scores it on that fold and caches the outcome."""
+    train_rows, test_rows = fold_ids != fold, fold_ids == fold
+    model = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(X[train_rows], y[train_rows])
+    fitted = time.perf_counter()
+    accuracy = float((model.predict(X[test_rows]) == y[test_rows]).mean())
+    result = {"accuracy": accuracy, "fit_seconds": fitted - start, "predict_seconds": time.perf_counter() - fitted}
+
+    # The model first: a result file means the pair is complete
+    if model_path is not None:
+        FileManager.write_atomic(model_path, lambda f: joblib.dump(model, f))
+    FileManager.write_atomic(result_path, lambda f: f.write(json.dumps(result).encode()))
+    return candidate, fold, result
@@ -8,15 +8,18 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
+from model_tuner import ModelTuner, PARAM_GRID
+
 class ModelTrainer:
-    def _init_(self, X_train, X_test, y_train, y_test):
+    def __init__(self, X_train, X_test, y_train, y_test, model_path="model/my_trained_model.pkl"):
         """
-        Initializes the ModelTrainer with training and testing data.
+        Initializes the ModelTrainer with training and testing data, and the file the trained model is saved to.
         """
         self.X_train = X_train
         self.X_test = X_test
         self.y_train = y_train
         self.y_test = y_test
+        self.model_path = model_path
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
 
     def train(self):
@@ -32,9 +35,8 @@ class ModelTrainer:
             self.model.fit(self.X_train, self.y_train)
             print("🔹 After training, model:", self.model)
 
-            os.makedirs("model", exist_ok=True)
-
-            path = os.path.abspath("model/my_trained_model.pkl")
+            path = os.path.abspath(self.model_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
             with open(path, 'wb') as f:
                 pickle.dump(self.model, f)
             print(f"Model saved at: {path}")
@@ -48,6 +50,23 @@ class ModelTrainer:
         return self.model
 
 
+    def tune(self, param_grid=PARAM_GRID, **tuner_options):
+        """
+        Cross-validates the candidates of a forest size/depth/leaf grid on the training set across all
+        cores (see ModelTuner: interrupted or extended searches resume from model/tuning_cache/), then
+        makes train() fit the best one.
+
+        Returns:
+            pd.DataFrame: Mean accuracy and wall-clock fit time of every candidate, best first.
+        """
+        print("\n🔹 Step: Tuning the Model")
+        tuner = ModelTuner(self.X_train, self.y_train, **tuner_options)
+        report = tuner.search(param_grid)
+        print(report.to_string(index=False))
+        print(f"✅ Best parameters: {tuner.best_params}")
+        self.model = RandomForestClassifier(random_state=42, **tuner.best_params)
+        return report
+
     def evaluate(self):
         """
         Evaluates the model on the test set and prints performance metrics.
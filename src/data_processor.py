@@ -1,17 +1,64 @@
 import os
+import numpy as np
 import pandas as pd
 import logging
 
+# Output formats for parsed tables: text CSV or typed, compressed Parquet (needs pyarrow)
+OUTPUT_FORMATS = ('csv', 'parquet')
+
+# Column types of a cleaned packet table when it is written as Parquet
+PACKET_SCHEMA = {
+	'timestamp': 'float64',
+	'packet_size': 'int32',
+	'protocol': 'category',
+	'ip_src': 'category',
+	'ip_dst': 'category',
+	'transport': 'category',
+	'src_port': 'category',
+	'dst_port': 'category',
+	'tcp_seq': 'float64',
+	'tcp_ack': 'float64',
+	'tcp_window': 'float64',
+	'tcp_flags': 'float64',
+	'tcp_len': 'float64',
+	'tls_handshake_type': 'category',
+	'tls_version': 'category',
+	'tls_cipher_suite': 'category',
+	'flow_size': 'int64',
+	'flow_volume': 'int32',
+	'inter_packet_time': 'float64',
+}
+
+PARQUET_COMPRESSION = 'zstd'
+
+# Address columns (packet and flow tables) held as uint32 IPv4 addresses in compact tables
+IP_COLUMNS = ('ip_src', 'ip_dst', 'SRC_IP', 'DST_IP')
+
+# Port columns (packet and flow tables) held as UInt16 port numbers in compact tables
+PORT_COLUMNS = ('src_port', 'dst_port', 'SRC_PORT', 'DST_PORT')
+
+# Column pairs whose categoricals share one dictionary, so codes compare across the pair
+SHARED_DICTIONARIES = (('ip_src', 'ip_dst'), ('SRC_IP', 'DST_IP'))
+
+# Nullable integer types, smallest first
+INTEGER_DTYPES = ('UInt8', 'Int8', 'UInt16', 'Int16', 'UInt32', 'Int32', 'UInt64', 'Int64')
+
 
 class DataProcessor:
 	@staticmethod
-	def clean_dataframe(df):
-		"""Cleans extracted data by handling missing and incorrect values."""
+	def clean_dataframe(df, compact=False, keep_missing=None):
+		"""Cleans extracted data by handling missing and incorrect values (compact: see compact_dataframe)."""
+		# With compact=True missing numbers stay missing (nullable integers) instead of taking the median;
+		# keep_missing=True keeps them missing in default dtypes (the table compact=True compacts)
+		keep_missing = compact if keep_missing is None else keep_missing
 		numeric_columns = ['packet_size', 'tcp_seq', 'tcp_ack', 'tcp_window',
 						   'tcp_flags', 'inter_packet_time', 'flow_size', 'flow_volume']
 
 		for col in numeric_columns:
 			if col in df.columns:
+				if keep_missing:
+					df[col] = pd.to_numeric(df[col], errors='coerce')
+					continue
 				median_value = df[col].median()
 				df[col] = df[col].fillna(median_value).astype(float)
 				df[col] = pd.to_numeric(df[col], errors='coerce')
@@ -28,11 +75,209 @@ class DataProcessor:
 		critical_columns = ['timestamp', 'packet_size']
 		df = df.dropna(subset=critical_columns)
 
+		if compact:
+			df = DataProcessor.compact_dataframe(df)
+		return df
+
+	@staticmethod
+	def compact_dataframe(df):
+		"""Returns a copy of a packet (or flow) table in memory-optimised dtypes (see memory_report)."""
+		# uint32 addresses and UInt16 ports ("Unknown" is missing), the smallest nullable integer type for
+		# whole numbers, categoricals for text; fractional columns (timestamps) stay float64
+		df = df.copy()
+		for col in df.columns:
+			values = df[col]
+			if col in IP_COLUMNS:
+				addresses = DataProcessor.ipv4_to_uint32(values)
+				if addresses is not None:
+					df[col] = addresses
+					continue
+			if col in PORT_COLUMNS:
+				ports = DataProcessor.port_to_uint16(values)
+				if ports is not None:
+					df[col] = ports
+					continue
+			if pd.api.types.is_bool_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+				continue
+			if pd.api.types.is_numeric_dtype(values):
+				dtype = DataProcessor.smallest_integer_dtype(values)
+				if dtype is not None:
+					df[col] = values.astype(dtype)
+			else:
+				# Numbers next to "Unknown" placeholders (tls_handshake_type): all text, as in a CSV
+				df[col] = values.map(lambda v: v if isinstance(v, str) or pd.isna(v) else str(v)).astype('category')
+
+		for pair in SHARED_DICTIONARIES:
+			if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for col in pair):
+				categories = pd.api.types.union_categoricals([df[col].array for col in pair]).categories
+				for col in pair:
+					df[col] = df[col].cat.set_categories(categories)
 		return df
 
+	@staticmethod
+	def smallest_integer_dtype(values):
+		"""Returns the smallest nullable integer dtype holding every value (None if some are fractional)."""
+		present = values.dropna()
+		if present.empty:
+			return INTEGER_DTYPES[0]
+		numbers = present.to_numpy(dtype=np.float64)
+		if not np.isfinite(numbers).all() or (numbers != np.floor(numbers)).any():
+			return None
+		low, high = numbers.min(), numbers.max()
+		for dtype in INTEGER_DTYPES:
+			info = np.iinfo(dtype.lower())
+			if info.min <= low and high <= info.max:
+				return dtype
+		return None
+
+	@staticmethod
+	def ipv4_to_uint32(values):
+		"""Converts dotted IPv4 text to nullable uint32 (None if any value is something else, e.g. IPv6)."""
+		# Addresses repeat: parse each distinct one once
+		codes, uniques = pd.factorize(values.astype(object).where(values.astype(object) != "Unknown"))
+		parsed = []
+		for address in uniques:
+			octets = str(address).split('.')
+			if len(octets) != 4 or not all(octet.isdigit() and int(octet) <= 255 for octet in octets):
+				return None
+			parsed.append(sum(int(octet) << shift for octet, shift in zip(octets, (24, 16, 8, 0))))
+		table = np.array(parsed, dtype=np.uint32)
+		mask = codes < 0
+		data = table[np.maximum(codes, 0)] if len(table) else np.zeros(len(values), dtype=np.uint32)
+		return pd.Series(pd.arrays.IntegerArray(data, mask), index=values.index)
+
+	@staticmethod
+	def port_to_uint16(values):
+		"""Converts port numbers (text or numbers) to nullable UInt16 (None if any value is something else)."""
+		codes, uniques = pd.factorize(values.astype(object).where(values.astype(object) != "Unknown"))
+		parsed = []
+		for port in uniques:
+			try:
+				number = float(port)
+			except (TypeError, ValueError):
+				return None
+			if not (number.is_integer() and 0 <= number <= 0xFFFF):
+				return None
+			parsed.append(int(number))
+		table = np.array(parsed, dtype=np.uint16)
+		data = table[np.maximum(codes, 0)] if len(table) else np.zeros(len(values), dtype=np.uint16)
+		return pd.Series(pd.arrays.IntegerArray(data, codes < 0), index=values.index)
+
+	@staticmethod
+	def uint16_to_port(values):
+		"""Converts UInt16 ports back to text, as PacketAnalyzer extracts them (None for missing values)."""
+		numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+		known = ~np.isnan(numbers)
+		uniques, inverse = np.unique(numbers[known].astype(np.uint16), return_inverse=True)
+		text = np.full(len(values), None, dtype=object)
+		text[known] = np.array([str(port) for port in uniques.tolist()], dtype=object)[inverse]
+		return pd.Series(text, index=values.index)
+
+	@staticmethod
+	def uint32_to_ipv4(values):
+		"""Converts uint32 addresses back to dotted IPv4 text ("Unknown" for missing values)."""
+		numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+		known = ~np.isnan(numbers)
+		# Addresses repeat: format each distinct one once
+		uniques, inverse = np.unique(numbers[known].astype(np.uint32), return_inverse=True)
+		octets = (uniques[:, None] >> np.array([24, 16, 8, 0], dtype=np.uint32)) & 0xFF
+		table = np.array(['.'.join(map(str, row)) for row in octets.tolist()], dtype=object)
+		text = np.full(len(values), "Unknown", dtype=object)
+		text[known] = table[inverse]
+		return pd.Series(text, index=values.index)
+
+	@staticmethod
+	def expand_dataframe(df):
+		"""Returns df with uint32 address and UInt16 port columns back as text, as written to files."""
+		addresses = [col for col in IP_COLUMNS if col in df.columns and pd.api.types.is_integer_dtype(df[col])]
+		ports = [col for col in PORT_COLUMNS if col in df.columns and isinstance(df[col].dtype, pd.UInt16Dtype)]
+		if not addresses and not ports:
+			return df
+		df = df.copy()
+		for col in addresses:
+			df[col] = DataProcessor.uint32_to_ipv4(df[col])
+		for col in ports:
+			df[col] = DataProcessor.uint16_to_port(df[col])
+		return df
+
+	@staticmethod
+	def memory_report(before, after):
+		"""Returns the bytes per row of each column (and the total) before and after compaction."""
+		rows = max(len(before), 1)
+		report = pd.DataFrame({
+			'before': before.memory_usage(deep=True, index=False) / rows,
+			'after': after.memory_usage(deep=True, index=False) / rows,
+		}).fillna(0)
+		report.loc['total'] = report.sum()
+		report['ratio'] = report['before'] / report['after'].where(report['after'] > 0)
+		return report.round(2)
+
 	@staticmethod
 	def save_dataframe_to_csv(df, output_csv):
 		"""Saves the DataFrame as a CSV file."""
 		os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-		df.to_csv(output_csv, index=False)
+		DataProcessor.expand_dataframe(df).to_csv(output_csv, index=False)
 		logging.info(f"✅ CSV cleaned and saved successfully: {output_csv}")
+
+	@staticmethod
+	def append_dataframe_to_csv(df, output_csv, header=False):
+		"""Appends a cleaned chunk to a CSV file (streaming mode); header=True starts the file over."""
+		os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+		DataProcessor.expand_dataframe(df).to_csv(output_csv, mode='w' if header else 'a', header=header, index=False)
+		logging.debug(f"✅ Appended {len(df)} rows to {output_csv}")
+
+	@staticmethod
+	def apply_schema(df, schema=PACKET_SCHEMA):
+		"""Casts a cleaned table to the column types of `schema`, so it can be stored in a columnar format."""
+		# Integer columns that still hold missing values stay float64; columns outside the schema that
+		# mix numbers and text (e.g. tls_handshake_type values next to "Unknown") become text
+		df = df.copy()
+		for col in df.columns:
+			dtype = schema.get(col)
+			if pd.api.types.is_extension_array_dtype(df[col]) and not isinstance(df[col].dtype, pd.StringDtype):
+				continue  # Already compact (nullable integers, categoricals)
+			if dtype == 'category':
+				# Numbers next to "Unknown" placeholders: store everything as text, as a CSV reload would
+				values = df[col].map(lambda v: v if isinstance(v, str) or pd.isna(v) else str(v))
+				df[col] = values.astype('category')
+			elif dtype is not None:
+				values = pd.to_numeric(df[col], errors='coerce')
+				if dtype.startswith('int') and values.isna().any():
+					dtype = 'float64'
+				df[col] = values.astype(dtype)
+			elif df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+				df[col] = df[col].map(lambda v: v if isinstance(v, str) or pd.isna(v) else str(v))
+		return df
+
+	@staticmethod
+	def output_path(path, output_format):
+		"""Returns `path` with the file extension of the output format."""
+		if output_format not in OUTPUT_FORMATS:
+			raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}")
+		return os.path.splitext(str(path))[0] + '.' + output_format
+
+	@staticmethod
+	def save_dataframe(df, output_file):
+		"""Saves the DataFrame as CSV or, for a .parquet path, as typed compressed Parquet."""
+		if str(output_file).endswith('.parquet'):
+			os.makedirs(os.path.dirname(output_file), exist_ok=True)
+			DataProcessor.apply_schema(DataProcessor.expand_dataframe(df)).to_parquet(output_file, index=False, compression=PARQUET_COMPRESSION)
+			logging.info(f"✅ Parquet cleaned and saved successfully: {output_file}")
+		else:
+			DataProcessor.save_dataframe_to_csv(df, output_file)
+
+	@staticmethod
+	def load_dataframe(input_file):
+		"""Loads a table written by save_dataframe (CSV or Parquet, by file extension)."""
+		if str(input_file).endswith('.parquet'):
+			return pd.read_parquet(input_file)
+		return pd.read_csv(input_file)
+
+	@staticmethod
+	def check_output_format(output_format):
+		"""Raises ImportError early when the output format needs a library that is not installed."""
+		if output_format == 'parquet':
+			try:
+				import pyarrow  # noqa: F401
+			except ImportError:
+				raise ImportError("Parquet output needs pyarrow (pip install pyarrow)") from None
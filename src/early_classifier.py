@@ -0,0 +1,250 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from flow_aggregator import FlowAggregator, PACKET_COLUMNS
+from flow_stream import FlowStreamClassifier, KEY_COLUMNS, LATENCY_WINDOW
+from flow_table import FlowTable, FLOW_RECORD_COLUMNS, EXPIRED_IDLE
+
+# Packets a flow is classified on, by default
+DEFAULT_EARLY_PACKETS = 8
+
+# Packets per flow kept in the training dataset (models for any N up to it are trained on its columns)
+MAX_EARLY_PACKETS = 32
+
+# Features of each of the first packets: size in bytes, +1 (direction of the flow's first packet)
+# or -1 (reverse), and seconds since the flow's previous packet (0 for the first one).
+# Packets a flow never sent are all zeros
+PACKET_FEATURES = ('Packet_Size', 'Packet_Direction', 'Inter_Packet_Time')
+
+# Flow columns of the training dataset, before the packet features
+DATASET_FLOW_COLUMNS = ('SRC_IP', 'DST_IP', 'SRC_PORT', 'DST_PORT', 'PROTOCOL', 'TIME_FIRST', 'Flow_Volume')
+
+# Reason of a flow decided at its n-th packet (flows that expire earlier keep their FlowTable reason)
+DECIDED_EARLY = 'early'
+
+
+class EarlyFlowClassifier(FlowStreamClassifier):
+    """
+    Labels each flow after its first n packets instead of when it ends.
+
+    The features are the size, direction and inter-arrival time of each of the first n packets
+    (see feature_columns()), so a flow is decided as soon as its n-th packet arrives; a flow that
+    expires before sending n packets is decided on the packets it sent. The prefix of a flow
+    still short of n packets lives in a fixed (slots, n, 3) array and is dropped once the flow
+    is decided, so the state per flow is bounded by n whatever the flow's length. Timeouts,
+    micro-batching, replay and stats work as in FlowStreamClassifier.
+    """
+
+    def __init__(self, classifier, packets=DEFAULT_EARLY_PACKETS, capacity=1024, **kwargs):
+        """
+        Args:
+            classifier (TrafficClassifier): Classifier trained on feature_columns(packets)
+                (see model/early_main.py).
+            packets (int): Packets a flow is classified on.
+            capacity (int): Initial number of prefix slots (the arrays grow as needed).
+            kwargs: batch_size, max_delay, idle_timeout, active_timeout, clock (see FlowStreamClassifier).
+        """
+        if packets < 1:
+            raise ValueError(f"packets must be positive, got {packets}")
+        self.n_packets = packets
+        self.columns = list(EarlyFlowClassifier.feature_columns(packets))
+        if sorted(classifier.feature_columns) != sorted(self.columns):
+            raise ValueError(f"The classifier needs {list(classifier.feature_columns)}, not the features of "
+                             f"the first {packets} packets")
+        super().__init__(classifier, **kwargs)
+
+        self.prefix = np.zeros((capacity, packets, len(PACKET_FEATURES)), dtype=np.float64)
+        self.prefix_first = np.zeros(capacity, dtype=np.float64)
+        self.prefix_last = np.zeros(capacity, dtype=np.float64)
+        self.prefix_slots = {}  # (flow key, first timestamp) -> slot of a flow short of n packets
+        self.open_prefixes = {}  # Flow key -> slot of the flow's current record
+        self.free_prefixes = []
+        self.prefixes_used = 0  # Slots handed out so far (in use or free)
+        self.expired = []  # Flow records expired by the current feed, decided in _forget_ended()
+
+        self.early = 0
+        self.decision_delays = deque(maxlen=LATENCY_WINDOW)
+
+    @staticmethod
+    def feature_columns(packets):
+        """Feature names of the first `packets` packets: Packet_Size_1, Packet_Direction_1, Inter_Packet_Time_1, ..."""
+        return tuple(f"{name}_{i}" for i in range(1, packets + 1) for name in PACKET_FEATURES)
+
+    @staticmethod
+    def extract(df, packets=MAX_EARLY_PACKETS, idle_timeout=None, active_timeout=None):
+        """
+        Features of the first packets of every bidirectional flow of a packet table (offline, for training).
+
+        Flows are grouped like FlowAggregator groups them, then cut into records on the timeouts
+        the way FlowTable cuts them, so every sample has the features the stream computes for
+        the flow record it classifies (a 5-tuple idle for longer than idle_timeout is two samples).
+
+        Args:
+            df (pd.DataFrame): Packet table in capture order with PACKET_COLUMNS.
+            packets (int): Packets kept per flow.
+            idle_timeout, active_timeout (float): Seconds, as in FlowTable (None: never).
+
+        Returns:
+            pd.DataFrame: DATASET_FLOW_COLUMNS + feature_columns(packets), one row per flow record,
+                in order of first packet.
+        """
+        missing = [col for col in PACKET_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing packet columns {missing} (request the src_port/dst_port columns)")
+        columns = EarlyFlowClassifier.feature_columns(packets)
+        if df.empty:
+            return pd.DataFrame(columns=list(DATASET_FLOW_COLUMNS + columns))
+
+        groups = FlowAggregator.group(df)
+        order, flow_of_packet = groups['order'], groups['flow_of_packet']
+        timestamps, sizes = df['timestamp'].to_numpy(dtype=np.float64), df['packet_size'].to_numpy(dtype=np.float64)
+        t, size = timestamps[order], sizes[order]
+
+        # Step 1: Flow records: a FlowTable pass restarts the volume of a 5-tuple at 1 where a timeout cuts it
+        starts = groups['starts']
+        if idle_timeout is not None or active_timeout is not None:
+            flow_ids = np.empty(len(order), dtype=np.int64)
+            flow_ids[order] = flow_of_packet
+            _, volume, _ = FlowTable(idle_timeout, active_timeout).update(
+                [(flow,) for flow in range(len(starts))], flow_ids, timestamps, np.nan_to_num(sizes))
+            starts = np.flatnonzero(volume[order] == 1)
+        is_start = np.zeros(len(order), dtype=bool)
+        is_start[starts] = True
+        record_of_packet = np.cumsum(is_start) - 1
+        record_flow = flow_of_packet[starts]
+
+        # Step 2: Position of each packet in its record, and the gap since the record's previous packet
+        position = np.arange(len(order)) - starts[record_of_packet]
+        gap = np.zeros(len(order), dtype=np.float64)
+        gap[1:] = np.diff(t)
+        gap[starts] = 0.0
+
+        # Step 3: Scatter the first packets of every record into a (records, packets, features) array;
+        # endpoints and directions are the 5-tuple's, like the stream's flow key
+        kept = position < packets
+        prefix = np.zeros((len(starts), packets, len(PACKET_FEATURES)), dtype=np.float64)
+        values = np.stack([size, np.where(groups['forward'], 1.0, -1.0), gap], axis=1)
+        prefix[record_of_packet[kept], position[kept]] = values[kept]
+
+        flows = pd.DataFrame({
+            **{name: column.take(record_flow) for name, column in groups['endpoints'].items()},
+            'TIME_FIRST': t[starts],
+            'Flow_Volume': np.diff(np.append(starts, len(order))),
+        })
+        flows = pd.concat([flows, pd.DataFrame(prefix.reshape(len(starts), -1), columns=list(columns))], axis=1)
+        return flows.iloc[np.argsort(order[starts], kind='stable')].reset_index(drop=True)
+
+    def stats(self):
+        """
+        FlowStreamClassifier.stats() plus early (flows decided at their n-th packet) and the
+        capture time from a flow's first packet to its decision (decision_delay_p50_s,
+        decision_delay_p99_s, decision_delay_max_s).
+        """
+        stats = super().stats()
+        delays = np.fromiter(self.decision_delays, dtype=np.float64, count=len(self.decision_delays))
+        has_delay = len(delays) > 0
+        stats.update({
+            'early': self.early,
+            'decision_delay_p50_s': float(np.percentile(delays, 50)) if has_delay else None,
+            'decision_delay_p99_s': float(np.percentile(delays, 99)) if has_delay else None,
+            'decision_delay_max_s': float(delays.max()) if has_delay else None,
+        })
+        return stats
+
+    def _available_features(self):
+        return self.columns
+
+    def _add_packets(self, packets, keys, flow_ids):
+        """Adds a chunk to the flow table, then the first n packets of each flow to its prefix."""
+        volumes = super()._add_packets(packets, keys, flow_ids)
+        rows = np.flatnonzero(volumes <= self.n_packets)
+        if not len(rows):
+            return volumes
+
+        # At most n packets per flow get here, so this loop does not grow with the flows' length
+        times = packets['timestamp'].to_numpy(dtype=np.float64)[rows]
+        sizes = packets['packet_size'].to_numpy(dtype=np.float64)[rows]
+        sources = packets['ip_src'].to_numpy()[rows]
+        source_ports = packets['src_port'].to_numpy()[rows]
+        decided = []
+        for i, row in enumerate(rows.tolist()):
+            key = keys[flow_ids[row]]
+            position = int(volumes[row]) - 1
+            if position == 0:
+                slot = self._allocate_prefix(key, times[i])
+                gap = 0.0
+            else:
+                slot = self.open_prefixes[key]
+                gap = times[i] - self.prefix_last[slot]
+            port = None if pd.isna(source_ports[i]) else source_ports[i]
+            forward = sources[i] == key[0] and port == key[3]
+            self.prefix[slot, position] = (sizes[i], 1.0 if forward else -1.0, gap)
+            self.prefix_last[slot] = times[i]
+            if position == self.n_packets - 1:
+                size = int(self.prefix[slot, :, 0].sum())
+                decided.append(self._decide(key, slot, times[i], size, self.n_packets, DECIDED_EARLY))
+        if decided:
+            self.early += len(decided)
+            self._queue(pd.DataFrame(decided, columns=list(FLOW_RECORD_COLUMNS) + self.columns))
+        return volumes
+
+    def _enqueue(self, records):
+        """FlowTable callback: holds expired flows until the packets of the current chunk are in their prefix."""
+        self.expired.append(records)
+        self.ended.extend(records[list(KEY_COLUMNS)].itertuples(index=False, name=None))
+
+    def _forget_ended(self):
+        """Decides the expired flows that never reached n packets on the packets they sent, then forgets them."""
+        decided = []
+        for records in self.expired:
+            for record in records.itertuples(index=False, name=None):
+                key, (first, last, size, volume, reason) = record[:len(KEY_COLUMNS)], record[len(KEY_COLUMNS):]
+                slot = self.prefix_slots.get((key, first))
+                if slot is not None:  # Otherwise the flow was decided at its n-th packet
+                    decided.append(self._decide(key, slot, last, size, volume, reason))
+        self.expired = []
+        if decided:
+            self._queue(pd.DataFrame(decided, columns=list(FLOW_RECORD_COLUMNS) + self.columns))
+        super()._forget_ended()
+
+    def _features(self, batch):
+        return batch[self.columns]
+
+    def _classify_batch(self):
+        """Classifies a batch and records how long after their first packet its flows were decided."""
+        predictions = super()._classify_batch()
+        delay = predictions['last_timestamp'] - predictions['first_timestamp']
+        # A flow that went idle is only known to have ended idle_timeout seconds after its last packet
+        if self.flows.idle_timeout is not None:
+            delay = delay + np.where(predictions['reason'] == EXPIRED_IDLE, self.flows.idle_timeout, 0.0)
+        self.decision_delays.extend(delay.tolist())
+        return predictions
+
+    def _allocate_prefix(self, key, first):
+        """Starts the prefix of a new flow record (a new flow, or the 5-tuple's next one after a timeout)."""
+        if self.free_prefixes:
+            slot = self.free_prefixes.pop()
+        else:
+            slot = self.prefixes_used
+            self.prefixes_used += 1
+            if slot == len(self.prefix):
+                self.prefix = np.concatenate([self.prefix, np.zeros_like(self.prefix)])
+                self.prefix_first = np.concatenate([self.prefix_first, np.zeros_like(self.prefix_first)])
+                self.prefix_last = np.concatenate([self.prefix_last, np.zeros_like(self.prefix_last)])
+        self.prefix[slot] = 0.0
+        self.prefix_first[slot] = first
+        self.prefix_slots[(key, float(first))] = slot
+        self.open_prefixes[key] = slot
+        return slot
+
+    def _decide(self, key, slot, last, size, volume, reason):
+        """Builds the record (FLOW_RECORD_COLUMNS + features) of a decided flow and frees its prefix."""
+        first = float(self.prefix_first[slot])
+        record = key + (first, float(last), int(size), int(volume), reason) + tuple(self.prefix[slot].ravel().tolist())
+        del self.prefix_slots[(key, first)]
+        if self.open_prefixes.get(key) == slot:
+            del self.open_prefixes[key]
+        self.free_prefixes.append(slot)
+        return record
@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 
 class FileManager:
     @staticmethod
@@ -12,4 +13,26 @@ class FileManager:
             print(f"❌ Error: File {file_path} not found.")
             sys.exit(1)
         else:
-            print(f"✅ File {file_path} found successfully.")
\ No newline at end of file
+            print(f"✅ File {file_path} found successfully.")
+
+    @staticmethod
+    def write_atomic(path, write):
+        """
+        Writes a file through a temporary file in the same directory, then renames it over `path`,
+        so a concurrent reader (another worker process) never sees half of it.
+
+        Args:
+            path (str): File to write (its directory is created if needed).
+            write (callable): Called with the temporary file, opened in binary mode.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
\ No newline at end of file
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+# Packet table columns the aggregation needs (ports are opt-in PacketAnalyzer columns)
+PACKET_COLUMNS = ('timestamp', 'packet_size', 'ip_src', 'ip_dst', 'transport', 'src_port', 'dst_port')
+
+# Per-flow columns, named like the training dataset (see model/main.py)
+FLOW_COLUMNS = ('SRC_IP', 'DST_IP', 'SRC_PORT', 'DST_PORT', 'PROTOCOL', 'TIME_FIRST', 'TIME_LAST',
+                'BYTES', 'BYTES_REV', 'PACKETS', 'PACKETS_REV', 'PKT_LENGTHS_MEAN', 'INTERVALS_MEAN')
+
+# Model features derived from the flow columns, as model/main.py derives them for training
+MODEL_FEATURES = ('Flow_Size', 'Flow_Volume', 'Avg_Packet_Size', 'Inter_Packet_Time_Mean')
+
+
+class FlowAggregator:
+    @staticmethod
+    def aggregate(df):
+        """
+        Collapses a packet table into one row per bidirectional flow.
+
+        Both directions of a 5-tuple belong to the same flow; the forward direction is the one
+        of the flow's first packet. The packets are grouped with a single sort and every
+        per-flow value is a segmented reduction over the sorted arrays, so the cost does not
+        depend on Python work per packet or per flow.
+
+        Args:
+            df (pd.DataFrame): Packet table in capture order with PACKET_COLUMNS.
+
+        Returns:
+            pd.DataFrame: FLOW_COLUMNS + MODEL_FEATURES, one row per flow, in order of first packet.
+        """
+        missing = [col for col in PACKET_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing packet columns {missing} (request the src_port/dst_port columns)")
+        if df.empty:
+            return pd.DataFrame(columns=list(FLOW_COLUMNS + MODEL_FEATURES))
+
+        groups = FlowAggregator.group(df)
+        order, starts, first, forward = groups['order'], groups['starts'], groups['first'], groups['forward']
+        n = len(order)
+        t = df['timestamp'].to_numpy(dtype=np.float64)[order]
+        size = df['packet_size'].to_numpy(dtype=np.float64)[order]
+
+        # Segmented reductions over the flows grouped by group()
+        packets = np.add.reduceat(forward.astype(np.int64), starts)
+        volume = np.diff(np.append(starts, n))
+        bytes_fwd = np.add.reduceat(np.where(forward, size, 0.0), starts)
+        bytes_total = np.add.reduceat(size, starts)
+        time_first = np.minimum.reduceat(t, starts)
+        time_last = np.maximum.reduceat(t, starts)
+        # Consecutive gaps of a time-ordered flow telescope to (last - first) / (packets - 1)
+        intervals = np.where(volume > 1, (time_last - time_first) / np.maximum(volume - 1, 1), 0.0)
+
+        flows = pd.DataFrame({
+            **groups['endpoints'],
+            'TIME_FIRST': time_first,
+            'TIME_LAST': time_last,
+            'BYTES': bytes_fwd.astype(np.int64),
+            'BYTES_REV': (bytes_total - bytes_fwd).astype(np.int64),
+            'PACKETS': packets,
+            'PACKETS_REV': volume - packets,
+            'PKT_LENGTHS_MEAN': bytes_total / volume,
+            'INTERVALS_MEAN': intervals,
+        })
+        flows = flows.iloc[np.argsort(first, kind='stable')].reset_index(drop=True)
+        return FlowAggregator.add_model_features(flows)
+
+    @staticmethod
+    def group(df):
+        """
+        Sorts the packets of a packet table by bidirectional flow (see aggregate()).
+
+        Args:
+            df (pd.DataFrame): Packet table in capture order with PACKET_COLUMNS.
+
+        Returns:
+            dict: order (table rows sorted by flow, in capture order inside a flow), starts (sorted
+                position of each flow's first packet), first (table row of each flow's first packet),
+                flow_of_packet (flow of each sorted row), forward (sorted rows travelling like their
+                flow's first packet) and endpoints (SRC_IP, DST_IP, SRC_PORT, DST_PORT and PROTOCOL
+                of each flow, taken from its first packet).
+        """
+        # Step 1: Integer codes per endpoint; addresses and ports share one code space per kind
+        # so (src, dst) and (dst, src) can be compared
+        n = len(df)
+        ip_codes, ips = pd.factorize(pd.concat([df['ip_src'], df['ip_dst']], ignore_index=True))
+        port_codes, ports = pd.factorize(pd.concat([df['src_port'], df['dst_port']], ignore_index=True))
+        transport_codes, transports = pd.factorize(df['transport'])
+        src_ip, dst_ip = ip_codes[:n], ip_codes[n:]
+        src_port, dst_port = port_codes[:n], port_codes[n:]
+
+        # Step 2: Canonical (lower endpoint first) key of both directions
+        swapped = (src_ip > dst_ip) | ((src_ip == dst_ip) & (src_port > dst_port))
+        low_ip, high_ip = np.where(swapped, dst_ip, src_ip), np.where(swapped, src_ip, dst_ip)
+        low_port, high_port = np.where(swapped, dst_port, src_port), np.where(swapped, src_port, dst_port)
+
+        # Step 3: One stable sort groups each flow's packets, keeping capture order inside a flow
+        order = np.lexsort((high_port, low_port, high_ip, low_ip, transport_codes))
+        keys = np.stack([transport_codes, low_ip, high_ip, low_port, high_port], axis=1)[order]
+        new_flow = np.ones(n, dtype=bool)
+        new_flow[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        starts = np.flatnonzero(new_flow)
+        first = order[starts]
+
+        # Step 4: Packets travelling like the flow's first packet are forward
+        flow_of_packet = np.cumsum(new_flow) - 1
+        forward = swapped[order] == swapped[first][flow_of_packet]
+        return {
+            'order': order,
+            'starts': starts,
+            'first': first,
+            'flow_of_packet': flow_of_packet,
+            'forward': forward,
+            'endpoints': {
+                'SRC_IP': ips[src_ip[first]],
+                'DST_IP': ips[dst_ip[first]],
+                'SRC_PORT': ports[src_port[first]],
+                'DST_PORT': ports[dst_port[first]],
+                'PROTOCOL': transports[transport_codes[first]],
+            },
+        }
+
+    @staticmethod
+    def add_model_features(flows):
+        """Adds the MODEL_FEATURES columns the classifier was trained on (see model/main.py)."""
+        flows['Flow_Size'] = flows['BYTES'] + flows['BYTES_REV']
+        flows['Flow_Volume'] = flows['PACKETS'] + flows['PACKETS_REV']
+        flows['Avg_Packet_Size'] = flows['PKT_LENGTHS_MEAN']
+        flows['Inter_Packet_Time_Mean'] = flows['INTERVALS_MEAN']
+        return flows
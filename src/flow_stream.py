@@ -0,0 +1,292 @@
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from flow_aggregator import MODEL_FEATURES
+from flow_table import FlowTable, DEFAULT_IDLE_TIMEOUT, DEFAULT_ACTIVE_TIMEOUT
+from packet_analyzer import PacketAnalyzer, DEFAULT_CHUNK_SIZE
+
+# Packet columns the stream needs
+STREAM_COLUMNS = ('timestamp', 'packet_size', 'ip_src', 'ip_dst', 'transport', 'src_port', 'dst_port')
+
+# Flow key columns, in FlowTable key order (the direction of the flow's first packet)
+KEY_COLUMNS = ('ip_src', 'ip_dst', 'transport', 'src_port', 'dst_port')
+
+# Columns of the emitted predictions
+PREDICTION_COLUMNS = KEY_COLUMNS + ('first_timestamp', 'last_timestamp', 'volume', 'reason', 'label', 'probability')
+
+# Micro-batching: flows per model call, and the longest a finished flow waits for its batch to fill
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_DELAY = 0.5
+
+# Wall-clock seconds between two feeds (and deadline checks) of a paced replay
+REPLAY_TICK = 0.05
+
+# Latency samples kept for the percentiles in stats()
+LATENCY_WINDOW = 100_000
+
+
+class FlowStreamClassifier:
+    """
+    Labels bidirectional flows continuously, as they expire, instead of after a whole capture.
+
+    Packet chunks (e.g. from PacketAnalyzer.iter_features) update a FlowTable keyed on both
+    directions of a 5-tuple, so the features of an expired flow (Flow_Size, Flow_Volume,
+    Avg_Packet_Size, Inter_Packet_Time_Mean) are the ones FlowAggregator computes for training.
+    Expired flows are queued and classified in micro-batches: a batch goes to the model once it
+    holds batch_size flows, or once its oldest flow has waited max_delay seconds, so batch_size
+    trades model calls for latency and max_delay caps the latency when traffic is sparse.
+    """
+
+    def __init__(self, classifier, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, active_timeout=DEFAULT_ACTIVE_TIMEOUT, clock=time.perf_counter):
+        """
+        Args:
+            classifier (TrafficClassifier): Classifier whose feature_columns are MODEL_FEATURES.
+            batch_size (int): Flows per model call.
+            max_delay (float): Wall-clock seconds an expired flow may wait for its batch to fill.
+            idle_timeout, active_timeout (float): Flow timeouts in capture seconds (see FlowTable).
+            clock (callable): Wall clock in seconds.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if max_delay < 0:
+            raise ValueError(f"max_delay must not be negative, got {max_delay}")
+        available = self._available_features()
+        unknown = [col for col in classifier.feature_columns if col not in available]
+        if unknown:
+            raise ValueError(f"Flows only have the features {available}, the classifier needs {unknown}")
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.clock = clock
+        self.flows = FlowTable(idle_timeout, active_timeout, on_expire=self._enqueue)
+
+        self.directions = {}  # Either direction of a live flow -> the flow's key
+        self.ended = []  # Keys of the flows expired by the current feed
+        self.pending = []  # Expired flow records waiting for a batch
+        self.pending_since = deque()  # Wall-clock expiry time of each pending flow
+
+        # Counters (see stats())
+        self.started = None
+        self.packets = 0
+        self.classified = 0
+        self.batches = 0
+        self.model_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def feed(self, packets, now=None):
+        """
+        Adds a chunk of packets, then expires the flows idle at time `now`.
+
+        Args:
+            packets (pd.DataFrame): Packets in capture order with STREAM_COLUMNS.
+            now (float): Current capture time (default: the chunk's last timestamp).
+
+        Returns:
+            list: Prediction DataFrames (PREDICTION_COLUMNS) that became ready.
+        """
+        if self.started is None:
+            self.started = self.clock()
+        if len(packets):
+            keys, flow_ids = self._flow_ids(packets)
+            self._add_packets(packets, keys, flow_ids)
+            self.packets += len(packets)
+            if now is None:
+                now = float(packets['timestamp'].iloc[-1])
+        if now is not None:
+            self.flows.expire_idle(now)
+        self._forget_ended()
+        return self._ready()
+
+    def poll(self):
+        """Returns the batches whose deadline passed (for callers that wait between feeds)."""
+        return self._ready()
+
+    def close(self):
+        """Expires every remaining flow and classifies everything still queued."""
+        self.flows.flush()
+        self._forget_ended()
+        return self._ready(force=True)
+
+    def replay(self, pcap_file, backend="native", speedup=None, chunk_size=DEFAULT_CHUNK_SIZE, tick=REPLAY_TICK):
+        """
+        Streams a capture file through the classifier.
+
+        Args:
+            pcap_file (str): Capture to replay.
+            backend (str): PacketAnalyzer backend.
+            speedup (float): Capture seconds replayed per wall-clock second (1.0 is real time;
+                None replays as fast as the capture is decoded).
+            chunk_size (int): Packets decoded at a time.
+            tick (float): Wall-clock seconds between feeds of a paced replay.
+
+        Yields:
+            pd.DataFrame: Predictions (PREDICTION_COLUMNS) as they become ready; the flows still
+                open at the end of the capture come last.
+        """
+        if speedup is not None and speedup <= 0:
+            raise ValueError(f"speedup must be positive, got {speedup}")
+        analyzer = PacketAnalyzer(pcap_file, backend, columns=STREAM_COLUMNS, idle_timeout=self.flows.idle_timeout,
+                                  active_timeout=self.flows.active_timeout)
+        origin = None  # (first capture timestamp, wall-clock time it was replayed at)
+        for chunk in analyzer.iter_features(chunk_size):
+            if speedup is None:
+                yield from self.feed(chunk)
+                continue
+
+            # Step 1: Cut the chunk into slices of `tick` wall-clock seconds of capture time
+            times = chunk['timestamp'].to_numpy(dtype=np.float64)
+            if origin is None:
+                origin = (times[0], self.clock())
+            slices = np.floor((times - origin[0]) / (tick * speedup))
+            bounds = np.append(np.flatnonzero(np.diff(slices)) + 1, len(chunk))
+
+            # Step 2: Feed each slice once its last packet is due, serving deadlines while waiting
+            start = 0
+            for end in bounds.tolist():
+                due = origin[1] + (times[end - 1] - origin[0]) / speedup
+                yield from self._wait_until(due, origin, speedup, times[start], tick)
+                yield from self.feed(chunk.iloc[start:end])
+                start = end
+        yield from self.close()
+
+    def stats(self):
+        """
+        Throughput and latency counters.
+
+        Returns:
+            dict: packets, flows (classified), batches, active_flows, pending, elapsed_s,
+                packets_per_s, flows_per_s, model_s (time in model calls) and the latency from
+                flow expiry to prediction (latency_mean_s, latency_p50_s, latency_p99_s, latency_max_s).
+        """
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        latencies = np.fromiter(self.latencies, dtype=np.float64, count=len(self.latencies))
+        has_latency = len(latencies) > 0
+        return {
+            'packets': self.packets,
+            'flows': self.classified,
+            'batches': self.batches,
+            'active_flows': len(self.flows),
+            'pending': len(self.pending_since),
+            'elapsed_s': elapsed,
+            'packets_per_s': self.packets / elapsed if elapsed > 0 else 0.0,
+            'flows_per_s': self.classified / elapsed if elapsed > 0 else 0.0,
+            'model_s': self.model_seconds,
+            'latency_mean_s': float(latencies.mean()) if has_latency else None,
+            'latency_p50_s': float(np.percentile(latencies, 50)) if has_latency else None,
+            'latency_p99_s': float(np.percentile(latencies, 99)) if has_latency else None,
+            'latency_max_s': float(latencies.max()) if has_latency else None,
+        }
+
+    def _available_features(self):
+        """Features a flow record can be classified on."""
+        return MODEL_FEATURES
+
+    def _add_packets(self, packets, keys, flow_ids):
+        """
+        Adds a chunk of packets to the flow table.
+
+        Returns:
+            np.ndarray: Volume of each packet's flow after the packet (1 for the first packet of a flow).
+        """
+        return self.flows.update(keys, flow_ids, packets['timestamp'].to_numpy(dtype=np.float64),
+                                 packets['packet_size'].to_numpy(dtype=np.int64))[1]
+
+    def _flow_ids(self, packets):
+        """Maps the packets to flows: returns (key of each flow id, flow id per packet)."""
+        direction_ids, directions = pd.factorize(pd.MultiIndex.from_arrays([packets[col] for col in KEY_COLUMNS]))
+        keys, key_ids = [], {}
+        flow_of_direction = np.empty(len(directions), dtype=np.int64)
+        for i, direction in enumerate(directions):
+            direction = tuple(None if pd.isna(value) else value for value in direction)
+            key = self.directions.get(direction)
+            if key is None:
+                # A new flow is keyed on the direction of its first packet; the reverse joins it
+                key = direction
+                src, dst, transport, src_port, dst_port = direction
+                self.directions[direction] = key
+                self.directions[(dst, src, transport, dst_port, src_port)] = key
+            # Both directions of a flow share one flow id
+            if key not in key_ids:
+                key_ids[key] = len(keys)
+                keys.append(key)
+            flow_of_direction[i] = key_ids[key]
+        return keys, flow_of_direction[direction_ids]
+
+    def _enqueue(self, records):
+        """FlowTable callback: queues expired flow records for classification."""
+        self._queue(records)
+        self.ended.extend(records[list(KEY_COLUMNS)].itertuples(index=False, name=None))
+
+    def _queue(self, records):
+        """Queues flow records for the next batches."""
+        self.pending.append(records)
+        self.pending_since.extend([self.clock()] * len(records))
+
+    def _forget_ended(self):
+        """Drops the direction mappings of expired flows (unless their 5-tuple already started a new flow)."""
+        for key in self.ended:
+            if key not in self.flows:
+                src, dst, transport, src_port, dst_port = key
+                self.directions.pop(key, None)
+                self.directions.pop((dst, src, transport, dst_port, src_port), None)
+        self.ended = []
+
+    def _ready(self, force=False):
+        """Classifies the queued flows whose batch is full or whose deadline passed (all of them with force)."""
+        batches = []
+        while self.pending_since:
+            waited = self.clock() - self.pending_since[0]
+            if not (force or len(self.pending_since) >= self.batch_size or waited >= self.max_delay):
+                break
+            batches.append(self._classify_batch())
+        return batches
+
+    def _classify_batch(self):
+        """Classifies the oldest batch_size queued flows (or all of them if fewer)."""
+        queued = pd.concat(self.pending, ignore_index=True) if len(self.pending) > 1 else self.pending[0]
+        batch, rest = queued.iloc[:self.batch_size], queued.iloc[self.batch_size:]
+        self.pending = [rest] if len(rest) else []
+        since = np.array([self.pending_since.popleft() for _ in range(len(batch))])
+
+        features = self._features(batch)
+        start = self.clock()
+        proba = self.classifier.predict_proba(features[self.classifier.feature_columns])
+        done = self.clock()
+        best = np.argmax(proba, axis=1)
+        self.model_seconds += done - start
+        self.latencies.extend((done - since).tolist())
+        self.classified += len(batch)
+        self.batches += 1
+
+        predictions = batch[list(KEY_COLUMNS) + ['first_timestamp', 'last_timestamp', 'volume', 'reason']].copy()
+        predictions['label'] = self.classifier.model.classes_.take(best)
+        predictions['probability'] = proba[np.arange(len(best)), best]
+        return predictions.reset_index(drop=True)
+
+    def _features(self, batch):
+        """Model features of flow records, computed like FlowAggregator's (time-ordered gaps telescope)."""
+        volume = batch['volume'].to_numpy(dtype=np.float64)
+        duration = (batch['last_timestamp'] - batch['first_timestamp']).to_numpy(dtype=np.float64)
+        return pd.DataFrame({
+            'Flow_Size': batch['size'].to_numpy(),
+            'Flow_Volume': batch['volume'].to_numpy(),
+            'Avg_Packet_Size': batch['size'].to_numpy(dtype=np.float64) / volume,
+            'Inter_Packet_Time_Mean': np.where(volume > 1, duration / np.maximum(volume - 1, 1), 0.0),
+        })
+
+    def _wait_until(self, due, origin, speedup, next_packet, tick):
+        """Sleeps until the wall-clock time `due`, expiring idle flows and serving batch deadlines every tick."""
+        while True:
+            remaining = due - self.clock()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, tick))
+            # Capture time has moved on, but not past the next packet still to be fed
+            now = min(origin[0] + (self.clock() - origin[1]) * speedup, next_packet)
+            self.flows.expire_idle(now)
+            self._forget_ended()
+            yield from self._ready()
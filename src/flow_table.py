@@ -0,0 +1,310 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# Columns of the flow records emitted when a flow expires
+FLOW_RECORD_COLUMNS = ('ip_src', 'ip_dst', 'transport', 'src_port', 'dst_port',
+                       'first_timestamp', 'last_timestamp', 'size', 'volume', 'reason')
+
+# Why a flow record was emitted
+EXPIRED_IDLE = 'idle'
+EXPIRED_ACTIVE = 'active'
+EXPIRED_END = 'end'
+
+# Flow timeouts in capture seconds when streaming: a flow ends 15 s after its last packet (NetFlow's
+# default inactive timeout), and a long-lived one at least once a minute
+DEFAULT_IDLE_TIMEOUT = 15.0
+DEFAULT_ACTIVE_TIMEOUT = 60.0
+
+
+class FlowTable(Mapping):
+    """
+    Running per-flow counters (bytes, packets, first/last timestamp) keyed by 5-tuple.
+
+    Each 5-tuple is interned to an integer slot and the counters live in typed NumPy arrays,
+    so a flow costs a dict entry and four array cells instead of a dict of Python objects.
+    Like a NetFlow/IPFIX exporter, a flow is expired when no packet arrived for idle_timeout
+    seconds or when it has been active for longer than active_timeout seconds; the next packet
+    of the 5-tuple then starts a new flow. Expired flows are emitted as flow records (see
+    FLOW_RECORD_COLUMNS) and their slot is reused.
+
+    Read access works like the dict PacketAnalyzer used to keep:
+    table[flow_key] -> {'size', 'volume', 'last_timestamp'}.
+    """
+
+    def __init__(self, idle_timeout=None, active_timeout=None, on_expire=None, capacity=1024):
+        """
+        Args:
+            idle_timeout (float): Seconds without packets after which a flow expires (None: never).
+            active_timeout (float): Seconds after its first packet after which a flow expires (None: never).
+            on_expire (callable): Called with a DataFrame of flow records whenever flows expire
+                (a 5-tuple still in the table by then has started a new flow).
+                Without it the records are kept until pop_expired() is called.
+            capacity (int): Initial number of slots (the arrays grow as needed).
+        """
+        for name, timeout in (('idle_timeout', idle_timeout), ('active_timeout', active_timeout)):
+            if timeout is not None and timeout <= 0:
+                raise ValueError(f"{name} must be positive, got {timeout}")
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.on_expire = on_expire
+
+        self.slots = {}  # 5-tuple -> slot
+        self.slot_keys = []  # slot -> 5-tuple (None for a free slot)
+        self.free = []
+        self.size = np.zeros(capacity, dtype=np.int64)
+        self.volume = np.zeros(capacity, dtype=np.int64)
+        self.first_timestamp = np.zeros(capacity, dtype=np.float64)
+        self.last_timestamp = np.zeros(capacity, dtype=np.float64)
+        self._expired = []
+
+    def __getitem__(self, flow_key):
+        slot = self.slots[flow_key]
+        return {
+            'size': int(self.size[slot]),
+            'volume': int(self.volume[slot]),
+            'last_timestamp': float(self.last_timestamp[slot]),
+        }
+
+    def __contains__(self, flow_key):
+        return flow_key in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add_packet(self, flow_key, timestamp, packet_size):
+        """
+        Adds one packet to its flow.
+
+        Returns:
+            tuple: (flow size, flow volume, inter-packet time or None) after the packet.
+        """
+        slot = self.slots.get(flow_key)
+        inter_packet_time = None
+        if slot is not None:
+            reason = self._timeout_reason(timestamp - self.last_timestamp[slot],
+                                          timestamp - self.first_timestamp[slot])
+            if reason is None:
+                inter_packet_time = timestamp - float(self.last_timestamp[slot])
+            else:
+                record = self._record(slot, reason)
+                self._release([slot])
+                self._emit([record])
+                slot = None
+        if slot is None:
+            slot = self._allocate(flow_key)
+            self.first_timestamp[slot] = timestamp
+
+        self.size[slot] += packet_size
+        self.volume[slot] += 1
+        self.last_timestamp[slot] = timestamp
+        return int(self.size[slot]), int(self.volume[slot]), inter_packet_time
+
+    def update(self, flow_keys, flow_ids, timestamps, sizes):
+        """
+        Adds a block of packets (in capture order) with a single sort and segmented reductions.
+
+        Args:
+            flow_keys (list): 5-tuple of each flow id (ids without packets are ignored).
+            flow_ids (np.ndarray): Flow id per packet.
+            timestamps (np.ndarray): Packet timestamps.
+            sizes (np.ndarray): Packet sizes in bytes.
+
+        Returns:
+            tuple: (flow size, flow volume, inter-packet time) per packet, as after each packet
+                was added; the inter-packet time is NaN for the first packet of a flow.
+        """
+        n = len(flow_ids)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        # Step 1: Group the packets of each flow together, keeping capture order inside a flow
+        order = np.argsort(flow_ids, kind='stable')
+        flows = flow_ids[order]
+        t = np.asarray(timestamps, dtype=np.float64)[order]
+        sizes = np.asarray(sizes, dtype=np.int64)[order]
+        flow_start = np.ones(n, dtype=bool)
+        flow_start[1:] = flows[1:] != flows[:-1]
+        present = flows[flow_start]
+
+        # Step 2: Counters of the flows already in the table
+        prior_slot = np.array([self.slots.get(flow_keys[flow_id], -1) for flow_id in present.tolist()],
+                              dtype=np.int64)
+        group = np.cumsum(flow_start) - 1
+        slot_of_packet = prior_slot[group]
+        has_prior = slot_of_packet >= 0
+        safe_slot = np.maximum(slot_of_packet, 0)
+        prior_first = np.where(has_prior, self.first_timestamp[safe_slot], np.nan)
+
+        # Step 3: Time since the previous packet of the same flow (the stored one for a flow's first packet)
+        previous = np.empty(n, dtype=np.float64)
+        previous[1:] = t[:-1]
+        previous[flow_start] = np.where(has_prior[flow_start], self.last_timestamp[safe_slot[flow_start]], np.nan)
+        gap = t - previous
+
+        # Step 4: Record boundaries: a new flow, an idle gap or an expired active period
+        boundary = flow_start & ~has_prior
+        idle = np.zeros(n, dtype=bool)
+        if self.idle_timeout is not None:
+            idle = gap > self.idle_timeout
+            boundary |= idle
+        if self.active_timeout is not None:
+            boundary = self._active_boundaries(t, flow_start, boundary, prior_first)
+
+        # Step 5: Running totals per record, continuing the stored counters where no boundary was crossed
+        starts = boundary | flow_start
+        records = np.cumsum(starts) - 1
+        record_rows = np.flatnonzero(starts)
+        continues = flow_start[record_rows] & ~boundary[record_rows]
+        record_slot = slot_of_packet[record_rows]
+        base_size = np.where(continues, self.size[np.maximum(record_slot, 0)], 0)
+        base_volume = np.where(continues, self.volume[np.maximum(record_slot, 0)], 0)
+        by_record = pd.Series(sizes).groupby(records)
+        flow_size = by_record.cumsum().to_numpy() + base_size[records]
+        flow_volume = by_record.cumcount().to_numpy() + 1 + base_volume[records]
+        inter_packet_time = np.where(boundary, np.nan, gap)
+
+        # Step 6: Emit the records that ended: stored flows cut by their first packet, then all but the last record of each flow
+        record_first = np.where(continues, prior_first[record_rows], t[record_rows])
+        record_end = np.append(record_rows[1:], n) - 1
+        reasons = np.where(idle[record_rows], EXPIRED_IDLE, EXPIRED_ACTIVE)
+        expired = []
+        cut = flow_start & has_prior & boundary
+        for row in np.flatnonzero(cut).tolist():
+            slot = int(slot_of_packet[row])
+            expired.append(self._record(slot, EXPIRED_IDLE if idle[row] else EXPIRED_ACTIVE))
+        ended = np.flatnonzero(~flow_start[record_rows[1:]])  # Followed by another record of the same flow
+        for r in ended.tolist():
+            end = record_end[r]
+            expired.append(flow_keys[flows[end]] + (float(record_first[r]), float(t[end]), int(flow_size[end]),
+                                                     int(flow_volume[end]), str(reasons[r + 1])))
+        self._release(slot_of_packet[cut].tolist())
+
+        # Step 7: Store the last record of every flow
+        last_rows = np.append(np.flatnonzero(flow_start)[1:], n) - 1
+        last_record = records[last_rows]
+        for i, flow_id in enumerate(present.tolist()):
+            slot = self.slots.get(flow_keys[flow_id])
+            if slot is None:
+                slot = self._allocate(flow_keys[flow_id])
+            row = last_rows[i]
+            self.first_timestamp[slot] = record_first[last_record[i]]
+            self.size[slot] = flow_size[row]
+            self.volume[slot] = flow_volume[row]
+            self.last_timestamp[slot] = t[row]
+        self._emit(expired)
+
+        # Step 8: Back to capture order
+        unsorted = np.empty(n, dtype=np.int64)
+        unsorted[order] = np.arange(n)
+        return flow_size[unsorted], flow_volume[unsorted], inter_packet_time[unsorted]
+
+    def expire_idle(self, now):
+        """
+        Expires every flow idle for longer than idle_timeout at time `now`.
+
+        Returns:
+            list: 5-tuples of the expired flows.
+        """
+        if self.idle_timeout is None or not self.slots:
+            return []
+        used = len(self.slot_keys)
+        slots = np.flatnonzero(now - self.last_timestamp[:used] > self.idle_timeout)
+        slots = [slot for slot in slots.tolist() if self.slot_keys[slot] is not None]
+        keys = [self.slot_keys[slot] for slot in slots]
+        records = [self._record(slot, EXPIRED_IDLE) for slot in slots]
+        self._release(slots)
+        self._emit(records)
+        return keys
+
+    def flush(self):
+        """Expires every remaining flow (end of capture)."""
+        slots = list(self.slots.values())
+        records = [self._record(slot, EXPIRED_END) for slot in slots]
+        self._release(slots)
+        self._emit(records)
+
+    def pop_expired(self):
+        """
+        Returns and forgets the flow records expired so far (only kept when there is no on_expire callback).
+
+        Returns:
+            pd.DataFrame: One row per expired flow, with FLOW_RECORD_COLUMNS.
+        """
+        records, self._expired = self._expired, []
+        return pd.DataFrame(records, columns=list(FLOW_RECORD_COLUMNS))
+
+    def _active_boundaries(self, t, flow_start, boundary, prior_first):
+        """Adds the boundaries of records that outlive active_timeout (the first packet past it starts a new record)."""
+        starts = boundary | flow_start
+        start_rows = np.flatnonzero(starts)
+        end_rows = np.append(start_rows[1:], len(t))
+        record_first = np.where(boundary[start_rows], t[start_rows], prior_first[start_rows])
+        # The running maximum of the time inside a record is sorted even when the packets are not,
+        # and it first passes a deadline at the packet that does
+        latest = pd.Series(t).groupby(np.cumsum(starts)).cummax().to_numpy()
+        boundary = boundary.copy()
+        for r in np.flatnonzero(latest[end_rows - 1] - record_first > self.active_timeout).tolist():
+            start, end, first = int(start_rows[r]), int(end_rows[r]), record_first[r]
+            while True:
+                row = start + int(np.searchsorted(latest[start:end], first + self.active_timeout, side='right'))
+                # Rounding may leave the sorted position a row away from the exact comparison
+                while row > start and latest[row - 1] - first > self.active_timeout:
+                    row -= 1
+                while row < end and not latest[row] - first > self.active_timeout:
+                    row += 1
+                if row == end:
+                    break
+                boundary[row] = True
+                start, first = row, t[row]
+        return boundary
+
+    def _timeout_reason(self, idle_time, active_time):
+        """Returns why a flow would expire after these idle/active times (None if it would not)."""
+        if self.idle_timeout is not None and idle_time > self.idle_timeout:
+            return EXPIRED_IDLE
+        if self.active_timeout is not None and active_time > self.active_timeout:
+            return EXPIRED_ACTIVE
+        return None
+
+    def _allocate(self, flow_key):
+        """Interns a 5-tuple to a free slot with zeroed counters."""
+        if self.free:
+            slot = self.free.pop()
+            self.slot_keys[slot] = flow_key
+        else:
+            slot = len(self.slot_keys)
+            self.slot_keys.append(flow_key)
+            if slot == len(self.size):
+                for name in ('size', 'volume', 'first_timestamp', 'last_timestamp'):
+                    values = getattr(self, name)
+                    setattr(self, name, np.concatenate([values, np.zeros_like(values)]))
+        self.slots[flow_key] = slot
+        self.size[slot] = 0
+        self.volume[slot] = 0
+        return slot
+
+    def _release(self, slots):
+        """Frees slots so new flows can reuse them."""
+        for slot in slots:
+            del self.slots[self.slot_keys[slot]]
+            self.slot_keys[slot] = None
+            self.free.append(slot)
+
+    def _record(self, slot, reason):
+        """Builds the flow record of a stored flow."""
+        return self.slot_keys[slot] + (float(self.first_timestamp[slot]), float(self.last_timestamp[slot]),
+                                  int(self.size[slot]), int(self.volume[slot]), reason)
+
+    def _emit(self, records):
+        """Hands expired flow records downstream."""
+        if not records:
+            return
+        if self.on_expire is None:
+            self._expired.extend(records)
+        else:
+            self.on_expire(pd.DataFrame(records, columns=list(FLOW_RECORD_COLUMNS)))
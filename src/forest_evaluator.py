@@ -0,0 +1,301 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Rows evaluated at once (bounds the (trees x rows) node-index arrays)
+DEFAULT_BATCH_ROWS = 4096
+
+# Up to this many rows a batch is faster through FlatForest than through model.predict; on larger
+# batches scikit-learn's compiled per-tree loops win (see FlatForest.benchmark)
+FLAT_MAX_ROWS = 1024
+
+# Node arrays of a saved forest, one .npy file each (see FlatForest.save)
+ARRAYS = ('feature', 'threshold', 'children', 'missing_left', 'is_leaf', 'value', 'roots', 'classes_')
+
+# Version of the saved layout
+FORMAT_VERSION = 1
+
+# Node feature of a leaf in scikit-learn trees (sklearn.tree._tree.TREE_UNDEFINED)
+LEAF = -2
+
+
+class FlatForest:
+    """
+    A trained scikit-learn random forest flattened into contiguous NumPy node arrays.
+
+    All trees share one node numbering: feature, threshold, left/right child and missing-value
+    direction per node, plus the class probabilities of every node (only read at leaves). A batch
+    is evaluated level-synchronously: every (tree, row) pair advances one level per step with a
+    handful of gathers over the whole batch, and pairs that reached a leaf drop out. That replaces
+    one Python-level predict call per tree with a loop over the depth of the forest.
+
+    Predictions are bit-identical to the source model's: rows are compared as float32 like in
+    scikit-learn (against thresholds rounded down to float32, which decides every float32 row the
+    same way), leaf probabilities are computed the same way and
+    the trees are summed in estimator order (scikit-learn itself only guarantees that order
+    with n_jobs=1).
+    """
+
+    def __init__(self, feature, threshold, children, missing_left, value, roots, classes, n_features, is_leaf=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features = n_features
+        self.is_leaf = children[0::2] == np.arange(len(feature)) if is_leaf is None else is_leaf
+
+    @staticmethod
+    def supports(model):
+        """True for the fitted single-output scikit-learn forests FlatForest can flatten."""
+        try:
+            from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+        except ImportError:
+            return False
+        return isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) \
+            and hasattr(model, 'estimators_') and model.n_outputs_ == 1
+
+    @staticmethod
+    def from_sklearn(model):
+        """
+        Exports a fitted RandomForestClassifier (or ExtraTreesClassifier) to node arrays.
+
+        Args:
+            model: The fitted forest.
+
+        Returns:
+            FlatForest: The flattened forest.
+        """
+        if not FlatForest.supports(model):
+            raise ValueError(f"Cannot flatten {type(model).__name__}: expected a fitted single-output forest classifier")
+
+        # scikit-learn < 1.4 stores class counts and normalizes them at prediction time
+        import sklearn
+        normalize = tuple(int(part) for part in sklearn.__version__.split('.')[:2]) < (1, 4)
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        counts = np.array([tree.node_count for tree in trees])
+        roots = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        feature, threshold, children, missing_left, value = [], [], [], [], []
+        for root, tree in zip(roots, trees):
+            own = np.arange(tree.node_count) + root
+            leaf = tree.children_left == -1
+            # A leaf is a split that always goes left, to itself: walks need no per-node leaf test
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            children.append(np.column_stack((np.where(leaf, own, tree.children_left + root),
+                                             np.where(leaf, own, tree.children_right + root))))
+            missing = getattr(tree, 'missing_go_to_left', None)
+            missing = np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool)
+            missing_left.append(missing | leaf)
+            value.append(FlatForest._leaf_proba(tree.value[:, 0, :], normalize))
+
+        return FlatForest(
+            feature=np.ascontiguousarray(np.concatenate(feature), dtype=np.min_scalar_type(model.n_features_in_)),
+            threshold=FlatForest._float32_thresholds(np.concatenate(threshold)),
+            # [left, right] pairs: the child of node n is children[2 * n + went_right]
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.intp).ravel(),
+            missing_left=np.ascontiguousarray(np.concatenate(missing_left)),
+            value=np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+            roots=roots,
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+        )
+
+    @staticmethod
+    def _leaf_proba(value, normalize):
+        """Class probabilities of each node, computed as in DecisionTreeClassifier.predict_proba."""
+        if not normalize:
+            return value
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        return value / normalizer
+
+    @staticmethod
+    def _float32_thresholds(threshold):
+        """
+        The largest float32 at or below each float64 threshold: for float32 rows, x <= it exactly
+        when x <= the original threshold, so the walk compares float32 to float32.
+        """
+        rounded = threshold.astype(np.float32)
+        above = rounded > threshold
+        rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+        return np.ascontiguousarray(rounded)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def save(self, path):
+        """
+        Writes the forest to a directory of uncompressed .npy files (replacing it atomically), the
+        layout load() memory-maps.
+
+        Args:
+            path (str): Output directory (e.g. model/my_trained_model.forest).
+        """
+        path = os.path.abspath(path)
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            for name in ARRAYS:
+                values = getattr(self, name)
+                if name == 'classes_':
+                    values = np.asarray(values.tolist())  # Labels as fixed-width strings or numbers, never objects
+                np.save(os.path.join(tmp_dir, name + '.npy'), values, allow_pickle=False)
+            with open(os.path.join(tmp_dir, 'forest.json'), 'w') as f:
+                json.dump({'format': FORMAT_VERSION, 'n_features': int(self.n_features), 'n_trees': self.n_trees}, f)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp_dir, path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Opens a forest written by save().
+
+        With mmap=True the node arrays are memory-mapped instead of read: opening takes a few
+        milliseconds whatever the forest size, and a prediction only pages in the nodes it visits.
+
+        Returns:
+            FlatForest: The forest.
+        """
+        with open(os.path.join(path, 'forest.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported forest format {meta.get('format')} in {path}")
+        arrays = {name: np.asarray(np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None,
+                                           allow_pickle=False))
+                  for name in ARRAYS}
+        return FlatForest(
+            feature=arrays['feature'], threshold=arrays['threshold'], children=arrays['children'],
+            missing_left=arrays['missing_left'], value=arrays['value'], roots=arrays['roots'],
+            classes=np.array(arrays['classes_']), n_features=meta['n_features'], is_leaf=arrays['is_leaf'],
+        )
+
+    def apply(self, X):
+        """
+        Returns the leaf each row reaches in each tree.
+
+        Args:
+            X: (rows, n_features) feature matrix (array or DataFrame, columns in training order).
+
+        Returns:
+            np.ndarray: (n_trees, rows) node indices into the flat arrays.
+        """
+        X = self._validate(X)
+        rows = len(X)
+        node = np.repeat(self.roots, rows)
+        # Offset of each (tree, row) pair's feature row in the flattened matrix
+        offsets = np.tile(np.arange(rows, dtype=np.intp) * self.n_features, self.n_trees)
+        flat = X.ravel()
+        check_missing = bool(np.isnan(flat).any())
+
+        # Every pair moves down one level per step; once half of them sit on leaves the rest are
+        # compacted, so deep branches do not keep the whole batch busy
+        active = np.arange(len(node))
+        current, pair_offsets = node, offsets
+        while len(current):
+            values = flat.take(pair_offsets + self.feature.take(current))
+            went_right = values > self.threshold.take(current)
+            if check_missing:  # NaN compares False: it goes where the tree sends missing values
+                missing = np.isnan(values)
+                went_right[missing] = ~self.missing_left.take(current[missing])
+            current = self.children.take(2 * current + went_right)
+
+            done = self.is_leaf.take(current)
+            if 2 * np.count_nonzero(done) >= len(current):
+                node[active] = current
+                keep = ~done
+                active, current, pair_offsets = active[keep], current[keep], pair_offsets[keep]
+        return node.reshape(self.n_trees, rows)
+
+    def predict_proba(self, X, batch_rows=DEFAULT_BATCH_ROWS):
+        """
+        Mean class probabilities over the trees (the model's predict_proba).
+
+        Returns:
+            np.ndarray: (rows, n_classes) probabilities, columns in classes_ order.
+        """
+        X = self._validate(X)
+        proba = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), batch_rows):
+            leaves = self.apply(X[start:start + batch_rows])
+            batch = np.zeros((leaves.shape[1], len(self.classes_)))
+            for tree_leaves in leaves:  # Summed tree by tree, in the order scikit-learn adds them
+                batch += self.value[tree_leaves]
+            batch /= self.n_trees
+            proba[start:start + batch_rows] = batch
+        return proba
+
+    def predict(self, X, batch_rows=DEFAULT_BATCH_ROWS):
+        """Predicted class of each row (the model's predict)."""
+        return self.classes_.take(np.argmax(self.predict_proba(X, batch_rows), axis=1), axis=0)
+
+    def _validate(self, X):
+        """Rows as a C-contiguous float32 matrix, the input dtype of scikit-learn trees."""
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a (rows, {self.n_features}) feature matrix, got shape {X.shape}")
+        return X
+
+    @staticmethod
+    def benchmark(model, X, batch_rows=(1, 64, 4096, None), repeats=3):
+        """
+        Times FlatForest.predict against model.predict on batches of X and checks they agree.
+
+        Args:
+            model: A fitted forest (see supports()).
+            X: Feature matrix the batches are cut from.
+            batch_rows: Batch sizes to time (None for all of X at once).
+            repeats: Best of this many runs is kept.
+
+        Returns:
+            list: One dict per batch size (rows, sklearn_s, flat_s, speedup, identical).
+        """
+        forest = FlatForest.from_sklearn(model)
+        X = np.asarray(X, dtype=np.float32)
+        report = []
+        for rows in batch_rows:
+            batch = X if rows is None else X[:rows]
+
+            def best(predict):
+                times = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    result = predict(batch)
+                    times.append(time.perf_counter() - start)
+                return min(times), result
+
+            sklearn_s, expected = best(model.predict)
+            flat_s, predicted = best(forest.predict)
+            report.append({
+                'rows': len(batch),
+                'sklearn_s': sklearn_s,
+                'flat_s': flat_s,
+                'speedup': sklearn_s / flat_s,
+                'identical': bool(np.array_equal(expected, predicted)
+                                  and np.array_equal(model.predict_proba(batch), forest.predict_proba(batch))),
+            })
+        return report
+
+
+if __name__ == "__main__":
+    from sklearn.ensemble import RandomForestClassifier
+
+    # A forest of the classifier's shape (100 trees, the 4 comparison features) on synthetic flows
+    rng = np.random.default_rng(0)
+    X = rng.lognormal(mean=[12, 5, 6, -3], sigma=2.0, size=(50_000, 4))
+    y = np.digitize(np.log(X[:, 0]) - np.log(X[:, 1]) + rng.normal(0, 1, len(X)), [5, 6, 7])
+    model = RandomForestClassifier(n_estimators=100, max_depth=20, random_state=42).fit(X[:20_000], y[:20_000])
+    for result in FlatForest.benchmark(model, X):
+        print(f"🔹 {result['rows']:>7} rows: sklearn {result['sklearn_s'] * 1000:9.2f} ms, "
+              f"flat {result['flat_s'] * 1000:9.2f} ms, x{result['speedup']:.1f}, "
+              f"identical={result['identical']}")
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from file_manager import FileManager
+
+# Manifest file of a graph directory
+MANIFEST_FILE = 'graph_manifest.json'
+
+# Regeneration modes: redraw the graphs whose inputs changed, redraw everything, or only list
+# the graphs that would be redrawn
+GRAPH_MODES = ('changed', 'all', 'dry-run')
+
+
+class GraphManifest:
+    """
+    Records the inputs each graph of a directory was drawn from, so unchanged graphs are not redrawn.
+
+    The key of a graph is a SHA-256 of everything it is drawn from: its data (the reduced figure
+    data, or the columns of the comparison table it plots) and its plot settings. A graph is
+    stale when its image is missing or its key differs from the one recorded when it was last
+    drawn. The manifest is a JSON file in the graph directory (one per application, so capture
+    workers never write the same manifest), written atomically by save().
+    """
+
+    def __init__(self, graph_dir, mode='changed'):
+        """
+        Args:
+            graph_dir (str): Directory of the graphs (and of the manifest).
+            mode (str): One of GRAPH_MODES.
+        """
+        if mode not in GRAPH_MODES:
+            raise ValueError(f"Unknown graph mode {mode!r}, expected one of {GRAPH_MODES}")
+        self.graph_dir = str(graph_dir)
+        self.mode = mode
+        self.path = os.path.join(self.graph_dir, MANIFEST_FILE)
+        self.entries = self._load()
+        self.stale = []  # Graphs needs() asked to redraw (or, in dry-run mode, would have)
+        self.current = 0  # Graphs left as they are
+
+    @staticmethod
+    def digest(*parts):
+        """
+        SHA-256 of graph inputs: NumPy arrays, DataFrames, Series, dicts, lists and scalars,
+        hashed by value (dicts in key order), so equal data always gives the same key.
+        """
+        digest = hashlib.sha256()
+        GraphManifest._update(digest, parts)
+        return digest.hexdigest()
+
+    def needs(self, name, key):
+        """
+        Tells whether a graph has to be drawn, and remembers its new key for save().
+
+        Args:
+            name (str): Image file name, relative to the graph directory.
+            key (str): digest() of its inputs.
+
+        Returns:
+            bool: True if the graph is to be drawn (always False in dry-run mode, where stale
+                graphs are only listed).
+        """
+        image = os.path.join(self.graph_dir, name)
+        if self.mode != 'all' and self.entries.get(name) == key and os.path.exists(image):
+            self.current += 1
+            return False
+        self.stale.append(image)
+        if self.mode == 'dry-run':
+            print(f"🖼 Would redraw {image}")
+            return False
+        self.entries[name] = key
+        return True
+
+    def save(self):
+        """Writes the keys of the drawn graphs (nothing in dry-run mode)."""
+        if self.mode == 'dry-run':
+            return
+        manifest = json.dumps(self.entries, indent=2, sort_keys=True)
+        FileManager.write_atomic(self.path, lambda f: f.write(manifest.encode()))
+
+    def report(self):
+        """One-line summary of the graphs redrawn and skipped."""
+        verb = 'would be redrawn' if self.mode == 'dry-run' else 'redrawn'
+        return f"🖼 {self.graph_dir}: {len(self.stale)} graphs {verb}, {self.current} unchanged"
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠ Ignoring unreadable graph manifest {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def _update(digest, value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            frame = value.to_frame() if isinstance(value, pd.Series) else value
+            digest.update(repr(list(frame.columns)).encode())
+            value = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        if isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            if value.dtype == object:
+                digest.update(repr(value.tolist()).encode())
+            else:
+                digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            for name in sorted(value):
+                digest.update(repr(name).encode())
+                GraphManifest._update(digest, value[name])
+        elif isinstance(value, (list, tuple)):
+            digest.update(f"[{len(value)}".encode())
+            for item in value:
+                GraphManifest._update(digest, item)
+        else:
+            digest.update(repr(value).encode())
+        digest.update(b'|')
@@ -1,13 +1,24 @@
 import os
 import argparse
-import pickle
 from pathlib import Path
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from data_processor import DataProcessor, OUTPUT_FORMATS
 from file_manager import FileManager
-from packet_analyzer import PacketAnalyzer
+from packet_analyzer import PacketAnalyzer, BACKENDS, ALL_COLUMNS, PARSER_VERSION
+from parse_cache import ParseCache, DEFAULT_MAX_BYTES
+from results_store import ResultsStore
+from pipeline import Pipeline
+from flow_aggregator import FlowAggregator, MODEL_FEATURES
+from flow_stream import FlowStreamClassifier, STREAM_COLUMNS, DEFAULT_BATCH_SIZE, DEFAULT_MAX_DELAY
+from flow_table import DEFAULT_IDLE_TIMEOUT, DEFAULT_ACTIVE_TIMEOUT
+from early_classifier import EarlyFlowClassifier, MAX_EARLY_PACKETS
+from tcp_analyzer import TcpAnalyzer, TCP_PACKET_COLUMNS
 from traffic_classifier import TrafficClassifier
 from traffic_visualizer import TrafficVisualizer
-import joblib
+from graph_manifest import GRAPH_MODES
+from run_metrics import RunMetrics, SamplingProfiler, peak_rss
 
 # Define data directories
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -16,6 +27,12 @@ RESULTS_DIR = BASE_DIR / "results"
 CSV_DIR = RESULTS_DIR / "CSV_files"
 GRAPH_DIR = RESULTS_DIR / "Graphs"
 COMPARE_DIR = RESULTS_DIR / "Graphs/compare"
+CACHE_DIR = RESULTS_DIR / "cache"
+RESULTS_DB = RESULTS_DIR / "results.db"
+METRICS_DIR = RESULTS_DIR / "metrics"  # Per-run stage metrics (JSON), metrics.prom and profiles
+MODEL_PATH = BASE_DIR / "model" / "my_trained_model.pkl"
+EARLY_MODEL_PATH = BASE_DIR / "model" / "early_model_{}.pkl"  # Companion models of model/early_main.py, per N
+EARLY_DATASET = BASE_DIR / "processed_data" / "early_flows.csv"
 
 # Ensure necessary directories exist
 os.makedirs(RESULTS_DIR, exist_ok=True)
@@ -24,8 +41,33 @@ os.makedirs(GRAPH_DIR, exist_ok=True)
 os.makedirs(COMPARE_DIR, exist_ok=True)
 
 
-def process_pcap_file(pcap_file):
+def process_pcap_file(pcap_file, backend="pyshark", file_workers=1, flows=False, cache=None, output_format="csv",
+                      compact=False, plot_workers=1, graphs="changed", metrics=None, idle_timeout=None,
+                      active_timeout=None):
     """Process a single .pcapng file, extract data, and generate graphs"""
+    comparison_data, _ = analyze_pcap_file(pcap_file, backend, file_workers, flows, cache, output_format, compact,
+                                           plot_workers, graphs, metrics, idle_timeout, active_timeout)
+    return comparison_data
+
+
+def analyze_pcap_file(pcap_file, backend="pyshark", file_workers=1, flows=False, cache=None, output_format="csv",
+                      compact=False, plot_workers=1, graphs="changed", metrics=None, idle_timeout=None,
+                      active_timeout=None):
+    """
+    Same as process_pcap_file, but also returns the packet DataFrame: (comparison_data, df)
+
+    With flows=True, the per-flow features of the capture (see FlowAggregator) and its per-connection
+    TCP RTT/loss figures (see TcpAnalyzer) are also saved to results/CSV_files/<application>_flows.csv
+    and <application>_tcp.csv. With a ParseCache, a capture parsed before
+    (same bytes, backend, parser version, columns and flow timeouts) is loaded from the cache instead.
+    Tables are written in output_format (csv or parquet); compact=True keeps them in memory-optimised
+    dtypes (see DataProcessor.compact_dataframe). The graphs are drawn by plot_workers processes; with
+    graphs="changed" only those whose inputs changed are redrawn ("all": every graph, "dry-run": none,
+    the stale ones are listed). The time and volume of every stage go to `metrics` (a RunMetrics).
+    idle_timeout/active_timeout (seconds, None: never) split the flows the flow_size, flow_volume and
+    inter_packet_time columns are counted over (see FlowTable).
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
     app_name = os.path.splitext(pcap_file)[0]  # Extract the application name from the file
     pcap_path = os.path.join(DATA_DIR, pcap_file)
 
@@ -33,55 +75,291 @@ def process_pcap_file(pcap_file):
 
     # Validate and analyze the file
     FileManager.validate_file(pcap_path)
-    analyzer = PacketAnalyzer(pcap_path)
-    df = analyzer.extract_features()
+    columns = ALL_COLUMNS  # Ports and TCP payload lengths feed the TCP RTT/loss analysis
 
-    if df.empty:
-        print(f"⚠ No data extracted from {pcap_file}. Skipping...")
-        return None
-
-    # Check if TCP columns exist before accessing them
-    if 'tcp_flags' in df.columns:
-        df['tcp_flags'] = df['tcp_flags'].fillna("None")
+    digest = ParseCache.file_digest(pcap_path)  # Identifies the capture in the parse cache and the results store
+    cache_key = cache.key(pcap_path, backend, PARSER_VERSION, columns, compact, idle_timeout, active_timeout,
+                          digest=digest) if cache is not None else None
+    cached = None
+    if cache is not None:
+        with metrics.stage("cache"):
+            cached = cache.get(cache_key)
+    tcp_df = None  # Per-connection RTT/loss, shared by the summary and the --flows tables
+    if cached is not None:
+        print(f"🗄 {pcap_file} loaded from the parse cache")
+        comparison_data, df = cached
+        comparison_data["Application"] = app_name  # Same bytes may have been cached under another name
     else:
-        df['tcp_flags'] = "None"
+        analyzer = PacketAnalyzer(pcap_path, backend=backend, columns=columns, workers=file_workers,
+                                  idle_timeout=idle_timeout, active_timeout=active_timeout,
+                                  output_format=output_format, compact=compact, metrics=metrics)
+        df = analyzer.extract_features()
+
+        if df.empty:
+            print(f"⚠ No data extracted from {pcap_file}. Skipping...")
+            return None, df
+
+        with metrics.stage("summary") as stage:
+            if all(col in df.columns for col in TCP_PACKET_COLUMNS):
+                tcp_df = TcpAnalyzer.analyze(df)
+            comparison_data = summarize_packets(df, app_name, tcp_df)
+            stage["packets"] = len(df)
+        if cache is not None:
+            cache.put(cache_key, (comparison_data, df))
+    comparison_data["Capture_Hash"] = digest
 
-    # Handle RTT only if inter_packet_time & tcp_flags exist
-    if 'inter_packet_time' in df.columns and 'tcp_flags' in df.columns:
-        df['rtt'] = df.apply(lambda row: row['inter_packet_time'] if row.get('tcp_flags') == 16 else None, axis=1)
+    if flows:
+        with metrics.stage("flows") as stage:
+            flow_df = FlowAggregator.aggregate(df)
+            tcp_df = TcpAnalyzer.analyze(df) if tcp_df is None else tcp_df
+            stage["packets"], stage["rows"] = len(df), len(flow_df)
+        with metrics.stage("write") as stage:
+            for table, name in ((flow_df, "flows"), (tcp_df, "tcp")):
+                output_file = os.path.join(CSV_DIR, f"{app_name}_{name}.{output_format}")
+                DataProcessor.save_dataframe(table, output_file)
+                stage["rows"] += len(table)
+                stage["bytes"] += os.path.getsize(output_file)
+        print(f"🔹 {len(flow_df)} flows extracted from {pcap_file}")
+
+    # Generate graphs for the application
+    with metrics.stage("plot") as stage:
+        TrafficVisualizer.plot_traffic_characteristics(df, app_name, GRAPH_DIR, workers=plot_workers, graphs=graphs)
+        stage["packets"] = len(df)
+
+    return comparison_data, df
+
+
+def summarize_packets(df, app_name, tcp_df=None):
+    """Computes the per-application comparison metrics of a packet table (tcp_df: its TcpAnalyzer table, if known)."""
+    # RTT and loss from matching TCP segments to their ACKs (needs the port and tcp_len columns)
+    if tcp_df is not None:
+        tcp = TcpAnalyzer.summarize(tcp_df)
+    elif all(col in df.columns for col in TCP_PACKET_COLUMNS):
+        tcp = TcpAnalyzer.summarize(TcpAnalyzer.analyze(df))
     else:
-        df['rtt'] = None
+        tcp = {'RTT': None, 'Packet_Loss_Rate': 0}
 
-    # Prevent division by zero when calculating Packet Loss Rate
-    total_packets = df['flow_volume'].sum() if 'flow_volume' in df.columns else 0
-    packet_loss_rate = 1 - (df.shape[0] / total_packets) if total_packets > 0 else 0
+    # Numbers as clean_dataframe(compact=False) leaves them (missing ones take the median), so compact
+    # tables, which keep them missing, store the same summary under the same capture hash
+    numbers = {col: _median_filled(df[col]) for col in ('packet_size', 'tcp_seq', 'tcp_window', 'tcp_flags',
+                                                         'flow_size', 'flow_volume', 'inter_packet_time')
+               if col in df.columns}
+
+    # Check if TCP columns exist before accessing them (a local copy: the table itself keeps its dtypes)
+    if 'tcp_flags' in numbers:
+        tcp_flags = numbers['tcp_flags'].astype(object).fillna("None")
+    else:
+        tcp_flags = pd.Series("None", index=df.index)
 
     # Compute key metrics safely
     comparison_data = {
         "Application": app_name,  # Ensure the key is "Application"
-        "Avg_Packet_Size": df['packet_size'].mean() if 'packet_size' in df.columns else None,
-        "TCP_Seq_Count": df['tcp_seq'].nunique() if 'tcp_seq' in df.columns else None,
-        "TCP_Window_Size_Avg": df['tcp_window'].mean() if 'tcp_window' in df.columns else None,
+        "Avg_Packet_Size": numbers['packet_size'].mean() if 'packet_size' in numbers else None,
+        "TCP_Seq_Count": numbers['tcp_seq'].nunique() if 'tcp_seq' in numbers else None,
+        "TCP_Window_Size_Avg": numbers['tcp_window'].mean() if 'tcp_window' in numbers else None,
         "TLS_Handshake_Count": df['tls_handshake_type'].nunique() if 'tls_handshake_type' in df.columns else None,
         "Primary_Protocol": df['transport'].mode()[0] if 'transport' in df.columns else "Unknown",
-        "Flow_Size (Bytes)": df['flow_size'].sum() if 'flow_size' in df.columns else None,
-        "Flow_Volume (Packets)": df['flow_volume'].sum() if 'flow_volume' in df.columns else None,
-        "Inter_Packet_Time_Mean": df['inter_packet_time'].mean() if 'inter_packet_time' in df.columns else None,
+        "Flow_Size (Bytes)": numbers['flow_size'].sum() if 'flow_size' in numbers else None,
+        "Flow_Volume (Packets)": numbers['flow_volume'].sum() if 'flow_volume' in numbers else None,
+        "Inter_Packet_Time_Mean": numbers['inter_packet_time'].mean() if 'inter_packet_time' in numbers else None,
         "TLS_Version": df['tls_version'].mode()[0] if 'tls_version' in df.columns else "Unknown",
         "TLS_Cipher_Suite": df['tls_cipher_suite'].mode()[0] if 'tls_cipher_suite' in df.columns else "Unknown",
-        "Packet_Loss_Rate": packet_loss_rate,
-        "Flow_Size": df['packet_size'].sum() if 'packet_size' in df.columns else None,
-        "RTT": df['rtt'].mean() if 'rtt' in df.columns else None,
-        "TCP_Flags": df['tcp_flags'].mode()[0] if 'tcp_flags' in df.columns else "Unknown"
+        "Packet_Loss_Rate": tcp['Packet_Loss_Rate'],
+        "Flow_Size": numbers['packet_size'].sum() if 'packet_size' in numbers else None,
+        "RTT": tcp['RTT'],
+        "TCP_Flags": tcp_flags.mode()[0] if len(tcp_flags) else "Unknown"
     }
 
-    # Generate graphs for the application
-    TrafficVisualizer.plot_traffic_characteristics(df, app_name, GRAPH_DIR)
-
     return comparison_data
 
 
-def menu():
+def _median_filled(values):
+    """A numeric column as float64 with its missing values replaced by its median (see DataProcessor.clean_dataframe)."""
+    values = values.astype('float64')
+    return values.fillna(values.median()) if values.hasnans else values
+
+
+def _init_worker():
+    """Runs once in every pool process: graphs are only saved to files, never shown."""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _process_pcap_worker(pcap_file, backend, flows=False, cache=None, output_format="csv", compact=False,
+                         graphs="changed", file_workers=1, plot_workers=1, idle_timeout=None, active_timeout=None,
+                         return_data=False):
+    """Pool task: processes one capture and reports a failure instead of raising it."""
+    metrics = RunMetrics()  # Sent back to the parent with the result
+    try:
+        hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        comparison_data, df = analyze_pcap_file(pcap_file, backend, file_workers, flows, cache, output_format,
+                                                compact, plot_workers, graphs, metrics, idle_timeout, active_timeout)
+        # The pool process works on a copy of the cache: report this lookup back to the parent
+        cache_hit = None
+        if cache is not None and (cache.hits, cache.misses) != (hits, misses):
+            cache_hit = cache.hits > hits
+        # The packet table is pickled back to the parent only on request: the files hold the tables
+        app_name = os.path.splitext(pcap_file)[0]
+        paths = {"packets": str(Path(DATA_DIR / pcap_file).with_suffix("." + output_format))}
+        if flows:
+            paths.update({name: os.path.join(CSV_DIR, f"{app_name}_{name}.{output_format}")
+                          for name in ("flows", "tcp")})
+        return {"file": pcap_file, "summary": comparison_data,
+                "paths": {name: path for name, path in paths.items() if os.path.exists(path)},
+                "data": DataProcessor.compact_dataframe(df) if return_data else None,
+                "error": None, "cache_hit": cache_hit, "metrics": metrics.to_dict()}
+    except (Exception, SystemExit) as e:
+        metrics.fail(type(e).__name__)
+        return {"file": pcap_file, "summary": None, "paths": {}, "data": None, "error": f"{type(e).__name__}: {e}",
+                "cache_hit": None, "metrics": metrics.to_dict()}
+
+
+def process_pcap_files(pcap_files, backend="pyshark", jobs=1, flows=False, cache=None, output_format="csv",
+                       compact=False, graphs="changed", metrics=None, file_workers=1, plot_workers=1,
+                       idle_timeout=None, active_timeout=None, return_data=False):
+    """
+    Processes several .pcapng files in a pool of `jobs` worker processes.
+
+    Each worker decodes its capture with `file_workers` and draws its graphs with `plot_workers`
+    processes of its own, so up to jobs * max(file_workers, plot_workers) processes run at once.
+
+    A capture that fails (or kills its worker process) is reported in its result instead of
+    stopping the batch. Results come back in the order of `pcap_files`, whatever order the
+    workers finish in.
+
+    The workers' stage metrics are merged into `metrics` (a RunMetrics), if given.
+
+    Returns:
+        list: One dict per file with keys file, summary (comparison_data), paths (the packet, flows
+            and tcp tables written, by name), data (compact DataFrame with return_data=True, else
+            None: every packet table would otherwise stay in this process until the batch ends),
+            error, cache_hit (None without a cache or when the capture failed before the lookup) and
+            metrics (the worker's RunMetrics.to_dict(), None if the worker crashed).
+    """
+    outcomes = {}
+    pending = list(pcap_files)
+    workers = jobs
+
+    while pending:
+        crashed = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker) as pool:
+            futures = {pool.submit(_process_pcap_worker, pcap_file, backend, flows, cache, output_format, compact,
+                                   graphs, file_workers, plot_workers, idle_timeout, active_timeout,
+                                   return_data): pcap_file
+                       for pcap_file in pending}
+            for future in as_completed(futures):
+                try:
+                    outcomes[futures[future]] = future.result()
+                except BrokenProcessPool:
+                    crashed.append(futures[future])
+
+        # A dead worker breaks the whole pool, so the captures it took down are retried one at a time;
+        # in a single-worker pool the first unfinished capture is the one that crashed
+        crashed.sort(key=pending.index)
+        if crashed and workers == 1:
+            outcomes[crashed[0]] = {"file": crashed[0], "summary": None, "paths": {}, "data": None,
+                                    "error": "Worker process crashed", "cache_hit": None, "metrics": None}
+            crashed = crashed[1:]
+        workers = 1
+        pending = crashed
+
+    results = [outcomes[pcap_file] for pcap_file in pcap_files]
+    if cache is not None:
+        for outcome in results:
+            if outcome["cache_hit"] is not None:
+                cache.record(outcome["cache_hit"])
+    if metrics is not None:
+        for outcome in results:
+            if outcome["metrics"] is not None:
+                metrics.merge(outcome["metrics"])
+            else:
+                metrics.fail("WorkerCrashed")
+    return results
+
+
+def stream_captures(pcap_files, backend="native", speedup=None, batch_size=DEFAULT_BATCH_SIZE,
+                    max_delay=DEFAULT_MAX_DELAY, early=None, idle_timeout=None, active_timeout=None):
+    """
+    Replays captures through the flow classifier, printing each flow's label as soon as the flow
+    expires and appending it to results/CSV_files/<app>_stream.csv.
+
+    Args:
+        pcap_files (list): Capture file names in data/.
+        speedup (float): Capture seconds replayed per second (None: as fast as possible).
+        batch_size, max_delay: Micro-batching settings (see FlowStreamClassifier).
+        early (int): Label each flow after its first `early` packets instead, with the companion
+            model model/early_model_<early>.pkl (see EarlyFlowClassifier).
+        idle_timeout, active_timeout (float): Flow timeouts in capture seconds (None: the
+            FlowStreamClassifier defaults).
+    """
+    timeouts = {name: value for name, value in (("idle_timeout", idle_timeout), ("active_timeout", active_timeout))
+                if value is not None}
+    try:
+        if early:
+            classifier = TrafficClassifier(str(EARLY_MODEL_PATH).format(early),
+                                           feature_columns=list(EarlyFlowClassifier.feature_columns(early)))
+        else:
+            classifier = TrafficClassifier(MODEL_PATH, feature_columns=list(MODEL_FEATURES))
+    except Exception as e:
+        print(f"❌ Error loading the model: {e}")
+        return
+
+    for pcap_file in pcap_files:
+        app_name = os.path.splitext(pcap_file)[0]
+        output_csv = CSV_DIR / f"{app_name}_stream.csv"
+        if early:
+            stream = EarlyFlowClassifier(classifier, packets=early, batch_size=batch_size, max_delay=max_delay,
+                                         **timeouts)
+        else:
+            stream = FlowStreamClassifier(classifier, batch_size=batch_size, max_delay=max_delay, **timeouts)
+        print(f"📡 Streaming {pcap_file}" + (f" at {speedup:g}x" if speedup else "") + "...")
+        written = False
+        for predictions in stream.replay(DATA_DIR / pcap_file, backend, speedup=speedup):
+            for flow in predictions.itertuples(index=False):
+                print(f"🏷 {flow.transport} {flow.ip_src}:{flow.src_port} ↔ {flow.ip_dst}:{flow.dst_port} "
+                      f"({flow.volume} packets, {flow.reason}): {flow.label} ({flow.probability:.2f})")
+            DataProcessor.append_dataframe_to_csv(predictions, output_csv, header=not written)
+            written = True
+
+        stats = stream.stats()
+        latency = f", latency p50 {stats['latency_p50_s'] * 1000:.1f} ms / p99 {stats['latency_p99_s'] * 1000:.1f} ms" \
+            if stats['latency_p50_s'] is not None else ""
+        if early and stats['decision_delay_p50_s'] is not None:
+            latency += f", {stats['early']} decided at packet {early}, decisions p50 " \
+                       f"{stats['decision_delay_p50_s'] * 1000:.0f} ms after a flow's first packet"
+        print(f"✅ {pcap_file}: {stats['flows']} flows in {stats['batches']} batches, "
+              f"{stats['packets_per_s']:.0f} packets/s{latency}")
+
+
+def build_early_dataset(pcap_files, backend="native", packets=MAX_EARLY_PACKETS, output_csv=EARLY_DATASET,
+                        idle_timeout=None, active_timeout=None):
+    """
+    Writes the training set of the early-classification models (see model/early_main.py): the
+    first `packets` packets of every flow of the captures, labelled (TYPE) with the capture's
+    application name. Flows are split on idle_timeout/active_timeout (default: the stream's,
+    see FlowStreamClassifier) like the stream splits the flows it classifies.
+    """
+    idle_timeout = DEFAULT_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+    active_timeout = DEFAULT_ACTIVE_TIMEOUT if active_timeout is None else active_timeout
+    datasets = []
+    for pcap_file in pcap_files:
+        app_name = os.path.splitext(pcap_file)[0]
+        analyzer = PacketAnalyzer(DATA_DIR / pcap_file, backend=backend, columns=STREAM_COLUMNS,
+                                  idle_timeout=idle_timeout, active_timeout=active_timeout)
+        flows = EarlyFlowClassifier.extract(pd.concat(analyzer.iter_features(), ignore_index=True), packets,
+                                            idle_timeout, active_timeout)
+        flows["TYPE"] = app_name
+        datasets.append(flows)
+        print(f"🔹 {len(flows)} flows from {pcap_file}")
+    if not datasets:
+        print("⚠ No .pcapng files found in data/ directory.")
+        return
+    DataProcessor.save_dataframe(pd.concat(datasets, ignore_index=True), output_csv)
+    print(f"✅ Early-classification dataset saved in {output_csv}")
+
+
+def menu(backend="pyshark", jobs=1, file_workers=1, flows=False, cache=None, output_format="csv", compact=False,
+         plot_workers=1, graphs="changed", idle_timeout=None, active_timeout=None, export_comparison=False):
     """Interactive menu to choose an option"""
     print("\nChoose an option:")
     print("1. Analysis only")
@@ -92,81 +370,229 @@ def menu():
 
     if choice == "1":
         print("Running analysis only...")
-        main(action_type="analysis")
+        main(action_type="analysis", backend=backend, jobs=jobs, file_workers=file_workers, flows=flows,
+             cache=cache, output_format=output_format, compact=compact, plot_workers=plot_workers,
+             graphs=graphs, idle_timeout=idle_timeout, active_timeout=active_timeout,
+             export_comparison=export_comparison)
     elif choice == "2":
         print("Running classification only...")
-        main(action_type="classification")
+        main(action_type="classification", backend=backend, jobs=jobs, file_workers=file_workers, flows=flows,
+             cache=cache, output_format=output_format, compact=compact, plot_workers=plot_workers,
+             graphs=graphs, idle_timeout=idle_timeout, active_timeout=active_timeout,
+             export_comparison=export_comparison)
     elif choice == "3":
         print("Running both analysis and classification...")
-        main(action_type="both")
+        main(action_type="both", backend=backend, jobs=jobs, file_workers=file_workers, flows=flows,
+             cache=cache, output_format=output_format, compact=compact, plot_workers=plot_workers,
+             graphs=graphs, idle_timeout=idle_timeout, active_timeout=active_timeout,
+             export_comparison=export_comparison)
     else:
         print("Invalid choice. Please select 1, 2, or 3.")
-        menu()  # Restart menu on invalid input
+        menu(backend, jobs, file_workers, flows, cache, output_format, compact, plot_workers, graphs, idle_timeout,
+             active_timeout, export_comparison)  # Restart menu on invalid input
 
 
-def main(input_file=None, action_type=None):
-    """Runs analysis on a single file (if specified) or processes all .pcapng files."""
+def main(input_file=None, action_type=None, backend="pyshark", jobs=1, file_workers=1, flows=False, cache=None,
+         output_format="csv", compact=False, plot_workers=1, graphs="changed", idle_timeout=None, active_timeout=None,
+         export_comparison=False):
+    """
+    Runs analysis on a single file (if specified) or processes all .pcapng files.
+
+    The time, packets and bytes of every stage of the run (see RunMetrics) are printed and saved
+    to results/metrics/ (run_<start time>_<pid>.json and metrics.prom), even when the run stops early.
+    """
 
     if action_type is None:
-        menu()  # If no action is provided, open the menu.
+        # If no action is provided, open the menu (it runs main again with the chosen action)
+        menu(backend, jobs, file_workers, flows, cache, output_format, compact, plot_workers, graphs, idle_timeout,
+             active_timeout, export_comparison)
+        return
+
+    metrics = RunMetrics()
+    try:
+        run_pipeline(input_file, action_type, backend, jobs, file_workers, flows, cache, output_format, compact,
+                     plot_workers, graphs, metrics, idle_timeout, active_timeout, export_comparison)
+    finally:
+        json_path, prom_path = metrics.write(METRICS_DIR)
+        print(f"⏱ Stages of this run:\n{metrics.report().to_string()}")
+        rss = peak_rss()
+        print(f"📈 Run metrics saved in {json_path} and {prom_path}"
+              + (f" (peak RSS {rss / 2 ** 20:.0f} MiB)" if rss is not None else ""))
+
 
+def run_pipeline(input_file, action_type, backend, jobs, file_workers, flows, cache, output_format, compact,
+                 plot_workers, graphs, metrics, idle_timeout=None, active_timeout=None, export_comparison=False):
+    """The analysis, classification and comparison stages of main(), timed into `metrics`."""
     results = []
-    comparison_csv = os.path.join(CSV_DIR, "comparison_results.csv")
+    comparison_csv = os.path.join(CSV_DIR, f"comparison_results.{output_format}")
 
-    # Load existing results if the file exists
-    if os.path.exists(comparison_csv):
-        existing_df = pd.read_csv(comparison_csv)
-    else:
-        existing_df = pd.DataFrame()
+    # The stages hand their tables over in memory; each changed one is saved once, at the end.
+    # The comparison table only holds this run's captures: the full history stays in the store
+    pipeline = Pipeline()
+    pipeline.register("classified", os.path.join(CSV_DIR, f"classified_results.{output_format}"))
 
     if action_type == "both" or action_type == "analysis":
         if input_file:
-            results.append(process_pcap_file(input_file))
+            results.append(process_pcap_file(input_file, backend, file_workers, flows, cache, output_format, compact,
+                                             plot_workers, graphs, metrics, idle_timeout, active_timeout))
         else:
-            pcap_files = [f for f in os.listdir(DATA_DIR) if f.endswith(".pcapng")]
+            pcap_files = sorted(f for f in os.listdir(DATA_DIR) if f.endswith(".pcapng"))
             if not pcap_files:
                 print("⚠ No .pcapng files found in data/ directory.")
                 return
-            for pcap_file in pcap_files:
-                result = process_pcap_file(pcap_file)
-                if result:
-                    results.append(result)
+            if jobs > 1:
+                print(f"⚙ Processing {len(pcap_files)} captures with {jobs} worker processes...")
+                for outcome in process_pcap_files(pcap_files, backend, jobs, flows, cache, output_format, compact,
+                                                  graphs, metrics, file_workers, plot_workers, idle_timeout,
+                                                  active_timeout):
+                    if outcome["error"]:
+                        print(f"❌ {outcome['file']} failed: {outcome['error']}")
+                    elif outcome["summary"]:
+                        results.append(outcome["summary"])
+            else:
+                for pcap_file in pcap_files:
+                    result = process_pcap_file(pcap_file, backend, file_workers, flows, cache, output_format, compact,
+                                               plot_workers, graphs, metrics, idle_timeout, active_timeout)
+                    if result:
+                        results.append(result)
 
-    # Convert new results to DataFrame
-    new_results_df = pd.DataFrame(results)
+        if cache is not None:
+            print(cache.report())
 
-    # Concatenate old and new results, remove duplicates
-    if not new_results_df.empty:
-        comparison_df = pd.concat([existing_df, new_results_df], ignore_index=True).drop_duplicates()
-        comparison_df.to_csv(comparison_csv, index=False)
+    # Store the new summaries (one upsert per capture, keyed on application and capture hash) and
+    # hand every stored capture, with its hand-added TYPE labels, to the classifier and the graphs
+    results = [summary for summary in results if summary]
+    with metrics.stage("store") as stage, ResultsStore(RESULTS_DB) as store:
+        if not len(store) and os.path.exists(comparison_csv):
+            # First run with the store: keep the results of earlier runs
+            store.import_table(DataProcessor.load_dataframe(comparison_csv))
+        for summary in results:
+            store.upsert(summary)
+        if len(store):
+            pipeline.put("comparison", store.query())
+        stage["rows"] = len(results)
+    if export_comparison:
+        # The whole history, only on request: every run would otherwise rewrite it in full
+        with metrics.stage("write") as stage, ResultsStore(RESULTS_DB) as store:
+            stage["rows"] = len(store.export(comparison_csv))
+        print(f"✅ Comparison results of {stage['rows']} captures exported to {comparison_csv}")
 
     if action_type == "both" or action_type == "classification":
-        if os.path.exists(comparison_csv):
-            model_path = os.path.join(os.path.dirname(os.getcwd()), 'model/my_trained_model.pkl')
+        if pipeline.exists("comparison"):
             try:
-                with open(model_path, 'rb') as f:
-                    model = pickle.load(f)
-                    print("✅ Model loaded successfully.")
+                with metrics.stage("load_model"):
+                    # Given the path, the classifier can fall back to the pickle for batches the export is slow on
+                    classifier = TrafficClassifier(model=MODEL_PATH, feature_columns=[
+                        "Flow_Size (Bytes)", "Flow_Volume (Packets)", "Avg_Packet_Size", "Inter_Packet_Time_Mean"
+                    ])
+                print("✅ Model loaded successfully.")
             except Exception as e:
                 print(f"❌ Error loading the model: {e}")
                 return
 
-            classifier = TrafficClassifier(model=model, feature_columns=[
-                "Flow_Size (Bytes)", "Flow_Volume (Packets)", "Avg_Packet_Size", "Inter_Packet_Time_Mean"
-            ])
-            classifier.classify_comparison_data(comparison_csv)
-            df_comparison = pd.read_csv(comparison_csv)
-            classifier.evaluate_predictions(df_comparison)
+            comparison = pipeline.get("comparison")
+            with metrics.stage("predict") as stage:
+                df_classified = classifier.classify_dataframe(comparison)
+                stage["rows"] = len(comparison)
+            if df_classified is not None:
+                pipeline.put("classified", df_classified)
+                classifier.evaluate_predictions(df_classified)
         else:
-            print("⚠ No comparison results CSV found, skipping classification.")
+            print("⚠ No stored comparison results found, skipping classification.")
 
     if action_type == "analysis":
-        print("✅ Analysis completed! Comparison results saved.")
+        print(f"✅ Analysis completed! Comparison results saved in {RESULTS_DB}.")
 
     print("📊 Generating comparison graphs...")
-    TrafficVisualizer.compare_results(comparison_csv)
+    if pipeline.exists("comparison"):
+        with metrics.stage("plot"):
+            TrafficVisualizer.compare_dataframe(pipeline.get("comparison"), graphs=graphs)
+    else:
+        print("⚠ No comparison results found. Run the analysis first.")
     print("✅ Comparison graphs saved.")
 
+    with metrics.stage("write"):
+        pipeline.persist()
+
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(description="Encrypted traffic analysis and classification")
+    parser.add_argument("--backend", choices=BACKENDS, default="pyshark",
+                        help="Packet decoder: pyshark (per-packet dissection), tshark (field extraction) or native (built-in reader)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes used to analyze the captures in data/ (default: 1); each "
+                             "uses its own --file-workers and --plot-workers processes")
+    parser.add_argument("--file-workers", type=int, default=1,
+                        help="Processes used to decode each single capture (native backend, default: 1)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always re-parse the captures instead of using the parse cache in results/cache/")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help="Size cap of the parse cache in MiB; least recently used entries are evicted (default: 1024)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="csv",
+                        help="Format of the parsed tables and comparison results: csv or parquet (typed, compressed; needs pyarrow)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Keep packet tables in memory-optimised dtypes (uint32 IPs, categoricals, nullable integers)")
+    parser.add_argument("--plot-workers", type=int, default=1,
+                        help="Processes drawing the per-application graphs of each capture (default: 1)")
+    parser.add_argument("--graphs", choices=GRAPH_MODES, default="changed",
+                        help="changed: only redraw graphs whose data or settings changed (default), all: redraw "
+                             "every graph, dry-run: list the graphs that would be redrawn without drawing them")
+    parser.add_argument("--export-comparison", action="store_true",
+                        help="Write every stored capture summary to results/CSV_files/comparison_results.<format> "
+                             "(otherwise only results/results.db is updated)")
+    parser.add_argument("--flows", action="store_true",
+                        help="Also save per-flow features (bidirectional 5-tuples) to results/CSV_files/<app>_flows.csv")
+    parser.add_argument("--idle-timeout", type=float, default=None, metavar="SECONDS",
+                        help="Seconds without packets after which a flow ends and its 5-tuple starts a new one "
+                             "(default: never for the analysis, 15 with --stream/--early-dataset)")
+    parser.add_argument("--active-timeout", type=float, default=None, metavar="SECONDS",
+                        help="Seconds after its first packet after which a flow ends "
+                             "(default: never for the analysis, 60 with --stream/--early-dataset)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Label flows continuously while replaying the captures in data/ (no menu)")
+    parser.add_argument("--speedup", type=float, default=None,
+                        help="With --stream: capture seconds replayed per second, e.g. 1 for real time (default: as fast as possible)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"With --stream: flows classified per model call (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY,
+                        help=f"With --stream: seconds a finished flow may wait for its batch to fill (default: {DEFAULT_MAX_DELAY})")
+    parser.add_argument("--early", type=int, default=None, metavar="N",
+                        help="With --stream: label each flow after its first N packets (model/early_model_N.pkl)")
+    parser.add_argument("--early-dataset", action="store_true",
+                        help="Write the first packets of every flow in data/ to processed_data/early_flows.csv "
+                             "(training set of model/early_main.py)")
+    parser.add_argument("--profile", metavar="CAPTURE", default=None,
+                        help="Analyze a single capture of data/ under a sampling profiler (no menu); its stacks are "
+                             "saved to results/metrics/profile_<app>.txt (add --no-cache to profile the parsing)")
+    args = parser.parse_args()
+    for option, timeout in (("--idle-timeout", args.idle_timeout), ("--active-timeout", args.active_timeout)):
+        if timeout is not None and timeout <= 0:
+            parser.error(f"{option} must be positive, got {timeout:g}")
+    return args
+
 
 if __name__ == "__main__":
-    menu()
+    args = parse_args()
+    DataProcessor.check_output_format(args.output_format)
+    if args.early_dataset:
+        build_early_dataset(sorted(f for f in os.listdir(DATA_DIR) if f.endswith(".pcapng")), args.backend,
+                            idle_timeout=args.idle_timeout, active_timeout=args.active_timeout)
+    elif args.stream:
+        stream_captures(sorted(f for f in os.listdir(DATA_DIR) if f.endswith(".pcapng")), args.backend,
+                        args.speedup, args.batch_size, args.max_delay, args.early, args.idle_timeout,
+                        args.active_timeout)
+    elif args.profile:
+        cache = None if args.no_cache else ParseCache(CACHE_DIR, args.cache_size << 20)
+        with SamplingProfiler() as profiler:
+            main(args.profile, "analysis", args.backend, 1, max(args.file_workers, 1), args.flows, cache,
+                 args.output_format, args.compact, max(args.plot_workers, 1), args.graphs, args.idle_timeout,
+                 args.active_timeout, args.export_comparison)
+        profile_file = profiler.save(METRICS_DIR / f"profile_{os.path.splitext(args.profile)[0]}.txt")
+        print(f"🔬 {profiler.samples} samples, hottest functions:\n{profiler.top(15).to_string(index=False)}")
+        print(f"✅ Collapsed stacks saved in {profile_file} (flamegraph.pl or speedscope)")
+    else:
+        cache = None if args.no_cache else ParseCache(CACHE_DIR, args.cache_size << 20)
+        menu(args.backend, max(args.jobs, 1), max(args.file_workers, 1), args.flows, cache, args.output_format,
+             args.compact, max(args.plot_workers, 1), args.graphs, args.idle_timeout, args.active_timeout,
+             args.export_comparison)
@@ -1,10 +1,14 @@
-import pyshark
+import numpy as np
 import pandas as pd
 import os
 import logging
+from collections import Counter
 from pathlib import Path
-from collections import defaultdict
-from data_processor import DataProcessor
+from data_processor import DataProcessor, OUTPUT_FORMATS
+from flow_table import FlowTable, FLOW_RECORD_COLUMNS, DEFAULT_IDLE_TIMEOUT, DEFAULT_ACTIVE_TIMEOUT
+from pcapng_reader import PcapngReader, TlsStreamState, IPPROTO_TCP, UNKNOWN_BASE, tcp_relative_numbers
+from run_metrics import RunMetrics
+from tshark_reader import TsharkFieldReader, hex_to_int
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -22,104 +26,501 @@ os.makedirs(CSV_DIR, exist_ok=True)
 os.makedirs(GRAPH_DIR, exist_ok=True)
 
 
+# Version of the extracted tables: bump it whenever a change alters extracted values,
+# so tables in the parse cache (see parse_cache.py) are parsed again
+PARSER_VERSION = 1
+
+# Packet decoding backends: PyShark (full tshark dissection), tshark field extraction
+# or the built-in pcap/pcapng reader
+BACKENDS = ("pyshark", "tshark", "native")
+
+# Every column extract_features can produce
+OUTPUT_COLUMNS = ('timestamp', 'packet_size', 'protocol', 'ip_src', 'ip_dst', 'transport',
+				  'tcp_seq', 'tcp_ack', 'tcp_window', 'tcp_flags',
+				  'tls_handshake_type', 'tls_version', 'tls_cipher_suite',
+				  'flow_size', 'flow_volume', 'inter_packet_time')
+
+# Flow key columns, only extracted on request (e.g. for FlowAggregator)
+PORT_COLUMNS = ('src_port', 'dst_port')
+
+# TCP payload length, only extracted on request (e.g. for TcpAnalyzer)
+SEGMENT_COLUMNS = ('tcp_len',)
+
+# Every column that can be requested, in output order
+ALL_COLUMNS = OUTPUT_COLUMNS + PORT_COLUMNS + SEGMENT_COLUMNS
+
+# Columns DataProcessor.clean_dataframe needs, always extracted
+REQUIRED_COLUMNS = ('timestamp', 'packet_size')
+
+# Packets per chunk in streaming mode (iter_features)
+DEFAULT_CHUNK_SIZE = 100_000
+
+
 class PacketAnalyzer:
-	def __init__(self, pcap_file):
+	def __init__(self, pcap_file, backend="pyshark", columns=None, workers=1, idle_timeout=None, active_timeout=None,
+				 output_format="csv", compact=False, metrics=None, on_expire=None):
+		"""
+		Args:
+			pcap_file (str): Path to the .pcap/.pcapng capture.
+			backend (str): One of BACKENDS.
+			columns (iterable): Output columns (default: OUTPUT_COLUMNS), PORT_COLUMNS and SEGMENT_COLUMNS.
+			workers (int): Processes used to decode a single pcapng file (native backend only).
+			idle_timeout (float): Seconds without packets that end a flow (None: never, or 15 when streaming).
+			active_timeout (float): Seconds after which a flow ends (None: never, or 60 when streaming).
+			output_format (str): Format of the table saved next to the capture, one of OUTPUT_FORMATS.
+			compact (bool): Return tables in memory-optimised dtypes (see DataProcessor.compact_dataframe).
+			metrics (RunMetrics): Receives the time and volume of every stage and the skipped packets.
+			on_expire (callable): Called with the flow records of ended flows (see FlowTable), dropped otherwise.
+		"""
+		if backend not in BACKENDS:
+			raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+		columns = OUTPUT_COLUMNS if columns is None else tuple(columns)
+		unknown = [col for col in columns if col not in ALL_COLUMNS]
+		if unknown:
+			raise ValueError(f"Unknown columns {unknown}, expected a subset of {ALL_COLUMNS}")
+		if output_format not in OUTPUT_FORMATS:
+			raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}")
 		self.pcap_file = pcap_file
-		self.flows = defaultdict(lambda: {'size': 0, 'volume': 0, 'last_timestamp': None})
+		self.backend = backend
+		self.workers = workers
+		self.output_format = output_format
+		self.compact = compact
+		self.metrics = metrics if metrics is not None else RunMetrics()
+		self.columns = tuple(dict.fromkeys(REQUIRED_COLUMNS + columns))
+		self.idle_timeout = idle_timeout
+		self.active_timeout = active_timeout
+		self.on_expire = on_expire
+		self.flows = FlowTable(idle_timeout, active_timeout, on_expire=self._flows_expired)
+		# Native backend: (base sequence number, window shift) per TCP direction and TLS reassembly
+		# state, carried between chunks until the flow ends
+		self.tcp_state = {}
+		self.tls_streams = TlsStreamState()
 
 	def extract_features(self):
 		"""
-        Reads a PCAP file using PyShark and extracts packet features,
+        Reads a PCAP file with the selected backend and extracts packet features,
         including Flow-Level and Traffic-Level features.
 
         Returns:
             pd.DataFrame: Dataframe containing extracted traffic data.
         """
 		try:
-			# Open the pcap file with PyShark (no packet buffering for faster parsing)
-			cap = pyshark.FileCapture(self.pcap_file, keep_packets=False)
-
-			packets = []
-
-			for pkt in cap:
-				try:
-					# Ensure packet has IP and Transport Layer
-					if not hasattr(pkt, 'ip') or not hasattr(pkt, 'transport_layer'):
-						continue  # Skip packets without these layers
-
-					# Identify flow key (5-tuple: src IP, dst IP, protocol, src port, dst port)
-					flow_key = (
-						pkt.ip.src,
-						pkt.ip.dst,
-						pkt.transport_layer,
-						pkt[pkt.transport_layer].srcport if hasattr(pkt, pkt.transport_layer) else None,
-						pkt[pkt.transport_layer].dstport if hasattr(pkt, pkt.transport_layer) else None,
-					)
-
-					# Extract basic packet features
-					packet_data = {
-						'timestamp': float(pkt.sniff_timestamp),
-						'packet_size': int(pkt.length),
-						'protocol': pkt.highest_layer,
-						'ip_src': pkt.ip.src,
-						'ip_dst': pkt.ip.dst,
-						'transport': pkt.transport_layer
-					}
-
-					# TCP-specific features
-					if hasattr(pkt, 'tcp'):
-						packet_data.update({
-							'tcp_seq': int(pkt.tcp.seq) if hasattr(pkt.tcp,
-																   'seq') and pkt.tcp.seq.isnumeric() else None,
-							'tcp_ack': int(pkt.tcp.ack) if hasattr(pkt.tcp,
-																   'ack') and pkt.tcp.ack.isnumeric() else None,
-							'tcp_window': int(pkt.tcp.window_size) if hasattr(pkt.tcp,
-																			  'window_size') and pkt.tcp.window_size.isnumeric() else None,
-							'tcp_flags': int(pkt.tcp.flags, 16) if hasattr(pkt.tcp, 'flags') else None,
-						})
-
-					# TLS-specific features
-					if hasattr(pkt, 'tls'):
-						packet_data.update({
-							'tls_handshake_type': int(pkt.tls.handshake_type) if hasattr(pkt.tls,
-																						 'handshake_type') else None,
-							'tls_version': pkt.tls.record_version if hasattr(pkt.tls, 'record_version') else None,
-							'tls_cipher_suite': pkt.tls.cipher_suite if hasattr(pkt.tls, 'cipher_suite') else None
-						})
-
-					# Flow-level metrics
-					self.flows[flow_key]['size'] += packet_data['packet_size']
-					self.flows[flow_key]['volume'] += 1
-					packet_data['flow_size'] = self.flows[flow_key]['size']
-					packet_data['flow_volume'] = self.flows[flow_key]['volume']
-
-					# Calculate Inter-Packet Time
-					if self.flows[flow_key]['last_timestamp'] is not None:
-						packet_data['inter_packet_time'] = packet_data['timestamp'] - self.flows[flow_key][
-							'last_timestamp']
-					else:
-						packet_data['inter_packet_time'] = None
-					self.flows[flow_key]['last_timestamp'] = packet_data['timestamp']
-
-					# Append extracted packet data
-					packets.append(packet_data)
-
-				except Exception as e:
-					logging.warning(f"⚠ Error processing packet: {e}")
-					continue  # Skip the problematic packet
-
-			cap.close()
-			df = pd.DataFrame(packets)
+			if self.backend == "native":
+				df = self._extract_with_native_reader()
+			elif self.backend == "tshark":
+				df = self._extract_with_tshark()
+			else:
+				df = self._extract_with_pyshark()
+			df = df[[col for col in df.columns if col in self.columns]]
 
 			# Clean the dataframe using DataProcessor
-			df = DataProcessor.clean_dataframe(df)
+			with self.metrics.stage('clean') as stage:
+				if self.compact:
+					# Measured against the cleaned table in default dtypes: the report only shows what compaction saves
+					cleaned = DataProcessor.clean_dataframe(df, keep_missing=True)
+					df = DataProcessor.compact_dataframe(cleaned)
+					report = DataProcessor.memory_report(cleaned, df)
+					logging.info(f"🧮 Compact dtypes: {report.loc['total', 'before']} -> {report.loc['total', 'after']} bytes/row\n{report}")
+				else:
+					df = DataProcessor.clean_dataframe(df)
+				stage['rows'] = len(df)
 
-			# Save to CSV
-			output_csv = Path(self.pcap_file).with_suffix('.csv')
-			DataProcessor.save_dataframe_to_csv(df, output_csv)
+			# Save to CSV (or Parquet)
+			output_file = Path(self.pcap_file).with_suffix('.' + self.output_format)
+			with self.metrics.stage('write') as stage:
+				DataProcessor.save_dataframe(df, output_file)
+				stage['rows'], stage['bytes'] = len(df), os.path.getsize(output_file)
 
 			return df
 
 		except Exception as e:
 			logging.error(f"❌ Error reading file {self.pcap_file}: {e}")
-			return pd.DataFrame()  # Return empty DataFrame if error occurs
\ No newline at end of file
+			self.metrics.fail(type(e).__name__)
+			return pd.DataFrame()  # Return empty DataFrame if error occurs
+
+	def iter_features(self, chunk_size=DEFAULT_CHUNK_SIZE, output_csv=None):
+		"""Streaming version of extract_features: yields cleaned chunks of up to chunk_size packets (also appended to output_csv)."""
+		# Flow totals, TCP relative numbers and TLS reassembly carry over between chunks until a flow ends (see
+		# _flows_expired), so the chunks match extract_features with the same timeouts, except that a 5-tuple
+		# coming back after its flow ended starts over. Missing numbers take the median of their own chunk.
+		if chunk_size < 1:
+			raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+		columns = [col for col in ALL_COLUMNS if col in self.columns]
+		written = False
+		self.flows = FlowTable(DEFAULT_IDLE_TIMEOUT if self.idle_timeout is None else self.idle_timeout,
+							   DEFAULT_ACTIVE_TIMEOUT if self.active_timeout is None else self.active_timeout,
+							   on_expire=self._flows_expired)
+		self.tcp_state, self.tls_streams = {}, TlsStreamState()
+
+		for df in self._packet_tables(chunk_size):
+			if df.empty:
+				continue
+			with self.metrics.stage('clean') as stage:
+				df = DataProcessor.clean_dataframe(df.reindex(columns=columns), compact=self.compact)
+				stage['rows'] = len(df)
+			if output_csv is not None:
+				with self.metrics.stage('write') as stage:
+					DataProcessor.append_dataframe_to_csv(df, output_csv, header=not written)
+					stage['rows'] = len(df)
+				written = True
+			# Flows idle since before the end of the chunk cannot continue: free their state now
+			self.flows.expire_idle(df['timestamp'].iloc[-1])
+			yield df
+
+		if output_csv is not None and not written:
+			DataProcessor.append_dataframe_to_csv(pd.DataFrame(columns=columns), output_csv, header=True)
+
+	def _flows_expired(self, records):
+		"""Frees the TCP/TLS state of ended flows and hands their records to on_expire (the flow table keeps none)."""
+		for flow_key in zip(*(records[col].tolist() for col in FLOW_RECORD_COLUMNS[:5])):
+			if flow_key in self.flows:
+				continue  # The 5-tuple already started a new flow, which still needs the state
+			ip_src, ip_dst, transport, src_port, dst_port = flow_key
+			self.tcp_state.pop(flow_key, None)
+			reverse = (ip_dst, ip_src, transport, dst_port, src_port)
+			if reverse not in self.flows:
+				self.tcp_state.pop(reverse, None)  # Set by ACKs even when that direction sent nothing
+			if self.backend == "native" and transport == 'TCP':
+				self.tls_streams.drop(_ip_value(ip_src), _ip_value(ip_dst), int(src_port), int(dst_port))
+		if self.on_expire is not None:
+			self.on_expire(records)
+
+	def _packet_tables(self, chunk_size=None):
+		"""Yields the packet table of the capture in chunks of up to chunk_size packets (one table if None)."""
+		if self.backend == "native":
+			return self._native_tables(chunk_size)
+		if self.backend == "tshark":
+			return self._tshark_tables(chunk_size)
+		return self._pyshark_tables(chunk_size)
+
+	def _extract_with_pyshark(self):
+		"""Dissects every packet with PyShark (one tshark dissection per packet)."""
+		return _single_table(self._pyshark_tables())
+
+	def _pyshark_tables(self, chunk_size=None):
+		"""Yields the PyShark packet table in chunks of up to chunk_size packets (one table if None)."""
+		import pyshark  # Only this backend needs it, and it is slow to import
+
+		# Open the pcap file with PyShark (no packet buffering for faster parsing)
+		cap = pyshark.FileCapture(self.pcap_file, keep_packets=False)
+		self.metrics.add('dissect', calls=0, bytes=os.path.getsize(self.pcap_file))
+
+		errors = Counter()  # Packets skipped, by error type
+
+		# PyShark dissects lazily while the fields are read, so each chunk is timed as a whole
+		for seen, packets in self.metrics.timed(self._pyshark_chunks(cap, chunk_size, errors), 'dissect'):
+			self.metrics.add('dissect', calls=0, packets=seen)
+			if packets:
+				yield self._timed_table(pd.DataFrame, packets)
+			elif chunk_size is None:
+				yield pd.DataFrame()
+
+		cap.close()
+		if errors:
+			for error, count in errors.items():
+				self.metrics.skip('extract', error, count)
+			logging.warning(f"⚠ {sum(errors.values())} packets of {self.pcap_file} skipped after errors: {dict(errors)}")
+
+	def _pyshark_chunks(self, cap, chunk_size, errors):
+		"""Yields (packets read, packet dicts) for chunks of up to chunk_size kept packets, counting errors by type."""
+		packets = []
+		seen = 0
+		for pkt in cap:
+			seen += 1
+			try:
+				# Ensure packet has IP and Transport Layer
+				if not hasattr(pkt, 'ip') or not hasattr(pkt, 'transport_layer'):
+					continue  # Skip packets without these layers
+
+				# Identify flow key (5-tuple: src IP, dst IP, protocol, src port, dst port)
+				flow_key = (
+					pkt.ip.src,
+					pkt.ip.dst,
+					pkt.transport_layer,
+					pkt[pkt.transport_layer].srcport if hasattr(pkt, pkt.transport_layer) else None,
+					pkt[pkt.transport_layer].dstport if hasattr(pkt, pkt.transport_layer) else None,
+				)
+
+				# Extract basic packet features
+				packet_data = {
+					'timestamp': float(pkt.sniff_timestamp),
+					'packet_size': int(pkt.length),
+					'protocol': pkt.highest_layer,
+					'ip_src': pkt.ip.src,
+					'ip_dst': pkt.ip.dst,
+					'transport': pkt.transport_layer
+				}
+				if 'src_port' in self.columns:
+					packet_data.update({'src_port': flow_key[3], 'dst_port': flow_key[4]})
+
+				# TCP-specific features
+				if hasattr(pkt, 'tcp'):
+					packet_data.update({
+						'tcp_seq': int(pkt.tcp.seq) if hasattr(pkt.tcp,
+															   'seq') and pkt.tcp.seq.isnumeric() else None,
+						'tcp_ack': int(pkt.tcp.ack) if hasattr(pkt.tcp,
+															   'ack') and pkt.tcp.ack.isnumeric() else None,
+						'tcp_window': int(pkt.tcp.window_size) if hasattr(pkt.tcp,
+																		  'window_size') and pkt.tcp.window_size.isnumeric() else None,
+						'tcp_flags': int(pkt.tcp.flags, 16) if hasattr(pkt.tcp, 'flags') else None,
+					})
+					if 'tcp_len' in self.columns:
+						packet_data['tcp_len'] = int(pkt.tcp.len) if hasattr(pkt.tcp, 'len') else None
+
+				# TLS-specific features
+				if hasattr(pkt, 'tls'):
+					packet_data.update({
+						'tls_handshake_type': int(pkt.tls.handshake_type) if hasattr(pkt.tls,
+																					 'handshake_type') else None,
+						'tls_version': pkt.tls.record_version if hasattr(pkt.tls, 'record_version') else None,
+						'tls_cipher_suite': pkt.tls.cipher_suite if hasattr(pkt.tls, 'cipher_suite') else None
+					})
+
+				# Flow-level metrics and Inter-Packet Time
+				flow_size, flow_volume, inter_packet_time = self.flows.add_packet(
+					flow_key, packet_data['timestamp'], packet_data['packet_size'])
+				packet_data['flow_size'] = flow_size
+				packet_data['flow_volume'] = flow_volume
+				packet_data['inter_packet_time'] = inter_packet_time
+
+				# Append extracted packet data
+				packets.append(packet_data)
+
+			except Exception as e:
+				# Counted by error type and reported once per capture
+				errors[type(e).__name__] += 1
+				logging.debug(f"⚠ Error processing packet: {e}")
+				continue  # Skip the problematic packet
+			if len(packets) == chunk_size:
+				yield seen, packets
+				packets, seen = [], 0
+
+		if chunk_size is None or packets or seen:
+			yield seen, packets
+
+	def _extract_with_native_reader(self):
+		"""Decodes the capture with PcapngReader into the table the PyShark path builds, with vectorized flow columns."""
+		return _single_table(self._native_tables())
+
+	def _native_tables(self, chunk_size=None):
+		"""Yields the native reader's packet table in chunks of up to chunk_size frames (one table if None)."""
+		reader = PcapngReader(self.pcap_file)
+		self.metrics.add('dissect', calls=0, bytes=os.path.getsize(self.pcap_file))
+		if chunk_size is not None:
+			chunks = self.metrics.timed(reader.iter_columns(chunk_size, self.tls_streams), 'dissect')
+		else:
+			with self.metrics.stage('dissect'):
+				# Flow metrics are computed after the shards are concatenated in file order,
+				# so a sharded decode yields exactly the flow state of a sequential one
+				chunks = [reader.read_columns_parallel(self.workers) if self.workers > 1 else reader.read_columns()]
+
+		for columns in chunks:
+			self.metrics.add('dissect', calls=0, packets=len(columns['timestamp']))
+			if len(columns['timestamp']) == 0:
+				if chunk_size is None:
+					yield pd.DataFrame()
+				continue
+			yield self._timed_table(self._native_table, columns)
+
+	def _native_table(self, columns):
+		"""Builds the packet table of one set of decoded columns (the whole capture or one chunk)."""
+		is_tcp = columns['proto'] == IPPROTO_TCP
+		keys = pd.DataFrame({
+			'ip_src': _ip_strings(columns['ip_src']),
+			'ip_dst': _ip_strings(columns['ip_dst']),
+			'transport': np.where(is_tcp, 'TCP', 'UDP').astype(object),
+			'src_port': _port_strings(columns['src_port']),
+			'dst_port': _port_strings(columns['dst_port']),
+		})
+		flow_ids, reverse_ids, flow_keys = _flow_ids(keys)
+
+		data = {
+			'timestamp': columns['timestamp'],
+			'packet_size': columns['packet_size'],
+			'protocol': columns['highest_layer'],
+			'ip_src': keys['ip_src'].to_numpy(),
+			'ip_dst': keys['ip_dst'].to_numpy(),
+			'transport': keys['transport'].to_numpy(),
+		}
+		data.update(self._port_columns(keys))
+		optional = {}
+		if is_tcp.any():
+			# Base sequence numbers and window shifts fixed by earlier chunks
+			prior = [self.tcp_state.get(flow_key, (UNKNOWN_BASE, -1)) for flow_key in flow_keys]
+			prior_base = np.array([state[0] for state in prior], dtype=np.int64)
+			prior_shift = np.array([state[1] for state in prior], dtype=np.int64)
+			tcp_seq, tcp_ack, tcp_window, base, shift = tcp_relative_numbers(
+				columns, flow_ids, reverse_ids, prior_base, prior_shift)
+			for flow_id in np.flatnonzero((base != UNKNOWN_BASE) | (shift >= 0)):
+				self.tcp_state[flow_keys[flow_id]] = (int(base[flow_id]), int(shift[flow_id]))
+
+			tcp = {
+				'tcp_seq': _masked(tcp_seq, is_tcp),
+				'tcp_ack': _masked(tcp_ack, is_tcp),
+				'tcp_window': _masked(tcp_window, is_tcp),
+				'tcp_flags': _masked(columns['tcp_flags'].astype(np.int64), is_tcp),
+			}
+			if 'tcp_len' in self.columns:
+				tcp['tcp_len'] = _masked(columns['payload_len'].astype(np.int64), is_tcp)
+			optional['tcp'] = (is_tcp, tcp)
+		is_tls = columns['highest_layer'] == 'TLS'
+		if is_tls.any():
+			handshake = columns['tls_handshake_type']
+			optional['tls'] = (is_tls, {
+				'tls_handshake_type': _masked(handshake.astype(np.int64), is_tls & (handshake >= 0)),
+				'tls_version': columns['tls_version'],
+				'tls_cipher_suite': columns['tls_cipher_suite'],
+			})
+
+		return self._packet_table(flow_ids, flow_keys, data, optional)
+
+	def _extract_with_tshark(self):
+		"""Streams only the needed fields out of tshark (`-T fields`) into the table the PyShark path builds."""
+		return _single_table(self._tshark_tables())
+
+	def _tshark_tables(self, chunk_size=None):
+		"""Yields the tshark packet table in chunks of up to chunk_size packets (one table if None)."""
+		self.metrics.add('dissect', calls=0, bytes=os.path.getsize(self.pcap_file))
+		# tshark dissects while its output is read
+		for table in self.metrics.timed(TsharkFieldReader(self.pcap_file, self.columns).iter_tables(chunk_size), 'dissect'):
+			self.metrics.add('dissect', calls=0, packets=len(table))
+			if table.empty:
+				if chunk_size is None:
+					yield pd.DataFrame()
+				continue
+			yield self._timed_table(self._tshark_table, table)
+
+	def _tshark_table(self, table):
+		"""Builds the packet table of one block of tshark output."""
+		is_tcp = table['tcp.srcport'].notna().to_numpy()
+		keys = pd.DataFrame({
+			'ip_src': table['ip.src'].to_numpy(dtype=object),
+			'ip_dst': table['ip.dst'].to_numpy(dtype=object),
+			'transport': np.where(is_tcp, 'TCP', 'UDP').astype(object),
+			'src_port': table['tcp.srcport'].fillna(table['udp.srcport']).to_numpy(dtype=object),
+			'dst_port': table['tcp.dstport'].fillna(table['udp.dstport']).to_numpy(dtype=object),
+		})
+		flow_ids, _, flow_keys = _flow_ids(keys)
+
+		data = {
+			'timestamp': table['frame.time_epoch'].to_numpy(),
+			'packet_size': table['frame.len'].to_numpy(dtype=np.int64),
+		}
+		if 'frame.protocols' in table:
+			# PyShark's highest_layer is the last protocol of the frame
+			data['protocol'] = table['frame.protocols'].str.rsplit(':', n=1).str[-1].str.upper().to_numpy(dtype=object)
+		data.update({
+			'ip_src': keys['ip_src'].to_numpy(),
+			'ip_dst': keys['ip_dst'].to_numpy(),
+			'transport': keys['transport'].to_numpy(),
+		})
+		data.update(self._port_columns(keys))
+
+		optional = {}
+		if is_tcp.any():
+			tcp = {}
+			for col, field in (('tcp_seq', 'tcp.seq'), ('tcp_ack', 'tcp.ack'), ('tcp_window', 'tcp.window_size'),
+							   ('tcp_len', 'tcp.len')):
+				if field in table:
+					tcp[col] = table[field].to_numpy()
+			if 'tcp.flags' in table:
+				tcp['tcp_flags'] = hex_to_int(table['tcp.flags'])
+			optional['tcp'] = (is_tcp, tcp)
+
+		tls_fields = [field for field in ('tls.handshake.type', 'tls.record.version', 'tls.handshake.ciphersuite')
+					  if field in table]
+		is_tls = table[tls_fields].notna().any(axis=1).to_numpy() if tls_fields else np.zeros(len(table), bool)
+		if is_tls.any():
+			tls = {}
+			if 'tls.handshake.type' in table:
+				tls['tls_handshake_type'] = table['tls.handshake.type'].to_numpy()
+			if 'tls.record.version' in table:
+				tls['tls_version'] = table['tls.record.version'].to_numpy(dtype=object)
+			if 'tls.handshake.ciphersuite' in table:
+				# Only a ServerHello carries the negotiated suite; a ClientHello lists the offered ones
+				server_hello = table['tls.handshake.type'] == 2
+				tls['tls_cipher_suite'] = table['tls.handshake.ciphersuite'].where(server_hello).to_numpy(dtype=object)
+			optional['tls'] = (is_tls, tls)
+
+		return self._packet_table(flow_ids, flow_keys, data, optional)
+
+	def _timed_table(self, build, decoded):
+		"""Builds a packet table from decoded columns as one call of the extract stage."""
+		with self.metrics.stage('extract') as stage:
+			table = build(decoded)
+			stage['packets'], stage['bytes'] = len(table), int(table['packet_size'].sum())
+		return table
+
+	def _port_columns(self, keys):
+		"""Returns the requested PORT_COLUMNS of a flow key table."""
+		return {col: keys[col].to_numpy() for col in PORT_COLUMNS if col in self.columns}
+
+	def _packet_table(self, flow_ids, flow_keys, data, optional):
+		"""Adds the flow columns (continuing the flows of earlier chunks) to decoded columns and builds the DataFrame."""
+		# flow_keys holds the 5-tuple of each flow id; optional maps a layer to (row mask, columns) for the
+		# layers only some packets carry
+		# Flow-level metrics (running totals per 5-tuple, in capture order, continuing earlier chunks)
+		flow_size, flow_volume, inter_packet_time = self.flows.update(
+			flow_keys, flow_ids, data['timestamp'], data['packet_size'])
+
+		# Keep the column order pd.DataFrame(list_of_dicts) gives: keys in order of first appearance
+		first_rows = sorted(optional, key=lambda name: int(np.argmax(optional[name][0])))
+		for name in [n for n in first_rows if optional[n][0][0]]:
+			data.update(optional[name][1])
+		data.update({
+			'flow_size': flow_size,
+			'flow_volume': flow_volume,
+			'inter_packet_time': inter_packet_time,
+		})
+		for name in [n for n in first_rows if not optional[n][0][0]]:
+			data.update(optional[name][1])
+
+		return pd.DataFrame(data)
+
+
+def _ip_strings(addresses):
+	"""Formats uint32 IPv4 addresses as dotted-quad strings (each distinct address once)."""
+	unique, inverse = np.unique(addresses, return_inverse=True)
+	names = np.array([f"{a >> 24}.{(a >> 16) & 0xFF}.{(a >> 8) & 0xFF}.{a & 0xFF}" for a in unique.tolist()], dtype=object)
+	return names[inverse]
+
+
+def _ip_value(address):
+	"""Parses a dotted-quad IPv4 address into its uint32 value."""
+	a, b, c, d = map(int, address.split('.'))
+	return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def _port_strings(ports):
+	"""Formats ports as strings, the way PyShark reports them."""
+	unique, inverse = np.unique(ports, return_inverse=True)
+	return np.array([str(p) for p in unique.tolist()], dtype=object)[inverse]
+
+
+def _flow_ids(keys):
+	"""Numbers the 5-tuples in order of first appearance: (flow id per packet, reverse flow id per packet, 5-tuples)."""
+	# The opposite direction of a flow without packets of its own gets an id after the seen flows, so
+	# the base sequence number an ACK gives it can be tracked (and carried to the next chunk)
+	flow_ids = keys.groupby(list(keys.columns), sort=False).ngroup().to_numpy()
+	first = keys.drop_duplicates()
+	index = pd.MultiIndex.from_frame(first)
+	reverse = pd.MultiIndex.from_arrays([first['ip_dst'], first['ip_src'], first['transport'],
+										  first['dst_port'], first['src_port']])
+	reverse_of_flow = index.get_indexer(reverse)
+	unseen = np.flatnonzero(reverse_of_flow < 0)
+	reverse_of_flow[unseen] = len(first) + np.arange(len(unseen))
+	flow_keys = list(index) + list(reverse[unseen])
+	return flow_ids, reverse_of_flow[flow_ids], flow_keys
+
+
+def _single_table(tables):
+	"""Runs a table generator to the end and returns its only table (an empty DataFrame if none)."""
+	tables = list(tables)
+	return tables[0] if tables else pd.DataFrame()
+
+
+def _masked(values, mask):
+	"""Returns values where mask is set and NaN elsewhere (ints stay ints when nothing is masked)."""
+	if mask.all():
+		return values
+	return np.where(mask, values, np.nan)
@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+import pickle
+
+from file_manager import FileManager
+
+# Default size cap of the cache directory
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Suffix of cache entries (anything else in the directory is left alone)
+ENTRY_SUFFIX = '.pkl'
+
+
+class ParseCache:
+    """
+    Content-addressed cache of parsed captures.
+
+    An entry is keyed on the SHA-256 of the capture bytes plus the parser settings (backend,
+    parser version, extracted columns), so a renamed or touched capture still hits and an
+    edited one, or a parser upgrade, misses. Entries are pickles written atomically; the
+    least recently used ones are evicted once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_digest(path):
+        """Returns the SHA-256 hex digest of a file, read in 1 MiB blocks."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key(self, pcap_file, *settings, digest=None):
+        """
+        Builds the cache key of a capture.
+
+        Args:
+            pcap_file (str): Path of the capture.
+            settings: Anything else the parsed result depends on (backend, parser version, columns...).
+            digest (str): file_digest(pcap_file), when the caller already has it.
+        """
+        parts = [digest or self.file_digest(pcap_file)] + [repr(setting) for setting in settings]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached value of a key (None on a miss) and marks it as recently used."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # The modification time orders entries for LRU eviction
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logging.warning(f"⚠ Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores a value, then evicts least recently used entries beyond the size cap."""
+        # Atomic, so a concurrent reader (another worker process) never sees half an entry
+        FileManager.write_atomic(self._path(key), lambda f: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(ENTRY_SUFFIX):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue  # Evicted by another process meanwhile
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def record(self, hit):
+        """Counts a lookup made by another process (see main.process_pcap_files)."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def report(self):
+        """One-line hit/miss summary."""
+        return f"🗄 Parse cache: {self.hits} hit(s), {self.misses} miss(es) ({self.cache_dir})"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
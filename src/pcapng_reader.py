@@ -0,0 +1,864 @@
+import logging
+import mmap
+import os
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Block types of the pcapng format
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Consecutive well-formed blocks required to accept a shard boundary found by scanning
+SHARD_SYNC_BLOCKS = 4
+
+# Classic pcap magic numbers -> (byte order, timestamp fraction digits)
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 6),
+    b'\xa1\xb2\xc3\xd4': ('>', 6),
+    b'\x4d\x3c\xb2\xa1': ('<', 9),
+    b'\xa1\xb2\x3c\x4d': ('>', 9),
+}
+
+# Link-layer types we know how to strip down to the IP header
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+TCP_FLAG_SYN = 0x002
+TCP_FLAG_ACK = 0x010
+
+# Base sequence number of a TCP direction no segment or ACK has been seen for yet
+UNKNOWN_BASE = np.iinfo(np.int64).min
+
+# TLS handshake message types, used to tell a cleartext handshake from an encrypted one
+TLS_HANDSHAKE_TYPES = {0, 1, 2, 4, 5, 8, 11, 12, 13, 14, 15, 16, 20, 21, 22, 23, 24, 254}
+
+# Records per segment the vectorized path of reassemble_tls decodes before leaving the segment to the loop
+WHOLE_RECORDS_MAX = 8
+
+
+class PcapngReader:
+    """
+    Pure-Python pcap/pcapng reader.
+
+    Walks the capture blocks with mmap + struct and decodes the Ethernet/IPv4/TCP/UDP
+    headers of all frames at once with NumPy, so no per-packet dissector objects are built.
+    """
+
+    def __init__(self, pcap_file):
+        self.pcap_file = pcap_file
+
+    def read_columns(self):
+        """
+        Decodes every IPv4 TCP/UDP frame of the capture.
+
+        Returns:
+            dict: NumPy column arrays (one entry per decoded packet, in capture order).
+        """
+        if os.path.getsize(self.pcap_file) == 0:
+            columns = decode_frames(np.zeros(0, dtype=np.uint8), empty_frame_index())
+            add_tls_layers(None, columns)
+            return columns
+
+        with open(self.pcap_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                frames = self.index_frames(mm)
+                buf = np.frombuffer(mm, dtype=np.uint8)
+                try:
+                    columns = decode_frames(buf, frames)
+                    add_tls_layers(buf, columns)
+                    return columns
+                finally:
+                    # Release the buffer export before the mmap is closed
+                    del buf
+
+    def iter_columns(self, chunk_size, tls_streams=None):
+        """
+        Decodes the capture in chunks of up to chunk_size frames, so only one chunk of decoded
+        columns is in memory at a time. TLS records split across chunks are still reassembled:
+        the per-stream reassembly state is carried from one chunk to the next.
+
+        Args:
+            tls_streams (TlsStreamState): The carried state (default: a new one); the caller can
+                drop the streams of ended flows from it between chunks.
+
+        Yields:
+            dict: NumPy column arrays of the IPv4 TCP/UDP packets of each chunk, in capture order.
+        """
+        if os.path.getsize(self.pcap_file) == 0:
+            return
+
+        tls_streams = TlsStreamState() if tls_streams is None else tls_streams
+        with open(self.pcap_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = np.frombuffer(mm, dtype=np.uint8)
+                try:
+                    for frames in self.iter_frames(mm, chunk_size):
+                        columns = decode_frames(buf, frames)
+                        add_tls_layers(buf, columns, tls_streams)
+                        yield columns
+                finally:
+                    del buf
+
+    def read_columns_parallel(self, workers):
+        """
+        Same as read_columns, with the decoding spread over `workers` processes.
+
+        The packet blocks are split into byte ranges on block boundaries and each range is
+        decoded in its own process; the shards are concatenated in file order. TLS reassembly
+        then runs per TCP stream, with the streams partitioned over the same workers.
+        Classic pcap files (no block lengths to resynchronise on) are read sequentially.
+
+        Returns:
+            dict: NumPy column arrays, identical to read_columns().
+        """
+        with open(self.pcap_file, 'rb') as f:
+            if workers <= 1 or f.read(4) != struct.pack('<I', PCAPNG_SHB):
+                return self.read_columns()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                shards = self.shard_ranges(mm, workers)
+        if len(shards) <= 1:
+            return self.read_columns()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                parts = list(pool.map(_decode_shard, [self.pcap_file] * len(shards), shards))
+            except IndexError:
+                # An Interface Description Block in the middle of the file: only a full walk sees it
+                logging.warning(f"⚠ {self.pcap_file} defines interfaces mid-file, decoding sequentially")
+                return self.read_columns()
+            columns = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+            # Payload offsets are file offsets, so any process can reassemble any stream
+            streams = tls_stream_ids(columns)
+            rows = np.flatnonzero(streams >= 0)
+            groups = [rows[streams[rows] % workers == w] for w in range(workers)]
+            groups = [group for group in groups if len(group)]
+            tasks = []
+            for group in groups:
+                segments = {key: columns[key][group] for key in TLS_SEGMENT_COLUMNS}
+                segments['stream'] = streams[group]
+                tasks.append(segments)
+            results = list(pool.map(_reassemble_shard, [self.pcap_file] * len(tasks), tasks))
+
+        if groups:
+            tls = {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+            set_tls_columns(columns, np.concatenate(groups), tls)
+        else:
+            set_tls_columns(columns, rows, _empty_tls(0))
+        return columns
+
+    def shard_ranges(self, mm, shards):
+        """
+        Splits the packet blocks of a pcapng file into about `shards` byte ranges that start on block boundaries.
+
+        Returns:
+            list: (start, end, interfaces, byte order) per range; interfaces are those declared before the first packet.
+        """
+        size = len(mm)
+        endian, interfaces = '<', []
+        pos = 0
+        while pos + 12 <= size:
+            block_type = struct.unpack_from(endian + 'I', mm, pos)[0]
+            if block_type == PCAPNG_SHB:
+                endian = '<' if struct.unpack_from('<I', mm, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+            elif block_type == PCAPNG_EPB or block_type == PCAPNG_PB:
+                break
+            block_len = struct.unpack_from(endian + 'I', mm, pos + 4)[0]
+            if block_len < 12:
+                break
+            if block_type == PCAPNG_IDB:
+                interfaces.append(_parse_interface_block(mm, pos, block_len, endian))
+            pos += block_len
+
+        bounds = [pos]
+        for k in range(1, shards):
+            boundary = _next_block_boundary(mm, pos + (size - pos) * k // shards, endian)
+            if boundary is not None and boundary > bounds[-1]:
+                bounds.append(boundary)
+        bounds.append(size)
+        return [(start, end, interfaces, endian) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+    def index_frames(self, mm):
+        """Walks the file blocks and returns the offset, lengths, timestamp and link type of every frame."""
+        return next(self.iter_frames(mm))
+
+    def iter_frames(self, mm, batch_size=None):
+        """Same as index_frames, yielding the frame index in batches of up to batch_size frames (one batch if None)."""
+        if mm[:4] in PCAP_MAGIC:
+            return self._iter_pcap(mm, batch_size)
+        if len(mm) >= 12 and struct.unpack_from('<I', mm, 0)[0] == PCAPNG_SHB:
+            return self._iter_pcapng(mm, batch_size=batch_size)
+        raise ValueError(f"{self.pcap_file} is not a pcap or pcapng file")
+
+    @staticmethod
+    def _iter_pcap(mm, batch_size=None):
+        """Indexes a classic libpcap file (fixed 24-byte header + 16-byte record headers)."""
+        endian, digits = PCAP_MAGIC[mm[:4]]
+        linktype = struct.unpack_from(endian + 'I', mm, 20)[0] & 0x0FFFFFFF
+        divisor = 10 ** digits
+        record = struct.Struct(endian + 'IIII')
+        frames = empty_frame_index()
+        offsets, caplens, origlens, timestamps, linktypes = frames.values()
+
+        pos, size = 24, len(mm)
+        while pos + 16 <= size:
+            sec, frac, caplen, origlen = record.unpack_from(mm, pos)
+            pos += 16
+            if pos + caplen > size:
+                break  # Truncated last record
+            offsets.append(pos)
+            caplens.append(caplen)
+            origlens.append(origlen)
+            timestamps.append((sec * divisor + frac) / divisor)
+            linktypes.append(linktype)
+            pos += caplen
+
+            if len(offsets) == batch_size:
+                yield frames
+                frames = empty_frame_index()
+                offsets, caplens, origlens, timestamps, linktypes = frames.values()
+
+        if batch_size is None or len(offsets):
+            yield frames
+
+    @staticmethod
+    def _index_pcapng(mm, start=0, end=None, interfaces=(), endian='<'):
+        """
+        Indexes the Enhanced/obsolete Packet Blocks of a pcapng file between two block boundaries.
+
+        `interfaces` and `endian` describe the section the range starts in (for ranges not starting at 0).
+        """
+        return next(PcapngReader._iter_pcapng(mm, start, end, interfaces, endian))
+
+    @staticmethod
+    def _iter_pcapng(mm, start=0, end=None, interfaces=(), endian='<', batch_size=None):
+        """Same as _index_pcapng, yielding the frame index in batches of up to batch_size frames (one batch if None)."""
+        frames = empty_frame_index()
+        offsets, caplens, origlens, timestamps, linktypes = frames.values()
+        interfaces = list(interfaces)
+
+        pos, end = start, len(mm) if end is None else end
+        while pos + 12 <= end:
+            block_type = struct.unpack_from(endian + 'I', mm, pos)[0]
+
+            if block_type == PCAPNG_SHB:
+                # A new section may switch byte order and always resets the interface list
+                endian = '<' if struct.unpack_from('<I', mm, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+
+            block_len = struct.unpack_from(endian + 'I', mm, pos + 4)[0]
+            if block_len < 12 or pos + block_len > end:
+                break  # Corrupt or truncated block
+
+            if block_type == PCAPNG_IDB:
+                interfaces.append(_parse_interface_block(mm, pos, block_len, endian))
+            elif block_type == PCAPNG_EPB or block_type == PCAPNG_PB:
+                if block_type == PCAPNG_EPB:
+                    iface, ts_high, ts_low, caplen, origlen = struct.unpack_from(endian + 'IIIII', mm, pos + 8)
+                else:
+                    iface, _, ts_high, ts_low, caplen, origlen = struct.unpack_from(endian + 'HHIIII', mm, pos + 8)
+                linktype, divisor, ts_offset = interfaces[iface]
+                offsets.append(pos + 28)
+                caplens.append(caplen)
+                origlens.append(origlen)
+                timestamps.append((((ts_high << 32) | ts_low) + ts_offset * divisor) / divisor)
+                linktypes.append(linktype)
+
+                if len(offsets) == batch_size:
+                    yield frames
+                    frames = empty_frame_index()
+                    offsets, caplens, origlens, timestamps, linktypes = frames.values()
+
+            pos += block_len
+
+        if batch_size is None or len(offsets):
+            yield frames
+
+
+def _decode_shard(pcap_file, shard):
+    """Process-pool task: decodes the packet blocks of one byte range of a pcapng file."""
+    start, end, interfaces, endian = shard
+    with open(pcap_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            frames = PcapngReader._index_pcapng(mm, start, end, interfaces, endian)
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                return decode_frames(buf, frames)
+            finally:
+                del buf
+
+
+def _reassemble_shard(pcap_file, segments):
+    """Process-pool task: reassembles the TLS records of a group of whole TCP streams."""
+    with open(pcap_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                return reassemble_tls(buf, segments)
+            finally:
+                del buf
+
+
+def _next_block_boundary(mm, pos, endian):
+    """Returns the first offset >= pos where a run of well-formed pcapng blocks starts (None if there is none)."""
+    pos = (pos + 3) & ~3  # Blocks are 32-bit aligned from the start of the file
+    while pos + 12 <= len(mm):
+        if _block_chain_at(mm, pos, endian):
+            return pos
+        pos += 4
+    return None
+
+
+def _block_chain_at(mm, pos, endian):
+    """Checks that SHARD_SYNC_BLOCKS blocks (or all blocks up to the end of file) chain from pos."""
+    size = len(mm)
+    for _ in range(SHARD_SYNC_BLOCKS):
+        if pos == size:
+            return True
+        if pos + 12 > size:
+            return False
+        block_type, block_len = struct.unpack_from(endian + 'II', mm, pos)
+        known_type = block_type <= 0x0F or block_type == PCAPNG_SHB
+        if not known_type or block_len < 12 or block_len % 4 or pos + block_len > size:
+            return False
+        if struct.unpack_from(endian + 'I', mm, pos + block_len - 4)[0] != block_len:
+            return False
+        pos += block_len
+    return True
+
+
+def empty_frame_index():
+    """Typed buffers filled by the block walk: offset, captured length, original length, timestamp, link type."""
+    return {
+        'offset': array('q'),
+        'caplen': array('I'),
+        'origlen': array('I'),
+        'timestamp': array('d'),
+        'linktype': array('I'),
+    }
+
+
+def _parse_interface_block(mm, pos, block_len, endian):
+    """Returns (link type, timestamp divisor, timestamp offset) of an Interface Description Block."""
+    linktype = struct.unpack_from(endian + 'H', mm, pos + 8)[0]
+    divisor, ts_offset = 10 ** 6, 0
+
+    opt, opt_end = pos + 16, pos + block_len - 4
+    while opt + 4 <= opt_end:
+        code, length = struct.unpack_from(endian + 'HH', mm, opt)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:  # if_tsresol
+            resol = mm[opt + 4]
+            divisor = 2 ** (resol & 0x7F) if resol & 0x80 else 10 ** resol
+        elif code == 14 and length >= 8:  # if_tsoffset
+            ts_offset = struct.unpack_from(endian + 'q', mm, opt + 4)[0]
+        opt += 4 + ((length + 3) & ~3)
+
+    return linktype, divisor, ts_offset
+
+
+def _u8(buf, idx):
+    return buf[np.minimum(idx, len(buf) - 1)].astype(np.int64)
+
+
+def _be16(buf, idx):
+    return (_u8(buf, idx) << 8) | _u8(buf, idx + 1)
+
+
+def _be32(buf, idx):
+    return (_be16(buf, idx) << 16) | _be16(buf, idx + 2)
+
+
+def _l3_offsets(buf, offset, caplen, linktype):
+    """Returns the offset of the IPv4 header relative to each frame, or -1 for non-IPv4 frames."""
+    l3 = np.full(len(offset), -1, dtype=np.int64)
+
+    eth = linktype == LINKTYPE_ETHERNET
+    ethertype = _be16(buf, offset + 12)
+    hdr = np.full(len(offset), 14, dtype=np.int64)
+    for _ in range(2):  # Up to two stacked VLAN tags (802.1Q / 802.1ad)
+        tagged = (ethertype == 0x8100) | (ethertype == 0x88A8)
+        ethertype = np.where(tagged, _be16(buf, offset + hdr + 2), ethertype)
+        hdr = np.where(tagged, hdr + 4, hdr)
+    l3[eth & (ethertype == 0x0800)] = hdr[eth & (ethertype == 0x0800)]
+
+    sll = (linktype == LINKTYPE_LINUX_SLL) & (_be16(buf, offset + 14) == 0x0800)
+    l3[sll] = 16
+    sll2 = (linktype == LINKTYPE_LINUX_SLL2) & (_be16(buf, offset) == 0x0800)
+    l3[sll2] = 20
+
+    # DLT_NULL stores the address family in the capturing host's byte order, DLT_LOOP in network order
+    family = _be32(buf, offset)
+    null = ((linktype == LINKTYPE_NULL) & ((family == 2) | (family == 0x02000000))) | \
+           ((linktype == LINKTYPE_LOOP) & (family == 2))
+    l3[null] = 4
+
+    raw = (linktype == LINKTYPE_RAW) | (linktype == LINKTYPE_IPV4)
+    l3[raw] = 0
+
+    l3[l3 + 20 > caplen] = -1
+    return l3
+
+
+def decode_frames(buf, frames):
+    """
+    Decodes the IPv4 and TCP/UDP headers of the indexed frames.
+
+    Only IPv4 packets carrying a TCP or UDP header are kept (non-first fragments have no
+    transport header and are dropped), mirroring the packets PacketAnalyzer keeps.
+
+    Returns:
+        dict: NumPy column arrays for the decoded packets.
+    """
+    offset = np.frombuffer(frames['offset'], dtype=np.int64)
+    caplen = np.frombuffer(frames['caplen'], dtype=np.uint32).astype(np.int64)
+    origlen = np.frombuffer(frames['origlen'], dtype=np.uint32).astype(np.int64)
+    timestamp = np.frombuffer(frames['timestamp'], dtype=np.float64)
+    linktype = np.frombuffer(frames['linktype'], dtype=np.uint32)
+
+    # Step 1: IPv4 header
+    l3 = _l3_offsets(buf, offset, caplen, linktype)
+    ip = offset + np.maximum(l3, 0)
+    ihl = (_u8(buf, ip) & 0x0F) * 4
+    proto = _u8(buf, ip + 9)
+    keep = (l3 >= 0) & ((_u8(buf, ip) >> 4) == 4) & (ihl >= 20) & ((_be16(buf, ip + 6) & 0x1FFF) == 0)
+    keep &= (proto == IPPROTO_TCP) | (proto == IPPROTO_UDP)
+    tp_min = np.where(proto == IPPROTO_TCP, 20, 8)
+    keep &= l3 + ihl + tp_min <= caplen
+
+    idx = np.flatnonzero(keep)
+    offset, caplen, origlen, timestamp = offset[idx], caplen[idx], origlen[idx], timestamp[idx]
+    ip, ihl, proto = ip[idx], ihl[idx], proto[idx]
+    is_tcp = proto == IPPROTO_TCP
+
+    # Step 2: transport header
+    tp = ip + ihl
+    tcp_hdr = np.where(is_tcp, (_u8(buf, tp + 12) >> 4) * 4, 8)
+    payload = tp + tcp_hdr
+    frame_end = offset + caplen
+    ip_end = np.minimum(ip + _be16(buf, ip + 2), frame_end)
+    payload_len = np.maximum(ip_end - payload, 0)
+
+    columns = {
+        'timestamp': timestamp,
+        'packet_size': origlen,
+        'ip_src': _be32(buf, ip + 12).astype(np.uint32),
+        'ip_dst': _be32(buf, ip + 16).astype(np.uint32),
+        'proto': proto.astype(np.uint8),
+        'src_port': _be16(buf, tp).astype(np.uint16),
+        'dst_port': _be16(buf, tp + 2).astype(np.uint16),
+        'tcp_seq': np.where(is_tcp, _be32(buf, tp + 4), 0).astype(np.uint32),
+        'tcp_ack': np.where(is_tcp, _be32(buf, tp + 8), 0).astype(np.uint32),
+        'tcp_window': np.where(is_tcp, _be16(buf, tp + 14), 0).astype(np.uint32),
+        'tcp_flags': np.where(is_tcp, ((_u8(buf, tp + 12) & 0x0F) << 8) | _u8(buf, tp + 13), 0).astype(np.uint16),
+        'payload_offset': payload,
+        'payload_len': payload_len,
+    }
+    columns['tcp_wscale'] = _window_scales(buf, tp, tcp_hdr, columns['tcp_flags'], is_tcp)
+    columns.update(_payload_protocols(buf, payload, payload_len, columns))
+    return columns
+
+
+def _window_scales(buf, tp, tcp_hdr, flags, is_tcp):
+    """Reads the window-scale option of SYN segments (-1 when absent)."""
+    wscale = np.full(len(tp), -1, dtype=np.int8)
+    for i in np.flatnonzero(is_tcp & ((flags & TCP_FLAG_SYN) != 0)):
+        opt, end = int(tp[i]) + 20, int(tp[i] + tcp_hdr[i])
+        while opt < end:
+            kind = int(buf[opt])
+            if kind == 0:
+                break
+            if kind == 1:
+                opt += 1
+                continue
+            if opt + 1 >= end or buf[opt + 1] < 2:
+                break
+            if kind == 3 and opt + 2 < end:
+                wscale[i] = min(int(buf[opt + 2]), 14)
+            opt += int(buf[opt + 1])
+    return wscale
+
+
+def _payload_protocols(buf, payload, payload_len, columns):
+    """Classifies the payload of each packet (Wireshark's highest layer) and flags TCP payloads starting a TLS record."""
+    proto, sport, dport = columns['proto'], columns['src_port'], columns['dst_port']
+    is_tcp = proto == IPPROTO_TCP
+    b0, b1, b2 = _u8(buf, payload), _u8(buf, payload + 1), _u8(buf, payload + 2)
+
+    highest_layer = np.where(is_tcp, 'TCP', np.where(payload_len > 0, 'DATA', 'UDP')).astype(object)
+
+    udp = ~is_tcp & (payload_len > 0)
+    dns = udp & ((sport == 53) | (dport == 53))
+    highest_layer[dns] = 'DNS'
+    # QUIC: UDP/443 with the fixed bit set in the first header byte
+    quic = udp & ~dns & ((sport == 443) | (dport == 443)) & ((b0 & 0x40) != 0)
+    highest_layer[quic] = 'QUIC'
+    # WireGuard: message type 1-4 followed by three reserved zero bytes and a type-specific length
+    wg_len_ok = ((b0 == 1) & (payload_len == 148)) | ((b0 == 2) & (payload_len == 92)) | \
+                ((b0 == 3) & (payload_len == 64)) | ((b0 == 4) & (payload_len >= 32))
+    wg = udp & ~dns & ~quic & wg_len_ok & (b1 == 0) & (b2 == 0) & (_u8(buf, payload + 3) == 0)
+    highest_layer[wg] = 'WG'
+
+    tls_start = is_tcp & (payload_len >= 5) & (b0 >= 20) & (b0 <= 24) & (b1 == 3) & (b2 <= 4)
+    return {'highest_layer': highest_layer, 'tls_start': tls_start}
+
+
+def tls_stream_ids(columns, known=None):
+    """
+    Numbers the directional TCP streams that carry TLS.
+
+    Args:
+        columns (dict): Decoded packet columns.
+        known (TlsStreamState): The TLS streams seen in earlier chunks; new streams are added to
+            it, so ids stay the same from one chunk to the next.
+
+    Returns:
+        np.ndarray: Stream id of every TCP packet with payload in such a stream, -1 for all other packets.
+    """
+    n = len(columns['timestamp'])
+    if not columns['tls_start'].any() and (known is None or not known.ids):
+        return np.full(n, -1, dtype=np.int64)
+
+    stream_keys = np.stack([(columns['ip_src'].astype(np.uint64) << np.uint64(32)) | columns['ip_dst'],
+                            (columns['src_port'].astype(np.uint64) << np.uint64(16)) | columns['dst_port']], axis=1)
+    unique_keys, streams = np.unique(stream_keys, axis=0, return_inverse=True)
+    streams = streams.ravel().astype(np.int64)
+    carries_tls = np.zeros(len(unique_keys), dtype=bool)
+    carries_tls[streams[columns['tls_start']]] = True
+    if known is not None:
+        ids = np.full(len(unique_keys), -1, dtype=np.int64)
+        for u, key in enumerate(map(tuple, unique_keys.tolist())):
+            if carries_tls[u]:
+                ids[u] = known.stream_id(key)
+            elif key in known.ids:
+                ids[u] = known.ids[key]
+                carries_tls[u] = True
+        carries_tls, streams = carries_tls[streams], ids[streams]
+    else:
+        carries_tls = carries_tls[streams]
+    carries_tls &= (columns['payload_len'] > 0) & (columns['proto'] == IPPROTO_TCP)
+    return np.where(carries_tls, streams, -1)
+
+
+class TlsStreamState:
+    """TLS reassembly state carried between the chunks of a capture (see PcapngReader.iter_columns)."""
+
+    def __init__(self):
+        self.ids = {}      # (addresses, ports) -> stream id
+        self.pending = {}  # stream id -> reassembly state (see reassemble_tls)
+        self.next_id = 0
+
+    def stream_id(self, key):
+        """Returns the id of a stream, numbering it if it is new."""
+        stream = self.ids.get(key)
+        if stream is None:
+            stream = self.ids[key] = self.next_id
+            self.next_id += 1
+        return stream
+
+    def drop(self, ip_src, ip_dst, src_port, dst_port):
+        """Forgets a directional stream (addresses as uint32 values), e.g. once its flow has ended."""
+        stream = self.ids.pop(((ip_src << 32) | ip_dst, (src_port << 16) | dst_port), None)
+        if stream is not None:
+            self.pending.pop(stream, None)
+
+
+def add_tls_layers(buf, columns, carry=None):
+    """
+    Reassembles the TLS records of the decoded packets and stores the TLS columns (see reassemble_tls).
+
+    Args:
+        carry (TlsStreamState): State left by the previous chunk, updated in place (None for a whole capture).
+    """
+    streams = tls_stream_ids(columns, carry)
+    rows = np.flatnonzero(streams >= 0)
+    segments = {key: columns[key][rows] for key in TLS_SEGMENT_COLUMNS}
+    segments['stream'] = streams[rows]
+    set_tls_columns(columns, rows, reassemble_tls(buf, segments, None if carry is None else carry.pending))
+
+
+# Per-segment columns reassemble_tls needs
+TLS_SEGMENT_COLUMNS = ('tcp_seq', 'payload_offset', 'payload_len', 'tls_start')
+
+
+def set_tls_columns(columns, rows, tls):
+    """Stores reassemble_tls output for the given packet rows and marks packets with a TLS layer."""
+    n = len(columns['timestamp'])
+    columns.update(_empty_tls(n))
+    for key, values in tls.items():
+        columns[key][rows] = values
+    has_tls = np.zeros(n, dtype=bool)
+    has_tls[rows] = tls['tls_version'] != None  # noqa: E711 (element-wise comparison)
+    columns['highest_layer'][has_tls] = 'TLS'
+
+
+def reassemble_tls(buf, segments, state=None):
+    """
+    Reassembles TLS records across the TCP segments of TLS-carrying streams.
+
+    Like Wireshark, the TLS layer is attached to the segment that completes a record; segments
+    holding only part of a record stay plain TCP. Retransmitted bytes are skipped and a gap in
+    the stream drops it out of sync until a segment starts with a record header again.
+
+    Args:
+        buf (np.ndarray): The capture file bytes.
+        segments (dict): stream, tcp_seq, payload_offset, payload_len and tls_start of the
+            segments, in capture order (any subset of whole streams).
+        state (dict): Stream id -> [next expected sequence number, bytes of the incomplete record],
+            left by earlier segments of the same streams; updated in place.
+
+    Returns:
+        dict: tls_version, tls_handshake_type (-1 if none) and tls_cipher_suite per segment,
+            taken from the first record(s) completed in that segment.
+    """
+    n = len(segments['stream'])
+    tls = _empty_tls(n)
+    tls_version, tls_handshake_type, tls_cipher_suite = tls.values()
+
+    state = {} if state is None else state
+    streams, seqs, tls_start = segments['stream'], segments['tcp_seq'].astype(np.int64), segments['tls_start']
+    offsets, lengths = segments['payload_offset'], segments['payload_len']
+    next_seqs = (seqs + lengths) & 0xFFFFFFFF
+
+    # Segments made of whole records are decoded at once; a run of them that follows its stream in
+    # order only needs the stream to be in sync at a record boundary when the run starts
+    whole, version, handshake, cipher = _whole_record_segments(buf, offsets, lengths, tls_start)
+    order = np.argsort(streams, kind='stable')
+    chained = np.zeros(n, dtype=bool)
+    chained[1:] = (streams[order[1:]] == streams[order[:-1]]) & whole[order[1:]] & whole[order[:-1]] & \
+                  (seqs[order[1:]] == next_seqs[order[:-1]])
+    starts = np.flatnonzero(~chained)
+    fast = np.zeros(n, dtype=bool)
+    for first, stop in zip(starts.tolist(), np.append(starts[1:], n).tolist()):
+        for j in range(first, stop):
+            i = int(order[j])
+            stream, seq = int(streams[i]), int(seqs[i])
+            pending = state.get(stream)
+            if whole[i] and (pending is None or (pending[0] == seq and not pending[1])):
+                fast[order[j:stop]] = True
+                state[stream] = [int(next_seqs[order[stop - 1]]), bytearray()]
+                break
+            records = _reassemble_segment(state, stream, seq, buf[offsets[i]:offsets[i] + lengths[i]].tobytes(),
+                                          tls_start[i])
+            if records:
+                tls_version[i] = f"0x{int.from_bytes(records[0][1:3], 'big'):04x}"
+                tls_handshake_type[i], tls_cipher_suite[i] = _parse_tls_records(records)
+
+    tls_version[fast] = _hex16(version[fast])
+    tls_handshake_type[fast] = handshake[fast]
+    fast_cipher = fast & (cipher >= 0)
+    tls_cipher_suite[fast_cipher] = _hex16(cipher[fast_cipher])
+    return tls
+
+
+def _reassemble_segment(state, stream, seq, data, tls_start):
+    """Adds one segment to the reassembly state of its stream and returns the records it completes (None if none)."""
+    pending = state.get(stream)
+    if pending is not None:
+        behind = (pending[0] - seq) & 0xFFFFFFFF
+        if behind == 0:
+            pending[1] += data
+        elif behind < 0x80000000:
+            # Retransmission: keep only the bytes not seen yet
+            if behind >= len(data):
+                return None
+            pending[1] += data[behind:]
+        else:
+            pending = None  # Bytes missing from the capture
+    if pending is None:
+        if not tls_start:
+            state.pop(stream, None)
+            return None
+        pending = [seq, bytearray(data)]
+    pending[0] = (seq + len(data)) & 0xFFFFFFFF
+    state[stream] = pending
+
+    records = _complete_records(pending[1])
+    if records is None:
+        state.pop(stream)  # Not TLS after all (or lost sync)
+    return records
+
+
+def _whole_record_segments(buf, offsets, lengths, tls_start):
+    """
+    Finds the segments holding nothing but complete TLS records and decodes them like _parse_tls_records.
+
+    Returns:
+        tuple: Mask of those segments, then the version of the first record, the first handshake
+            type (-1 if none) and the ServerHello cipher suite (-1 if none) of every segment.
+    """
+    n = len(offsets)
+    offsets = offsets.astype(np.int64)
+    end = offsets + lengths
+    pos = offsets.copy()
+    whole = tls_start.copy()
+    handshake = np.full(n, -1, dtype=np.int64)
+    cipher = np.full(n, -1, dtype=np.int64)
+    for _ in range(WHOLE_RECORDS_MAX):
+        idx = np.flatnonzero(whole & (pos < end))
+        if not len(idx):
+            break
+        p, e = pos[idx], end[idx]
+        b0 = _u8(buf, p)
+        record_end = p + 5 + _be16(buf, p + 3)
+        ok = (p + 5 <= e) & (b0 >= 20) & (b0 <= 24) & (_u8(buf, p + 1) == 3) & (_u8(buf, p + 2) <= 4) & \
+             (record_end <= e)
+        whole[idx[~ok]] = False
+
+        msg_type = _u8(buf, p + 5)
+        msg_len = (_u8(buf, p + 6) << 16) | _be16(buf, p + 7)
+        valid = ok & (b0 == 22) & (record_end - p >= 9) & np.isin(msg_type, list(TLS_HANDSHAKE_TYPES)) & \
+                (msg_len + 4 <= record_end - p - 5)
+        first = valid & (handshake[idx] == -1)
+        handshake[idx[first]] = msg_type[first]
+
+        sid = p + 5 + 4 + 2 + 32
+        suite = sid + 1 + _u8(buf, sid)
+        hello = valid & (msg_type == 2) & (cipher[idx] == -1) & (sid < record_end) & (suite + 2 <= record_end)
+        cipher[idx[hello]] = _be16(buf, suite[hello])
+        pos[idx[ok]] = record_end[ok]
+    whole &= pos == end
+    return whole, _be16(buf, offsets + 1), handshake, cipher
+
+
+def _hex16(values):
+    """Formats 16-bit codes the way the TLS columns hold them (0x0303)."""
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([f"0x{v:04x}" for v in unique.tolist()], dtype=object)[inverse.ravel()]
+
+
+def _empty_tls(n):
+    """TLS columns for n packets without a TLS layer."""
+    return {
+        'tls_version': np.full(n, None, dtype=object),
+        'tls_handshake_type': np.full(n, -1, dtype=np.int16),
+        'tls_cipher_suite': np.full(n, None, dtype=object),
+    }
+
+
+def _complete_records(pending):
+    """Removes and returns the complete TLS records at the front of `pending` (None if the bytes are not TLS)."""
+    records = []
+    while len(pending) >= 5:
+        if not (20 <= pending[0] <= 24 and pending[1] == 3 and pending[2] <= 4):
+            return None
+        end = 5 + ((pending[3] << 8) | pending[4])
+        if len(pending) < end:
+            break
+        records.append(bytes(pending[:end]))
+        del pending[:end]
+    return records
+
+
+def _parse_tls_records(records):
+    """
+    Decodes the handshake messages of complete TLS records.
+
+    Returns:
+        tuple: (first cleartext handshake type or -1, negotiated cipher suite of a ServerHello or None)
+    """
+    handshake_type, cipher_suite = -1, None
+    for record in records:
+        if record[0] != 22 or len(record) < 9:
+            continue
+        msg_type = record[5]
+        msg_len = int.from_bytes(record[6:9], 'big')
+        # An encrypted Finished message looks like random bytes: reject impossible lengths
+        if msg_type not in TLS_HANDSHAKE_TYPES or msg_len + 4 > len(record) - 5:
+            continue
+        if handshake_type == -1:
+            handshake_type = msg_type
+        if msg_type == 2 and cipher_suite is None:
+            sid = 5 + 4 + 2 + 32
+            if sid < len(record):
+                suite = sid + 1 + record[sid]
+                if suite + 2 <= len(record):
+                    cipher_suite = f"0x{int.from_bytes(record[suite:suite + 2], 'big'):04x}"
+    return handshake_type, cipher_suite
+
+
+def tcp_relative_numbers(columns, flow_ids, reverse_ids, prior_base=None, prior_shift=None):
+    """
+    Converts raw TCP sequence/acknowledgment numbers and window values to the relative
+    numbers and calculated window size Wireshark reports.
+
+    The base sequence number of a direction is taken from its first segment (seq for a SYN,
+    seq - 1 otherwise), unless an ACK from the opposite direction was seen first (ack - 1).
+    Window scaling is applied only when both SYNs of the connection carried the option.
+
+    Args:
+        columns (dict): Decoded packet columns (TCP rows are those with proto == 6).
+        flow_ids (np.ndarray): Directional flow id per packet.
+        reverse_ids (np.ndarray): Flow id of the opposite direction per packet (-1 if never seen).
+        prior_base (np.ndarray): Base sequence number per flow id from earlier chunks (UNKNOWN_BASE if none).
+        prior_shift (np.ndarray): Window shift per flow id from earlier chunks (-1 if none).
+
+    Returns:
+        tuple: (relative seq, relative ack, calculated window) as int64 arrays, followed by the
+            base sequence number and window shift per flow id to carry into the next chunk.
+    """
+    if prior_base is not None:
+        n_flows = len(prior_base)
+    else:
+        n_flows = max(int(flow_ids.max()), int(reverse_ids.max())) + 1 if len(flow_ids) else 0
+    seq = columns['tcp_seq'].astype(np.int64)
+    ack = columns['tcp_ack'].astype(np.int64)
+    flags = columns['tcp_flags']
+    is_tcp = columns['proto'] == IPPROTO_TCP
+    is_syn = (flags & TCP_FLAG_SYN) != 0
+    has_ack = is_tcp & ((flags & TCP_FLAG_ACK) != 0)
+    rows = np.arange(len(flow_ids))
+    never = len(flow_ids)
+
+    # Candidate 1: the first segment of the direction itself
+    first_row = np.full(n_flows, never, dtype=np.int64)
+    np.minimum.at(first_row, flow_ids[is_tcp], rows[is_tcp])
+    first_base = np.zeros(n_flows, dtype=np.int64)
+    valid = first_row < never
+    first_base[valid] = seq[first_row[valid]] - np.where(is_syn[first_row[valid]], 0, 1)
+
+    # Candidate 2: the first ACK sent by the opposite direction
+    ack_row = np.full(n_flows, never, dtype=np.int64)
+    acked = has_ack & (reverse_ids >= 0)
+    np.minimum.at(ack_row, reverse_ids[acked], rows[acked])
+    ack_base = np.zeros(n_flows, dtype=np.int64)
+    valid = ack_row < never
+    ack_base[valid] = ack[ack_row[valid]] - 1
+
+    base = np.where(ack_row < first_row, ack_base, first_base)
+    base[(first_row == never) & (ack_row == never)] = UNKNOWN_BASE
+    if prior_base is not None:
+        # A base fixed in an earlier chunk stays fixed
+        base = np.where(prior_base != UNKNOWN_BASE, prior_base, base)
+    rev_base = np.where(reverse_ids >= 0, base[np.maximum(reverse_ids, 0)], ack - 1)
+
+    rel_seq = (seq - base[flow_ids]) & 0xFFFFFFFF
+    rel_ack = np.where(has_ack, (ack - rev_base) & 0xFFFFFFFF, 0)
+
+    # Window scaling: shift announced in each direction's SYN
+    shift = np.full(n_flows, -1, dtype=np.int64) if prior_shift is None else prior_shift.copy()
+    syn_rows = np.flatnonzero(is_tcp & is_syn)
+    shift[flow_ids[syn_rows]] = columns['tcp_wscale'][syn_rows]
+    own_shift = shift[flow_ids]
+    peer_shift = np.where(reverse_ids >= 0, shift[np.maximum(reverse_ids, 0)], -1)
+    scaled = ~is_syn & (own_shift >= 0) & (peer_shift >= 0)
+    window = columns['tcp_window'].astype(np.int64)
+    window = np.where(scaled, window << np.maximum(own_shift, 0), window)
+
+    return rel_seq, rel_ack, window, base, shift
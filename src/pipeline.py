@@ -0,0 +1,60 @@
+import logging
+import os
+
+from data_processor import DataProcessor
+
+
+class Pipeline:
+    """
+    In-memory handoff of the tables main() passes between stages (comparison summaries ->
+    classification -> evaluation -> comparison graphs).
+
+    Every artifact is a DataFrame registered under a name with the file it belongs in. Stages
+    read and replace artifacts in memory; an artifact is only loaded from its file when no
+    earlier stage of the run produced it (e.g. a classification-only run), and persist() writes
+    each changed artifact once, at the end of the run or whenever it is called. Artifacts
+    that were never registered only live in memory.
+    """
+
+    def __init__(self):
+        self.paths = {}
+        self.tables = {}
+        self.dirty = set()
+
+    def register(self, name, path):
+        """Declares where an artifact is stored."""
+        self.paths[name] = str(path)
+
+    def put(self, name, df, path=None):
+        """Hands a new version of an artifact to the next stages (written by persist())."""
+        if path is not None:
+            self.register(name, path)
+        self.tables[name] = df
+        self.dirty.add(name)
+        return df
+
+    def get(self, name):
+        """
+        Returns an artifact: the in-memory table if a stage produced it, otherwise its file.
+
+        Returns:
+            pd.DataFrame: The artifact, or None if it exists neither in memory nor on disk.
+        """
+        if name not in self.tables:
+            path = self.paths.get(name)
+            if path is None or not os.path.exists(path):
+                return None
+            self.tables[name] = DataProcessor.load_dataframe(path)
+        return self.tables[name]
+
+    def exists(self, name):
+        """True if the artifact is in memory or on disk."""
+        return name in self.tables or os.path.exists(self.paths.get(name, ''))
+
+    def persist(self, *names):
+        """Writes the changed artifacts (all of them, or only the given names) to their files."""
+        for name in names or sorted(self.dirty):
+            if name in self.dirty and name in self.paths:
+                DataProcessor.save_dataframe(self.tables[name], self.paths[name])
+                self.dirty.discard(name)
+                logging.debug(f"💾 {name} saved to {self.paths[name]}")
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import math
+import sqlite3
+import time
+
+import pandas as pd
+
+from data_processor import DataProcessor
+
+# Summary keys that identify a capture (see main.summarize_packets)
+APPLICATION_KEY = 'Application'
+HASH_KEY = 'Capture_Hash'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    application TEXT NOT NULL,
+    capture_hash TEXT NOT NULL,
+    analyzed_at REAL NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (application, capture_hash)
+);
+CREATE INDEX IF NOT EXISTS summaries_analyzed_at ON summaries (analyzed_at);
+"""
+
+
+class ResultsStore:
+    """
+    Per-capture comparison summaries in an SQLite database.
+
+    A summary is stored as a JSON object under its (application, capture hash) key, so adding or
+    re-analysing a capture is one indexed upsert instead of rewriting the whole comparison
+    file. Keys missing from a new summary keep their stored value, so labels added by hand
+    (e.g. TYPE) survive a re-analysis. query() returns the comparison table the classifier and
+    TrafficVisualizer read; export() writes it to a comparison file (main --export-comparison).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def upsert(self, summary, analyzed_at=None):
+        """
+        Inserts or updates the summary of one capture.
+
+        Args:
+            summary (dict): Comparison metrics with the Application and Capture_Hash keys.
+            analyzed_at (float): Analysis time as a UNIX timestamp (default: now).
+
+        Returns:
+            dict: The stored summary (the new values merged over the stored ones).
+        """
+        application, capture_hash = summary.get(APPLICATION_KEY), summary.get(HASH_KEY)
+        if not capture_hash:
+            raise ValueError(f"A summary needs a {HASH_KEY} to be stored")
+        key = ('' if _missing(application) else str(application), str(capture_hash))
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT summary FROM summaries WHERE application = ? AND capture_hash = ?", key).fetchone()
+            merged = json.loads(row[0]) if row else {}
+            merged.update({name: None if _missing(value) else _plain(value) for name, value in summary.items()})
+            self.connection.execute(
+                "INSERT INTO summaries (application, capture_hash, analyzed_at, summary) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (application, capture_hash) DO UPDATE SET "
+                "analyzed_at = excluded.analyzed_at, summary = excluded.summary",
+                key + (time.time() if analyzed_at is None else analyzed_at, json.dumps(merged)))
+        return merged
+
+    def query(self, application=None, since=None, until=None):
+        """
+        Returns the stored summaries, oldest analysis first.
+
+        Args:
+            application (str): Only this application.
+            since, until: Only captures analysed in [since, until] (UNIX timestamps, or anything
+                pd.Timestamp accepts).
+
+        Returns:
+            pd.DataFrame: One row per capture, one column per summary key.
+        """
+        conditions, params = [], []
+        if application is not None:
+            conditions.append("application = ?")
+            params.append(application)
+        for bound, op in ((since, '>='), (until, '<=')):
+            if bound is not None:
+                conditions.append(f"analyzed_at {op} ?")
+                params.append(bound if isinstance(bound, (int, float)) else pd.Timestamp(bound).timestamp())
+        sql = "SELECT summary FROM summaries"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        rows = self.connection.execute(sql + " ORDER BY analyzed_at, rowid", params).fetchall()
+        return pd.DataFrame([json.loads(row[0]) for row in rows])
+
+    def export(self, output_file):
+        """Writes every summary to the comparison file (CSV or Parquet, by extension)."""
+        df = self.query()
+        DataProcessor.save_dataframe(df, output_file)
+        return df
+
+    def import_table(self, df):
+        """
+        Stores the rows of an existing comparison table (e.g. a comparison_results.csv written
+        before the store existed). Rows without a Capture_Hash are keyed on a hash of their
+        values, so identical rows are stored once.
+
+        Returns:
+            int: Number of rows imported.
+        """
+        for record in df.to_dict('records'):
+            if _missing(record.get(HASH_KEY)):
+                values = json.dumps({name: None if _missing(value) else _plain(value) for name, value in record.items()},
+                                    sort_keys=True)
+                record[HASH_KEY] = 'imported:' + hashlib.sha256(values.encode()).hexdigest()
+            self.upsert(record, analyzed_at=0.0)
+        return len(df)
+
+
+def _missing(value):
+    return value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value))
+
+
+def _plain(value):
+    """JSON-serialisable version of a summary value (NumPy scalars become Python numbers)."""
+    return value.item() if hasattr(value, 'item') else value
@@ -0,0 +1,289 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from file_manager import FileManager
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is not reported
+    resource = None
+
+# Counters of every stage
+STAGE_COUNTERS = ('calls', 'wall_s', 'cpu_s', 'packets', 'bytes', 'rows')
+
+# Prefix of the exported Prometheus metrics
+PROMETHEUS_PREFIX = 'traffic'
+
+# Prometheus metrics of the stage counters: (name, help)
+PROMETHEUS_STAGE_METRICS = {
+    'calls': ('stage_calls_total', 'Times each pipeline stage ran'),
+    'wall_s': ('stage_wall_seconds_total', 'Wall-clock time spent in each pipeline stage'),
+    'cpu_s': ('stage_cpu_seconds_total', 'CPU time of this process spent in each pipeline stage'),
+    'packets': ('stage_packets_total', 'Packets processed by each pipeline stage'),
+    'bytes': ('stage_bytes_total', 'Bytes processed (read, or written) by each pipeline stage'),
+    'rows': ('stage_rows_total', 'Table rows processed by each pipeline stage'),
+}
+
+# Seconds between two stack samples of SamplingProfiler
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class RunMetrics:
+    """
+    Per-stage counters of one analysis run.
+
+    Every stage (dissect, extract, clean, write, summary, flows, plot, store, predict...) adds up
+    its calls, wall-clock time, CPU time of this process, and the packets, bytes and table rows
+    it processed. Packets dropped by a stage's error path are counted per error type instead of
+    being logged one by one, and captures that failed as a whole are counted per error type.
+    Pool workers keep their own RunMetrics and hand its to_dict() back to be merge()d.
+
+    A run is written as a JSON report and as a Prometheus text-format file (see write()).
+    """
+
+    def __init__(self):
+        now = datetime.now()
+        self.started = now.isoformat(timespec='seconds')
+        # Names the run's JSON report: runs started in the same second (or by several processes) get their own
+        self.run_id = f"{now:%Y%m%dT%H%M%S%f}_{os.getpid()}"
+        self.pooled = False  # Set once a worker's counters are merged: its stage times overlap this process's
+        self.stages = {}
+        self.skipped = {}  # Stage -> Counter of error types
+        self.failures = Counter()  # Error type of each failed capture
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = _children_cpu()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a block of code as one call of a stage.
+
+        Yields:
+            dict: packets, bytes and rows counters the block may set (added to the stage).
+        """
+        counts = {'packets': 0, 'bytes': 0, 'rows': 0}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            self.add(name, wall_s=time.perf_counter() - wall, cpu_s=time.process_time() - cpu, **counts)
+
+    def timed(self, iterable, name):
+        """Yields the items of an iterable, adding the time spent producing each one to a stage."""
+        iterator = iter(iterable)
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, calls=0, wall_s=time.perf_counter() - wall, cpu_s=time.process_time() - cpu)
+                return
+            self.add(name, wall_s=time.perf_counter() - wall, cpu_s=time.process_time() - cpu)
+            yield item
+
+    def add(self, name, calls=1, wall_s=0.0, cpu_s=0.0, packets=0, bytes=0, rows=0):
+        """Adds to the counters of a stage."""
+        stage = self.stages.setdefault(name, dict.fromkeys(STAGE_COUNTERS, 0))
+        for counter, value in zip(STAGE_COUNTERS, (calls, wall_s, cpu_s, packets, bytes, rows)):
+            stage[counter] += value
+
+    def skip(self, stage, error, count=1):
+        """Counts packets a stage dropped, by error type (e.g. type(e).__name__)."""
+        self.skipped.setdefault(stage, Counter())[error] += count
+
+    def fail(self, error):
+        """Counts a capture that could not be processed, by error type."""
+        self.failures[error] += 1
+
+    def merge(self, report):
+        """Adds the stage, skip and failure counters of another run's to_dict() (e.g. a pool worker's)."""
+        self.pooled = True
+        for name, counters in report['stages'].items():
+            self.add(name, **counters)
+        for stage, errors in report['skipped'].items():
+            for error, count in errors.items():
+                self.skip(stage, error, count)
+        self.failures.update(report['failures'])
+
+    def to_dict(self):
+        """
+        The run as a JSON-serialisable dict.
+
+        Returns:
+            dict: started, wall_s, cpu_s (this process), children_cpu_s (finished worker processes),
+                peak_rss_bytes (largest of this process and its finished workers; None where the
+                platform does not report it), stages ({stage: STAGE_COUNTERS}), skipped ({stage:
+                {error type: packets}}) and failures ({error type: captures}).
+        """
+        return {
+            'started': self.started,
+            'wall_s': time.perf_counter() - self._wall,
+            'cpu_s': time.process_time() - self._cpu,
+            'children_cpu_s': _children_cpu() - self._children_cpu,
+            'peak_rss_bytes': peak_rss(),
+            'stages': {name: dict(counters) for name, counters in self.stages.items()},
+            'skipped': {stage: dict(errors) for stage, errors in self.skipped.items()},
+            'failures': dict(self.failures),
+        }
+
+    def to_prometheus(self, report=None):
+        """The run in the Prometheus text exposition format (e.g. for node_exporter's textfile collector)."""
+        report = self.to_dict() if report is None else report
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+                value = int(value) if float(value).is_integer() else float(value)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        for counter, (name, help_text) in PROMETHEUS_STAGE_METRICS.items():
+            metric(name, 'counter', help_text,
+                   [({'stage': stage}, counters[counter]) for stage, counters in report['stages'].items()])
+        metric('skipped_packets_total', 'counter', 'Packets dropped by a stage error path, by error type',
+               [({'stage': stage, 'error': error}, count)
+                for stage, errors in report['skipped'].items() for error, count in errors.items()])
+        metric('failed_captures_total', 'counter', 'Captures that could not be processed, by error type',
+               [({'error': error}, count) for error, count in report['failures'].items()])
+        metric('run_wall_seconds', 'gauge', 'Wall-clock time of the run', [({}, report['wall_s'])])
+        metric('run_cpu_seconds', 'gauge', 'CPU time of the run, this process and its finished workers',
+               [({}, report['cpu_s'] + report['children_cpu_s'])])
+        if report['peak_rss_bytes'] is not None:
+            metric('peak_rss_bytes', 'gauge', 'Peak resident set size of the run', [({}, report['peak_rss_bytes'])])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_dir):
+        """
+        Writes the run as metrics_dir/run_<start time, microseconds>_<pid>.json and
+        metrics_dir/metrics.prom (the latest run; both written atomically).
+
+        Returns:
+            tuple: (JSON path, Prometheus path).
+        """
+        report = self.to_dict()
+        json_path = os.path.join(metrics_dir, f"run_{self.run_id}.json")
+        prom_path = os.path.join(metrics_dir, 'metrics.prom')
+        FileManager.write_atomic(json_path, lambda f: f.write(json.dumps(report, indent=2).encode()))
+        FileManager.write_atomic(prom_path, lambda f: f.write(self.to_prometheus(report).encode()))
+        return json_path, prom_path
+
+    def report(self):
+        """
+        The stages as a table: calls, seconds, share of the run's wall time, throughput and counts.
+
+        Stage times of pool workers add up and overlap, so runs with merged worker counters have no
+        share column.
+        """
+        stages = pd.DataFrame(self.stages).T.reindex(columns=list(STAGE_COUNTERS))
+        if stages.empty:
+            return stages
+        total = time.perf_counter() - self._wall
+        if not self.pooled:
+            stages['wall_%'] = 100 * stages['wall_s'] / total if total > 0 else 0.0
+        stages['packets_per_s'] = (stages['packets'] / stages['wall_s'].where(stages['wall_s'] > 0)).fillna(0)
+        for counter in ('calls', 'packets', 'bytes', 'rows'):
+            stages[counter] = stages[counter].astype('int64')
+        return stages.sort_values('wall_s', ascending=False).round(3)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread records the Python stack of every other thread
+    each `interval` seconds.
+
+    The overhead does not grow with the number of function calls (unlike cProfile), so the
+    profiled run keeps its real proportions. Time in C code that holds the GIL is attributed to
+    the Python line that called it. Worker processes are not sampled.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()  # "outer;...;inner" -> samples
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def collapsed(self):
+        """Samples in collapsed-stack format ("frame;frame;frame count" per line, for flamegraph.pl or speedscope)."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, path):
+        """Writes the collapsed stacks to a file."""
+        FileManager.write_atomic(str(path), lambda f: f.write(self.collapsed().encode()))
+        return path
+
+    def top(self, n=20):
+        """
+        The functions the most samples were taken in.
+
+        Returns:
+            pd.DataFrame: function, self (samples in the function itself), total (samples with the
+                function on the stack) and their percentages, by decreasing self samples.
+        """
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        rows = [{'function': frame, 'self': own[frame], 'total': cumulative[frame]} for frame in cumulative]
+        top = pd.DataFrame(rows, columns=['function', 'self', 'total'])
+        top['self_%'] = (100 * top['self'] / max(self.samples, 1)).round(1)
+        top['total_%'] = (100 * top['total'] / max(self.samples, 1)).round(1)
+        return top.sort_values(['self', 'total'], ascending=False).head(n).reset_index(drop=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread, frame in sys._current_frames().items():
+                if thread == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+
+def peak_rss():
+    """Peak resident set size in bytes of this process or its largest finished child (None without getrusage)."""
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+def _children_cpu():
+    """CPU seconds of the finished child processes (worker pools)."""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+# Packet table columns the analysis needs (ports and tcp_len are opt-in PacketAnalyzer columns)
+TCP_PACKET_COLUMNS = ('timestamp', 'ip_src', 'ip_dst', 'transport', 'src_port', 'dst_port',
+                      'tcp_seq', 'tcp_ack', 'tcp_flags', 'tcp_len')
+
+# Per-connection columns
+TCP_FLOW_COLUMNS = ('SRC_IP', 'DST_IP', 'SRC_PORT', 'DST_PORT', 'DATA_SEGMENTS', 'RETRANSMISSIONS',
+                    'OUT_OF_ORDER', 'LOSS_RATE', 'RTT_SAMPLES', 'RTT_MEAN', 'RTT_P50', 'RTT_P90', 'RTT_P99')
+
+# RTT percentiles reported per connection (the RTT_P<q> columns)
+RTT_PERCENTILES = (50, 90, 99)
+
+# A segment filling a hole this soon after the previous one is reordering, not a retransmission
+# (Wireshark's default out-of-order threshold)
+OUT_OF_ORDER_THRESHOLD = 0.003
+
+TCP_SYN = 0x02
+TCP_FIN = 0x01
+TCP_ACK = 0x10
+
+
+class TcpAnalyzer:
+    @staticmethod
+    def analyze(df, ooo_threshold=OUT_OF_ORDER_THRESHOLD):
+        """
+        Per-connection TCP RTT, retransmission and reordering analysis of a packet table.
+
+        Every data segment (payload, SYN or FIN) is classified against the data sent before it
+        in the same direction: a segment starting below the highest sequence number already
+        sent is a retransmission if it repeats an earlier segment or comes ooo_threshold seconds
+        or more after the previous one, and out-of-order otherwise. A segment is matched to the
+        first later ACK of the reverse direction that covers it; when that ACK acknowledges exactly
+        the segment's end, the time between them is an RTT sample (segments sent more than once
+        give no sample, as in Karn's algorithm). All of it runs on sorted arrays: group-wise
+        cumulative maxima and a vectorized binary search instead of a loop over packets.
+
+        Args:
+            df (pd.DataFrame): Packet table in capture order with TCP_PACKET_COLUMNS
+                (relative or absolute sequence numbers, as long as each direction is consistent).
+            ooo_threshold (float): Seconds separating reordering from retransmission.
+
+        Returns:
+            pd.DataFrame: TCP_FLOW_COLUMNS, one row per TCP connection (both directions), in
+                order of first packet. LOSS_RATE is RETRANSMISSIONS / DATA_SEGMENTS.
+        """
+        is_tcp = (df['transport'] == 'TCP').to_numpy(dtype=bool) if 'transport' in df.columns else None
+        # A capture without TCP has no TCP columns at all
+        missing = [col for col in TCP_PACKET_COLUMNS if col not in df.columns]
+        if missing and (is_tcp is None or is_tcp.any()):
+            raise ValueError(f"Missing packet columns {missing} (request the src_port/dst_port/tcp_len columns)")
+        if not is_tcp.any():
+            return pd.DataFrame(columns=list(TCP_FLOW_COLUMNS))
+        tcp = df[is_tcp & df[['tcp_seq', 'tcp_ack', 'tcp_flags', 'tcp_len']].notna().all(axis=1).to_numpy()]
+        if tcp.empty:
+            return pd.DataFrame(columns=list(TCP_FLOW_COLUMNS))
+
+        t = _numbers(tcp['timestamp'])
+        seq = _numbers(tcp['tcp_seq']).astype(np.int64)
+        ack = _numbers(tcp['tcp_ack']).astype(np.int64)
+        flags = _numbers(tcp['tcp_flags']).astype(np.int64)
+        seg_len = _numbers(tcp['tcp_len']).astype(np.int64) + ((flags & TCP_SYN) > 0) + ((flags & TCP_FIN) > 0)
+        end = seq + seg_len
+
+        # Step 1: Direction and connection ids, numbered in order of first packet
+        direction, reverse, connection, first = TcpAnalyzer._endpoints(tcp)
+
+        # Step 2: Data segments of each direction in capture order
+        by_direction = np.argsort(direction, kind='stable')
+        data = by_direction[seg_len[by_direction] > 0]
+        data_dir = pd.Series(direction[data])
+        data_end = pd.Series(end[data])
+        sent_before = data_end.groupby(data_dir).cummax().groupby(data_dir).shift(1).to_numpy(dtype=np.float64)
+        previous_t = pd.Series(t[data]).groupby(data_dir).shift(1).to_numpy(dtype=np.float64)
+        repeated = pd.DataFrame({'direction': data_dir, 'seq': seq[data], 'end': end[data]})
+
+        # Step 3: Retransmitted and out-of-order segments (keep-alives probe one byte below the sent data)
+        behind = seq[data] < sent_before  # NaN for a direction's first segment compares False
+        keep_alive = (seg_len[data] <= 1) & (seq[data] == sent_before - 1) & ((flags[data] & (TCP_SYN | TCP_FIN)) == 0)
+        behind &= ~keep_alive
+        retransmission = behind & (repeated.duplicated().to_numpy() | (t[data] - previous_t >= ooo_threshold))
+        out_of_order = behind & ~retransmission
+
+        # Step 4: First later ACK of the reverse direction covering each segment
+        acks = by_direction[(flags[by_direction] & TCP_ACK) > 0]
+        acked = pd.Series(ack[acks]).groupby(direction[acks]).cummax().to_numpy()
+        bounds = np.searchsorted(direction[acks], np.arange(direction.max() + 2))
+        ambiguous = repeated.duplicated(['direction', 'seq'], keep=False).to_numpy()
+        candidates = data[(reverse[direction[data]] >= 0) & ~ambiguous]
+        rev = reverse[direction[candidates]]
+        lo, hi = bounds[rev], bounds[rev + 1]
+        # Within a direction the ACK rows are in capture order, so (direction, row) is one sorted key
+        later = np.searchsorted(direction[acks] * len(t) + acks, rev * len(t) + candidates, 'right')
+        covering = np.maximum(_searchsorted_segments(acked, lo, hi, end[candidates], 'left'), later)
+        matched = covering < hi
+        row = covering[matched]
+        exact = acked[row] == end[candidates[matched]]
+        sampled = candidates[matched][exact]
+        rtt = t[acks[row[exact]]] - t[sampled]
+
+        # Step 5: Per-connection totals and RTT percentiles
+        count = connection.max() + 1
+        data_conn = connection[data]
+        segments = np.bincount(data_conn, minlength=count)
+        retransmissions = np.bincount(data_conn, weights=retransmission, minlength=count).astype(np.int64)
+        flows = pd.DataFrame({
+            'SRC_IP': tcp['ip_src'].iloc[first].to_numpy(),
+            'DST_IP': tcp['ip_dst'].iloc[first].to_numpy(),
+            'SRC_PORT': tcp['src_port'].iloc[first].to_numpy(),
+            'DST_PORT': tcp['dst_port'].iloc[first].to_numpy(),
+            'DATA_SEGMENTS': segments,
+            'RETRANSMISSIONS': retransmissions,
+            'OUT_OF_ORDER': np.bincount(data_conn, weights=out_of_order, minlength=count).astype(np.int64),
+            'LOSS_RATE': retransmissions / np.maximum(segments, 1),
+        })
+        flows = pd.concat([flows, TcpAnalyzer._rtt_statistics(connection[sampled], rtt, count)], axis=1)
+        return flows[list(TCP_FLOW_COLUMNS)]
+
+    @staticmethod
+    def summarize(flows):
+        """
+        Capture-wide RTT and loss figures of an analyze() table.
+
+        Returns:
+            dict: RTT (mean over every sample, None without samples) and Packet_Loss_Rate
+                (retransmitted / sent data segments).
+        """
+        samples = flows['RTT_SAMPLES'].sum() if not flows.empty else 0
+        segments = flows['DATA_SEGMENTS'].sum() if not flows.empty else 0
+        return {
+            'RTT': float((flows['RTT_MEAN'].fillna(0) * flows['RTT_SAMPLES']).sum() / samples) if samples else None,
+            'Packet_Loss_Rate': float(flows['RETRANSMISSIONS'].sum() / segments) if segments else 0,
+        }
+
+    @staticmethod
+    def _endpoints(tcp):
+        """Returns (direction id, reverse direction id of each direction or -1, connection id, first row of each connection)."""
+        n = len(tcp)
+        ip_codes, ips = pd.factorize(pd.concat([tcp['ip_src'], tcp['ip_dst']], ignore_index=True))
+        port_codes, ports = pd.factorize(pd.concat([tcp['src_port'], tcp['dst_port']], ignore_index=True))
+        ip_codes, port_codes = ip_codes.astype(np.int64), port_codes.astype(np.int64)
+
+        # One integer per (addresses, ports) direction, numbered in order of first packet
+        ip_pair, ip_pairs = pd.factorize(ip_codes[:n] * len(ips) + ip_codes[n:])
+        port_pair, port_pairs = pd.factorize(port_codes[:n] * len(ports) + port_codes[n:])
+        direction, keys = pd.factorize(ip_pair.astype(np.int64) * len(port_pairs) + port_pair)
+
+        # The reverse of a direction swaps its source and destination
+        src_ip, dst_ip = np.divmod(ip_pairs[keys // len(port_pairs)], len(ips))
+        src_port, dst_port = np.divmod(port_pairs[keys % len(port_pairs)], len(ports))
+        reverse_ip = pd.Index(ip_pairs).get_indexer(dst_ip * len(ips) + src_ip)
+        reverse_port = pd.Index(port_pairs).get_indexer(dst_port * len(ports) + src_port)
+        reverse = pd.Index(keys).get_indexer(reverse_ip.astype(np.int64) * len(port_pairs) + reverse_port)
+        reverse[(reverse_ip < 0) | (reverse_port < 0)] = -1
+
+        # First packet of each direction: where the running maximum id grows
+        new = np.ones(n, dtype=bool)
+        new[1:] = direction[1:] > np.maximum.accumulate(direction)[:-1]
+        first_row = np.flatnonzero(new)
+
+        # A connection is a direction and its reverse; the one seen first names it, so connections
+        # numbered by that direction's id are in order of first packet too
+        ids = np.arange(len(keys))
+        names = np.where(reverse >= 0, np.minimum(ids, reverse), ids) == ids
+        connection_of = (np.cumsum(names) - 1)[np.where(reverse >= 0, np.minimum(ids, reverse), ids)]
+        return direction, reverse, connection_of[direction], first_row[names]
+
+    @staticmethod
+    def _rtt_statistics(connection, rtt, count):
+        """RTT_SAMPLES, RTT_MEAN and the RTT_P<q> percentiles (linear interpolation) of each connection."""
+        samples = np.bincount(connection, minlength=count)
+        stats = {
+            'RTT_SAMPLES': samples,
+            'RTT_MEAN': np.bincount(connection, weights=rtt, minlength=count) / np.where(samples > 0, samples, np.nan),
+        }
+        order = np.lexsort((rtt, connection))
+        rtt = rtt[order]
+        starts = np.concatenate(([0], np.cumsum(samples)[:-1]))
+        has = samples > 0
+        for q in RTT_PERCENTILES:
+            position = starts + q / 100 * np.maximum(samples - 1, 0)
+            below = np.floor(position).astype(np.int64)
+            above = np.minimum(below + 1, starts + samples - 1)
+            value = np.full(count, np.nan)
+            if has.any():
+                weight = position[has] - below[has]
+                value[has] = rtt[below[has]] * (1 - weight) + rtt[above[has]] * weight
+            stats[f'RTT_P{q}'] = value
+        return pd.DataFrame(stats)
+
+
+def _numbers(values):
+    """Column as float64 (nullable and categorical columns included)."""
+    return pd.to_numeric(values.astype(object), errors='coerce').to_numpy(dtype=np.float64) \
+        if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _searchsorted_segments(values, lo, hi, targets, side='left'):
+    """
+    np.searchsorted for many sorted segments at once: for each query i, the insertion point of
+    targets[i] in values[lo[i]:hi[i]] (as an index into values), by a vectorized binary search.
+    """
+    lo, hi = lo.copy(), hi.copy()
+    while True:
+        active = lo < hi
+        if not active.any():
+            return lo
+        mid = (lo + hi) // 2
+        probe = values[np.minimum(mid, len(values) - 1)]
+        go_right = (probe < targets) if side == 'left' else (probe <= targets)
+        lo = np.where(active & go_right, mid + 1, lo)
+        hi = np.where(active & ~go_right, mid, hi)
@@ -1,42 +1,107 @@
-import joblib
+import os
 import pandas as pd
+from data_processor import DataProcessor
+from forest_evaluator import FlatForest, FLAT_MAX_ROWS
+
+# Suffix of the memory-mappable FlatForest export of a pickled model (my_trained_model.forest)
+FOREST_SUFFIX = '.forest'
 
 
 class TrafficClassifier:
-	def _init_(self, model_path, feature_columns):
-		"""Initialize the classifier with the trained model and feature columns"""
-		self.model = joblib.load(model_path)  # Load the trained model
+	def __init__(self, model, feature_columns):
+		"""Initialize the classifier with the trained model (or the path of its joblib/pickle file) and feature columns"""
+		self.model_path = os.fspath(model) if isinstance(model, (str, os.PathLike)) else None
+		self.model = TrafficClassifier.load_model(model) if self.model_path is not None else model  # Load the trained model
 		self.feature_columns = feature_columns  # Features used for classification
+		self.pickled_model = None  # The unpickled forest behind a FlatForest export, loaded on the first large batch
+		# Random forests are also flattened into node arrays, which skip the per-tree dispatch on small batches
+		if isinstance(self.model, FlatForest):
+			self.forest = self.model
+		else:
+			self.forest = FlatForest.from_sklearn(self.model) if FlatForest.supports(self.model) else None
+
+	@staticmethod
+	def load_model(model_path):
+		"""Loads a trained model (a FlatForest, or the unpickled model if it is not a forest)"""
+		# The first load of a pickled forest exports it next to the pickle (my_trained_model.forest); later loads
+		# map the export's node arrays instead of unpickling, until the pickle is newer than its export
+		model_path = os.fspath(model_path)
+		forest_path = os.path.splitext(model_path)[0] + FOREST_SUFFIX
+		if os.path.isdir(forest_path) and (not os.path.exists(model_path)
+										   or os.path.getmtime(forest_path) >= os.path.getmtime(model_path)):
+			return FlatForest.load(forest_path)
+
+		import joblib  # Reads plain pickles too
+		model = joblib.load(model_path)
+		if FlatForest.supports(model):
+			try:
+				FlatForest.from_sklearn(model).save(forest_path)
+			except OSError as e:
+				print(f"⚠ Could not save the flattened model to {forest_path}: {e}")
+		return model
 
 	def classify_comparison_data(self, comparison_csv):
-		"""Send the data from the compare CSV to the model for classification"""
+		"""Send the data from the compare CSV (or Parquet) file to the model for classification"""
 		# Step 1: Load the data
-		df_comparison = pd.read_csv(comparison_csv)
+		df_comparison = DataProcessor.load_dataframe(comparison_csv)
 		print("🔹 Loading data from CSV...", comparison_csv)
 
+		df_comparison = self.classify_dataframe(df_comparison)
+		if df_comparison is None:
+			return
+
+		# Optionally, save the results to a new CSV file
+		output_csv = os.path.join(os.path.dirname(comparison_csv),
+								  os.path.basename(comparison_csv).replace("comparison_results", "classified_results"))
+		DataProcessor.save_dataframe(df_comparison, output_csv)
+		print(f"✅ Results saved in file: {output_csv}")
+
+	def classify_dataframe(self, df_comparison):
+		"""Add the model's prediction (Predicted_Type) to a comparison table (None if feature columns are missing)"""
 		# Step 2: Check if the relevant columns exist
 		missing_columns = [col for col in self.feature_columns if col not in df_comparison.columns]
 		if missing_columns:
 			print(f"❌ Missing columns: {missing_columns}")
-			return
+			return None
 
 		# Step 3: Prepare the data
 		X = df_comparison[self.feature_columns]
 
 		# Step 4: Classification
-		predictions = self.model.predict(X)
+		predictions = self.predict(X)
 
 		# Step 5: Add the predictions to the DataFrame
+		df_comparison = df_comparison.copy()
 		df_comparison['Predicted_Type'] = predictions
 
 		# Step 6: Display the results
+		# Captures of newly analysed applications have no hand-added TYPE yet
 		print("🔹 Model prediction results:")
-		print(df_comparison[['TYPE', 'Predicted_Type']])
+		print(df_comparison[[col for col in ('Application', 'TYPE', 'Predicted_Type') if col in df_comparison.columns]])
+		return df_comparison
 
-		# Optionally, save the results to a new CSV file
-		output_csv = comparison_csv.replace("comparison_results.csv", "classified_results.csv")
-		df_comparison.to_csv(output_csv, index=False)
-		print(f"✅ Results saved in file: {output_csv}")
+	def predict(self, X):
+		"""Predict the class of each row of a feature matrix (columns in feature_columns order)"""
+		# Batches of up to FLAT_MAX_ROWS rows go through the flattened forest, larger ones through model.predict
+		if self.forest is not None and len(X) <= FLAT_MAX_ROWS:
+			return self.forest.predict(X)
+		return self.batch_model().predict(X)
+
+	def predict_proba(self, X):
+		"""Class probabilities of each row (columns in model.classes_ order), computed like predict()."""
+		if self.forest is not None and len(X) <= FLAT_MAX_ROWS:
+			return self.forest.predict_proba(X)
+		return self.batch_model().predict_proba(X)
+
+	def batch_model(self):
+		"""The model that predicts batches larger than FLAT_MAX_ROWS (sklearn's tree traversal is faster there)"""
+		if not isinstance(self.model, FlatForest):
+			return self.model
+		# Loaded from its .forest export: unpickle the original once, or keep walking the node arrays without it
+		if self.pickled_model is None and self.model_path is not None and os.path.exists(self.model_path):
+			import joblib
+			self.pickled_model = joblib.load(self.model_path)
+		return self.pickled_model if self.pickled_model is not None else self.model
 
 	def evaluate_predictions(self, df_comparison):
 		"""Compare predictions with the actual values"""
@@ -44,6 +109,12 @@ class TrafficClassifier:
 			print("⚠ 'TYPE' column not found in data! Cannot compare predictions.")
 			return
 
+		# Only captures labelled by hand can be scored
+		df_comparison = df_comparison[df_comparison['TYPE'].notna()]
+		if df_comparison.empty:
+			print("⚠ No labelled rows in 'TYPE'! Cannot compare predictions.")
+			return
+
 		# Comparing predictions with the 'TYPE' column
 		correct_predictions = df_comparison['Predicted_Type'] == df_comparison['TYPE']
 		accuracy = correct_predictions.mean()
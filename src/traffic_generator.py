@@ -0,0 +1,408 @@
+import argparse
+import glob
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_processor import DataProcessor, OUTPUT_FORMATS
+from pcapng_reader import PCAPNG_SHB, PCAPNG_IDB, PCAPNG_EPB, PCAPNG_BYTE_ORDER_MAGIC, LINKTYPE_ETHERNET
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+# Parsed captures the packet-size and inter-arrival distributions are fitted from
+PROFILE_CSV_GLOB = str(BASE_DIR / "results" / "CSV_files" / "*_parsed_data.csv")
+
+# Packets built and written per chunk (bounds the generator's memory, a few KiB per packet)
+DEFAULT_CHUNK_PACKETS = 100_000
+
+# Quantiles kept of each fitted distribution (samples are interpolated between them)
+PROFILE_QUANTILES = 1001
+
+# Frame header sizes: Ethernet + IPv4 + TCP / UDP (no options), and a TLS record header
+ETH_IP_BYTES = 14 + 20
+TCP_HEADER_BYTES = ETH_IP_BYTES + 20
+UDP_HEADER_BYTES = ETH_IP_BYTES + 8
+TLS_RECORD_BYTES = 5
+
+# Largest frame an IPv4 total length can describe
+MAX_FRAME_BYTES = 14 + 0xFFFF
+
+# Every TCP flow opens like a TLS connection: SYN, SYN/ACK, ACK, ClientHello, ServerHello, then
+# application data records, one per segment. Frame sizes of the two hello packets
+CLIENT_HELLO_BYTES = TCP_HEADER_BYTES + 517
+SERVER_HELLO_BYTES = TCP_HEADER_BYTES + 122
+TLS_CIPHER_SUITE = 0x1302  # TLS_AES_256_GCM_SHA384
+
+# Direction of each of the first packets of a TCP flow (0: client to server, 1: server to client)
+TCP_OPENING_DIRECTIONS = (0, 1, 0, 0, 1)
+
+# Share of the later packets sent by the client
+CLIENT_SHARE = 0.5
+
+# Endpoints: each flow gets its own client address/port pair, and one of 65536 server addresses
+CLIENT_PORTS = 50_000
+CLIENT_NET, SERVER_NET = 0x0A000001, 0x8EFA0000  # 10.0.0.1, 142.250.0.0
+CLIENT_MAC, SERVER_MAC = bytes.fromhex("020000000001"), bytes.fromhex("020000000002")
+SERVER_PORT = 443
+
+# Ground-truth flow columns, named like FlowAggregator's
+TRUTH_COLUMNS = ('SRC_IP', 'DST_IP', 'SRC_PORT', 'DST_PORT', 'PROTOCOL', 'TIME_FIRST', 'TIME_LAST',
+                 'BYTES', 'BYTES_REV', 'PACKETS', 'PACKETS_REV')
+
+
+class TrafficGenerator:
+    """
+    Writes synthetic pcapng captures of any size, with a ground-truth flow summary.
+
+    Packets are Ethernet/IPv4 TCP or UDP frames. Each packet belongs to a flow chosen among the
+    flows active around its position (flows start one after another and fade out, about
+    `concurrency` of them at a time); a flow is TCP or UDP with the profile's UDP share. TCP
+    flows carry a handshake, a TLS ClientHello/ServerHello and TLS application-data records, with
+    consistent sequence and acknowledgement numbers. Packet sizes and inter-arrival times are
+    drawn from distributions fitted on parsed captures (see fit_profile).
+
+    Chunks of chunk_packets packets are built as whole NumPy buffers of Enhanced Packet Blocks
+    and streamed to the file, so memory stays bounded by the chunk size (plus a few dozen bytes
+    of state per flow) and the cost per packet is a handful of vectorised writes.
+    """
+
+    def __init__(self, packets, flows, profile=None, concurrency=64, seed=0, start_time=1_700_000_000.0,
+                 chunk_packets=DEFAULT_CHUNK_PACKETS):
+        """
+        Args:
+            packets (int): Packets to write.
+            flows (int): Flows they are spread over (flows that get no packet are left out).
+            profile (dict): fit_profile() output (default: fitted on PROFILE_CSV_GLOB).
+            concurrency (int): Mean number of flows active at the same time.
+            seed (int): Seed of every random choice (same seed, same capture).
+            start_time (float): Timestamp of the first packet (Unix seconds).
+            chunk_packets (int): Packets built per chunk.
+        """
+        if packets < 1 or flows < 1:
+            raise ValueError(f"packets and flows must be positive, got {packets} and {flows}")
+        if flows > CLIENT_PORTS * 0xFFFF:
+            raise ValueError(f"At most {CLIENT_PORTS * 0xFFFF} flows")
+        self.packets = int(packets)
+        self.flows = int(flows)
+        self.profile = profile if profile is not None else TrafficGenerator.fit_profile()
+        self.concurrency = concurrency
+        self.seed = seed
+        self.start_time = start_time
+        self.chunk_packets = chunk_packets
+
+    @staticmethod
+    def fit_profile(csv_files=None):
+        """
+        Fits the packet-size (per transport) and inter-arrival distributions of parsed captures.
+
+        Args:
+            csv_files (list): *_parsed_data.csv files (default: all of PROFILE_CSV_GLOB).
+
+        Returns:
+            dict: tcp_sizes, udp_sizes and gaps (PROFILE_QUANTILES quantiles each) and udp_share
+                (share of UDP packets).
+        """
+        csv_files = sorted(glob.glob(PROFILE_CSV_GLOB)) if csv_files is None else list(csv_files)
+        if not csv_files:
+            raise FileNotFoundError(f"No parsed captures to fit the traffic profile on ({PROFILE_CSV_GLOB})")
+        df = pd.concat([pd.read_csv(f, usecols=['packet_size', 'transport', 'inter_packet_time']) for f in csv_files],
+                       ignore_index=True)
+        probabilities = np.linspace(0, 1, PROFILE_QUANTILES)
+
+        def quantiles(values, default):
+            values = pd.to_numeric(values, errors='coerce').dropna()
+            return np.quantile(values, probabilities) if len(values) else np.full(PROFILE_QUANTILES, default)
+
+        udp = df['transport'] == 'UDP'
+        return {
+            'tcp_sizes': quantiles(df.loc[~udp, 'packet_size'], 1000.0),
+            'udp_sizes': quantiles(df.loc[udp, 'packet_size'], 1000.0),
+            'gaps': quantiles(df['inter_packet_time'][df['inter_packet_time'] >= 0], 0.001),
+            'udp_share': float(udp.mean()),
+        }
+
+    def write(self, output_file, flows_file=None):
+        """
+        Writes the capture and its ground-truth flow summary.
+
+        Args:
+            output_file (str): pcapng file to write.
+            flows_file (str): Table of the flows (TRUTH_COLUMNS, in order of first packet), CSV or
+                Parquet by extension (default: <output_file without suffix>_flows.csv).
+
+        Returns:
+            dict: packets, flows (with at least one packet), bytes (file size) and seconds.
+        """
+        start = time.perf_counter()
+        flows_file = flows_file or os.path.splitext(output_file)[0] + "_flows.csv"
+        state = self._initial_state()
+        with open(output_file, 'wb') as f:
+            f.write(_section_header())
+            for first in range(0, self.packets, self.chunk_packets):
+                chunk = self._chunk(state, first, min(self.chunk_packets, self.packets - first))
+                f.write(memoryview(chunk))
+
+        truth = self._truth(state)
+        DataProcessor.save_dataframe(truth, flows_file)
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(output_file)
+        print(f"✅ {self.packets} packets of {len(truth)} flows written to {output_file} "
+              f"({size / 2 ** 20:.1f} MiB in {seconds:.1f} s, {size / 2 ** 20 / seconds:.0f} MiB/s)")
+        return {'packets': self.packets, 'flows': len(truth), 'bytes': size, 'seconds': seconds}
+
+    def _initial_state(self):
+        """Per-flow state carried from chunk to chunk."""
+        rng = np.random.default_rng(self.seed)
+        n = self.flows
+        return {
+            'rng': rng,
+            'time': self.start_time,
+            'ip_id': 0,
+            'udp': rng.random(n) < self.profile['udp_share'],
+            'server_ip': (SERVER_NET + rng.integers(0, 1 << 16, n)).astype(np.uint32),
+            'next_seq': rng.integers(0, 1 << 32, 2 * n, dtype=np.uint64).astype(np.uint32),  # Per flow and direction
+            'count': np.zeros(n, dtype=np.int64),
+            'first': np.full(n, np.nan),
+            'last': np.full(n, np.nan),
+            'packets': np.zeros((n, 2), dtype=np.int64),
+            'bytes': np.zeros((n, 2), dtype=np.int64),
+        }
+
+    def _chunk(self, state, first, n):
+        """Builds the Enhanced Packet Blocks of packets first .. first + n - 1 and updates the flow state."""
+        rng = state['rng']
+        profile = self.profile
+        index = np.arange(n)
+
+        # Step 1: Flow of each packet - the flows whose start is due, most often the latest ones
+        due = (np.arange(first, first + n, dtype=np.int64) * self.flows) // self.packets
+        flow = np.maximum(due - (rng.geometric(1 / self.concurrency, n) - 1), 0)
+        order = np.argsort(flow, kind='stable')
+        sorted_flow = flow[order]
+        starts = np.flatnonzero(np.r_[True, sorted_flow[1:] != sorted_flow[:-1]])
+        flows_in_chunk = sorted_flow[starts]
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = index - np.repeat(starts, np.diff(np.r_[starts, n]))
+        k = state['count'][flow] + rank  # Packet number inside its flow
+        udp = state['udp'][flow]
+        tcp = ~udp
+
+        # Step 2: Direction, size and time of each packet
+        direction = (rng.random(n) >= CLIENT_SHARE).astype(np.int64)
+        direction[k == 0] = 0
+        for i, opening in enumerate(TCP_OPENING_DIRECTIONS):
+            direction[tcp & (k == i)] = opening
+        size = np.where(udp, _sample(rng, profile['udp_sizes'], n), _sample(rng, profile['tcp_sizes'], n))
+        size = np.rint(size).astype(np.int64)
+        size = np.clip(size, np.where(udp, UDP_HEADER_BYTES, TCP_HEADER_BYTES + TLS_RECORD_BYTES), MAX_FRAME_BYTES)
+        size[tcp & (k <= 2)] = TCP_HEADER_BYTES
+        size[tcp & (k == 3)] = CLIENT_HELLO_BYTES
+        size[tcp & (k == 4)] = SERVER_HELLO_BYTES
+        payload = size - np.where(udp, UDP_HEADER_BYTES, TCP_HEADER_BYTES)
+        gaps = _sample(rng, profile['gaps'], n)
+        if first == 0:
+            gaps[0] = 0.0
+        times = state['time'] + np.cumsum(gaps)
+        state['time'] = float(times[-1])
+        ts_us = np.rint(times * 1e6).astype(np.int64)
+        times = ts_us / 1e6
+
+        # Step 3: TCP sequence and acknowledgement numbers (SYNs take one sequence number)
+        consumed = np.where(udp, 0, np.where(k <= 1, 1, payload))
+        seq, ack = _sequence_numbers(state['next_seq'], flow * 2 + direction, consumed)
+        flags = np.where(k == 0, 0x002, np.where(k == 1, 0x012, np.where(payload > 0, 0x018, 0x010)))
+
+        # Step 4: The blocks
+        block = 32 + ((size + 3) & ~3)
+        offsets = np.r_[0, np.cumsum(block)[:-1]]
+        buf = np.zeros(int(block.sum()), dtype=np.uint8)
+        client = (CLIENT_NET + flow // CLIENT_PORTS).astype(np.uint32)
+        server = state['server_ip'][flow]
+        outgoing = direction == 0
+        src_ip, dst_ip = np.where(outgoing, client, server), np.where(outgoing, server, client)
+        client_port = 10_000 + flow % CLIENT_PORTS
+        src_port = np.where(outgoing, client_port, SERVER_PORT)
+        dst_port = np.where(outgoing, SERVER_PORT, client_port)
+        ip_id = (state['ip_id'] + index) & 0xFFFF
+        state['ip_id'] = int((state['ip_id'] + n) & 0xFFFF)
+        proto = np.where(udp, 17, 6)
+
+        header = np.zeros((n, 28 + ETH_IP_BYTES), dtype=np.uint8)
+        _put(header, 0, np.full(n, PCAPNG_EPB), 4, '<')
+        _put(header, 4, block, 4, '<')
+        _put(header, 12, ts_us >> 32, 4, '<')
+        _put(header, 16, ts_us & 0xFFFFFFFF, 4, '<')
+        _put(header, 20, size, 4, '<')
+        _put(header, 24, size, 4, '<')
+        header[:, 28:34] = np.where(outgoing[:, None], np.frombuffer(SERVER_MAC, np.uint8), np.frombuffer(CLIENT_MAC, np.uint8))
+        header[:, 34:40] = np.where(outgoing[:, None], np.frombuffer(CLIENT_MAC, np.uint8), np.frombuffer(SERVER_MAC, np.uint8))
+        header[:, 40:42] = (0x08, 0x00)
+        ip_fields = {42: (0x4500, 2), 44: (size - 14, 2), 46: (ip_id, 2), 48: (0x4000, 2), 50: ((64 << 8) | proto, 2),
+                     54: (src_ip, 4), 58: (dst_ip, 4)}
+        for pos, (values, width) in ip_fields.items():
+            _put(header, pos, np.broadcast_to(values, (n,)), width, '>')
+        _put(header, 52, _ip_checksum(size - 14, ip_id, proto, src_ip, dst_ip), 2, '>')
+        _scatter(buf, offsets, header)
+
+        rows = np.flatnonzero(tcp)
+        segment = np.zeros((len(rows), 20), dtype=np.uint8)
+        for pos, values, width in ((0, src_port, 2), (2, dst_port, 2), (4, seq, 4), (8, ack, 4), (14, 0xFFFF, 2)):
+            _put(segment, pos, np.broadcast_to(values, (n,))[rows], width, '>')
+        segment[:, 12] = 0x50
+        segment[:, 13] = flags[rows]
+        _scatter(buf, offsets[rows] + 28 + ETH_IP_BYTES, segment)
+
+        rows = np.flatnonzero(udp)
+        datagram = np.zeros((len(rows), 8), dtype=np.uint8)
+        for pos, values in ((0, src_port), (2, dst_port), (4, size - ETH_IP_BYTES)):
+            _put(datagram, pos, values[rows], 2, '>')
+        _scatter(buf, offsets[rows] + 28 + ETH_IP_BYTES, datagram)
+
+        # TLS: one record per segment; handshake records carry a hello message header
+        rows = np.flatnonzero(tcp & (k >= 3))
+        record = np.zeros((len(rows), TLS_RECORD_BYTES), dtype=np.uint8)
+        record[:, 0] = np.where(k[rows] <= 4, 22, 23)
+        record[:, 1] = 3
+        record[:, 2] = np.where(k[rows] == 3, 1, 3)
+        _put(record, 3, payload[rows] - TLS_RECORD_BYTES, 2, '>')
+        _scatter(buf, offsets[rows] + 28 + TCP_HEADER_BYTES, record)
+        rows = np.flatnonzero(tcp & ((k == 3) | (k == 4)))
+        hello = np.zeros((len(rows), 4 + 2), dtype=np.uint8)
+        hello[:, 0] = k[rows] - 2  # ClientHello (1), ServerHello (2)
+        _put(hello, 1, payload[rows] - TLS_RECORD_BYTES - 4, 3, '>')
+        hello[:, 4:6] = (3, 3)
+        _scatter(buf, offsets[rows] + 28 + TCP_HEADER_BYTES + TLS_RECORD_BYTES, hello)
+        rows = np.flatnonzero(tcp & (k == 4))
+        suite = np.tile(np.array([TLS_CIPHER_SUITE >> 8, TLS_CIPHER_SUITE & 0xFF], dtype=np.uint8), (len(rows), 1))
+        _scatter(buf, offsets[rows] + 28 + TCP_HEADER_BYTES + TLS_RECORD_BYTES + 4 + 2 + 32 + 1, suite)
+
+        trailer = np.zeros((n, 4), dtype=np.uint8)
+        _put(trailer, 0, block, 4, '<')
+        _scatter(buf, offsets + block - 4, trailer)
+
+        # Step 5: Ground truth, per flow and direction
+        ends = np.r_[starts[1:], n]
+        new = state['count'][flows_in_chunk] == 0
+        state['first'][flows_in_chunk[new]] = times[order[starts[new]]]
+        state['last'][flows_in_chunk] = times[order[ends - 1]]
+        state['count'][flows_in_chunk] += ends - starts
+        np.add.at(state['packets'], (flow, direction), 1)
+        np.add.at(state['bytes'], (flow, direction), size)
+        return buf
+
+    def _truth(self, state):
+        """Ground-truth flow table (TRUTH_COLUMNS) of the packets written so far."""
+        flows = np.flatnonzero(state['count'] > 0)
+        flows = flows[np.argsort(state['first'][flows], kind='stable')]
+        udp = state['udp'][flows]
+        return pd.DataFrame({
+            'SRC_IP': (CLIENT_NET + flows // CLIENT_PORTS).astype(np.uint32),  # Written as dotted text
+            'DST_IP': state['server_ip'][flows],
+            'SRC_PORT': 10_000 + flows % CLIENT_PORTS,
+            'DST_PORT': SERVER_PORT,
+            'PROTOCOL': np.where(udp, 'UDP', 'TCP'),
+            'TIME_FIRST': state['first'][flows],
+            'TIME_LAST': state['last'][flows],
+            'BYTES': state['bytes'][flows, 0],
+            'BYTES_REV': state['bytes'][flows, 1],
+            'PACKETS': state['packets'][flows, 0],
+            'PACKETS_REV': state['packets'][flows, 1],
+        }, columns=list(TRUTH_COLUMNS))
+
+
+def _section_header():
+    """Section Header Block and one Ethernet Interface Description Block (microsecond timestamps)."""
+    shb = np.zeros(28, dtype=np.uint8)
+    _put(shb[None, :], 0, np.array([PCAPNG_SHB]), 4, '<')
+    _put(shb[None, :], 4, np.array([28]), 4, '<')
+    _put(shb[None, :], 8, np.array([PCAPNG_BYTE_ORDER_MAGIC]), 4, '<')
+    shb[12], shb[16:24], shb[24] = 1, 0xFF, 28  # Version 1.0, unknown section length
+    idb = np.zeros(20, dtype=np.uint8)
+    _put(idb[None, :], 0, np.array([PCAPNG_IDB]), 4, '<')
+    _put(idb[None, :], 4, np.array([20]), 4, '<')
+    idb[8], idb[16] = LINKTYPE_ETHERNET, 20
+    return shb.tobytes() + idb.tobytes()
+
+
+def _sample(rng, quantiles, n):
+    """n draws from a distribution given by evenly spaced quantiles (inverse-CDF interpolation)."""
+    return np.interp(rng.random(n), np.linspace(0, 1, len(quantiles)), quantiles)
+
+
+def _sequence_numbers(next_seq, stream, consumed):
+    """
+    Sequence number of each TCP segment, and the acknowledgement number of its direction's peer.
+
+    Args:
+        next_seq (np.ndarray): Next sequence number per stream (flow * 2 + direction); advanced in place.
+        stream (np.ndarray): Stream of each packet, in capture order.
+        consumed (np.ndarray): Sequence numbers each packet takes.
+
+    Returns:
+        tuple: (seq, ack) as uint32 arrays.
+    """
+    n = len(stream)
+    order = np.argsort(stream, kind='stable')
+    key = stream[order] * n + order  # Sorted: stream, then capture position
+    total = np.r_[0, np.cumsum(consumed[order])]
+
+    def sent_before(streams, positions):
+        """Sequence numbers taken by `streams` before the given capture positions."""
+        return total[np.searchsorted(key, streams * n + positions)] - total[np.searchsorted(key, streams * n)]
+
+    positions = np.arange(n)
+    peer = stream ^ 1
+    seq = (next_seq[stream].astype(np.int64) + sent_before(stream, positions)) & 0xFFFFFFFF
+    ack = (next_seq[peer].astype(np.int64) + sent_before(peer, positions)) & 0xFFFFFFFF
+    streams = np.unique(stream)
+    next_seq[streams] = (next_seq[streams].astype(np.int64) + sent_before(streams, np.full(len(streams), n))) & 0xFFFFFFFF
+    return seq.astype(np.uint32), ack.astype(np.uint32)
+
+
+def _ip_checksum(total_length, ip_id, proto, src_ip, dst_ip):
+    """IPv4 header checksums of headers laid out like TrafficGenerator's (no options, DF set, TTL 64)."""
+    words = (0x4500 + total_length + ip_id + 0x4000 + ((64 << 8) | proto)
+             + (src_ip >> 16) + (src_ip & 0xFFFF) + (dst_ip >> 16) + (dst_ip & 0xFFFF)).astype(np.int64)
+    words = (words & 0xFFFF) + (words >> 16)
+    words = (words & 0xFFFF) + (words >> 16)
+    return ~words & 0xFFFF
+
+
+def _put(table, pos, values, width, byteorder):
+    """Writes integers as `width` bytes into columns pos .. pos + width - 1 of a (rows, bytes) uint8 table."""
+    values = np.asarray(values).astype(np.int64)
+    for i in range(width):
+        shift = 8 * (width - 1 - i if byteorder == '>' else i)
+        table[:, pos + i] = (values >> shift) & 0xFF
+
+
+def _scatter(buf, offsets, rows):
+    """Copies each row of a (rows, bytes) table into `buf` at its offset."""
+    if len(rows):
+        buf[offsets[:, None] + np.arange(rows.shape[1])] = rows
+
+
+def parse_args():
+    """Command-line options"""
+    parser = argparse.ArgumentParser(description="Write a synthetic pcapng capture and its ground-truth flows")
+    parser.add_argument("output", help="pcapng file to write (the flows go to <output>_flows.<format>)")
+    parser.add_argument("--packets", type=float, default=1e6, help="Packets to write (default: 1e6)")
+    parser.add_argument("--flows", type=float, default=1e4, help="Flows they are spread over (default: 1e4)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Mean number of flows active at a time (default: 64)")
+    parser.add_argument("--profile", nargs="*", default=None,
+                        help="Parsed captures (*_parsed_data.csv) to fit sizes and gaps on (default: results/CSV_files/)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv",
+                        help="File format of the ground-truth flows (default: csv)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    generator = TrafficGenerator(int(args.packets), int(args.flows), TrafficGenerator.fit_profile(args.profile),
+                                 concurrency=args.concurrency, seed=args.seed)
+    DataProcessor.check_output_format(args.format)
+    generator.write(args.output, DataProcessor.output_path(os.path.splitext(args.output)[0] + "_flows", args.format))
@@ -1,125 +1,222 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+import atexit
 import os
 import numpy as np
 import pandas as pd
+from data_processor import DataProcessor
+from graph_manifest import GraphManifest
+
+# Points drawn per time series (longer ones are downsampled with LTTB), and bins of the histograms
+MAX_PLOT_POINTS = 2000
+HISTOGRAM_BINS = 50
+
+# Grid points of the binned KDE over the histogram's range
+KDE_GRID = 512
+
+# Part of every graph's manifest key: bump it when the drawing code changes, to redraw all graphs
+GRAPH_STYLE_VERSION = 1
+
+# Comparison charts and the columns of the comparison table each one is drawn from
+COMPARISON_CHARTS = {
+    "comparison_packet_size.png": ["Application", "Avg_Packet_Size"],
+    "comparison_tls_handshake.png": ["Application", "TLS_Handshake_Count"],
+    "comparison_flow_size.png": ["Application", "Flow_Size (Bytes)"],
+    "comparison_flow_volume.png": ["Application", "Flow_Volume (Packets)"],
+    "feature_correlation_heatmap.png": ['Avg_Packet_Size', 'Inter_Packet_Time_Mean', 'Flow_Size (Bytes)', 'Flow_Volume (Packets)'],
+}
 
 
 class TrafficVisualizer:
     @staticmethod
-    def plot_traffic_characteristics(df, app_name, output_dir):
+    def plot_traffic_characteristics(df, app_name, output_dir, workers=1, max_points=MAX_PLOT_POINTS, graphs="changed"):
         """
         Generates histograms for TCP and TLS header fields.
+
+        The packet table is first reduced to what the figures show (see traffic_figures), so the
+        drawing time does not depend on the capture size; with workers > 1 the figures are drawn
+        in parallel worker processes. Only figures whose reduced data or settings changed since
+        they were last drawn are redrawn (see GraphManifest).
+
+        Args:
+            df (pd.DataFrame): Packet table of the application.
+            app_name (str): Application name (figure titles and file names).
+            output_dir (str): Graph directory; the figures go to <output_dir>/<app_name>/.
+            workers (int): Processes drawing the figures (1: in this process).
+            max_points (int): Points of the downsampled time series.
+            graphs (str): "changed", "all" (redraw every figure) or "dry-run" (only list the
+                figures that would be redrawn).
+
+        Returns:
+            list: Paths of the figures redrawn (or, in dry-run mode, that would be).
         """
         if df.empty:
             print(f"⚠ No data available to plot for {app_name}.")
-            return
+            return []
 
+        figures = TrafficVisualizer.traffic_figures(df, app_name, output_dir, max_points)
+        manifest = GraphManifest(os.path.join(output_dir, app_name), graphs)
+        stale = [figure for figure in figures if manifest.needs(
+            os.path.basename(figure['path']),
+            GraphManifest.digest(GRAPH_STYLE_VERSION, {k: v for k, v in figure.items() if k != 'path'}))]
+        if workers > 1 and len(stale) > 1:
+            list(_render_pool(workers).map(_render_figure, stale))
+        else:
+            for figure in stale:
+                _render_figure(figure)
+        manifest.save()
+        print(manifest.report())
+        return manifest.stale
+
+    @staticmethod
+    def traffic_figures(df, app_name, output_dir, max_points=MAX_PLOT_POINTS):
+        """
+        Reduces a packet table to the figures of plot_traffic_characteristics.
+
+        Each figure is a small dict (kind, title, axis labels, output path and its data): histogram
+        counts and a binned KDE of the packet sizes, value counts of the header fields, box-plot
+        statistics of the inter-packet times and the packet-size time series downsampled to
+        max_points points with LTTB. Its size is bounded by max_points whatever the capture size.
+
+        Returns:
+            list: Figure descriptions, in drawing order.
+        """
         app_graph_dir = os.path.join(output_dir, app_name)
         os.makedirs(app_graph_dir, exist_ok=True)
+        path = lambda name: os.path.join(app_graph_dir, f"{app_name}_{name}.png")
+        figures = []
 
         # Packet Size Distribution - Shows the distribution of packet sizes in bytes.
         # Helps in understanding the nature of traffic (small vs. large packets).
-        plt.figure(figsize=(12, 5))
-        sns.histplot(df['packet_size'].dropna(), bins=50, kde=True, color='blue')
-        plt.title(f'Packet Size Distribution - {app_name}')
-        plt.xlabel('Packet Size (Bytes)')
-        plt.ylabel('Count')
-        plt.savefig(f"{app_graph_dir}/{app_name}_packet_size.png")
-        plt.close()
+        sizes = _numeric(df['packet_size'])
+        sizes = sizes[~np.isnan(sizes)]
+        if len(sizes):
+            counts, edges = np.histogram(sizes, bins=HISTOGRAM_BINS)
+            figures.append({'kind': 'histogram', 'path': path('packet_size'), 'size': (12, 5), 'color': 'blue',
+                            'counts': counts, 'edges': edges, 'kde': _binned_kde(sizes, edges[1] - edges[0]),
+                            'title': f'Packet Size Distribution - {app_name}',
+                            'xlabel': 'Packet Size (Bytes)', 'ylabel': 'Count'})
 
         # TCP Flags Distribution - Displays how often each TCP flag appears in the traffic.
         # Useful for detecting SYN, ACK, FIN, and other control messages in the flow.
-        if 'tcp_flags' in df.columns and df['tcp_flags'].dropna().size > 0:
-            plt.figure(figsize=(12, 5))
-            sns.countplot(x=df['tcp_flags'].dropna(), color='orange')
-            plt.title(f'TCP Flags Distribution - {app_name}')
-            plt.xlabel('TCP Flags (Bit Values)')
-            plt.ylabel('Count')
-            plt.savefig(f"{app_graph_dir}/{app_name}_tcp_flags.png")
-            plt.close()
-
         # TLS Handshake Type Distribution - Shows the types of TLS handshakes that occurred.
         # Important for analyzing encrypted traffic and security protocols in use.
-        if 'tls_handshake_type' in df.columns and df['tls_handshake_type'].dropna().size > 0:
-            plt.figure(figsize=(12, 5))
-            sns.countplot(x=df['tls_handshake_type'].dropna(), color='green')
-            plt.title(f'TLS Handshake Types - {app_name}')
-            plt.xlabel('Handshake Type')
-            plt.ylabel('Count')
-            plt.savefig(f"{app_graph_dir}/{app_name}_tls_handshake.png")
-            plt.close()
-
         # TLS Version Distribution - Displays the versions of TLS used in the captured traffic.
         # Useful for checking security compliance and identifying outdated protocols.
-        if 'tls_version' in df.columns and df['tls_version'].dropna().size > 0:
-            plt.figure(figsize=(12, 5))
-            sns.countplot(x=df['tls_version'].dropna(), color='blue')
-            plt.title(f'TLS Versions Used - {app_name}')
-            plt.xlabel('TLS Version')
-            plt.ylabel('Count')
-            plt.savefig(f"{app_graph_dir}/{app_name}_tls_version.png")
-            plt.close()
+        for column, name, color, title, xlabel in (
+                ('tcp_flags', 'tcp_flags', 'orange', 'TCP Flags Distribution', 'TCP Flags (Bit Values)'),
+                ('tls_handshake_type', 'tls_handshake', 'green', 'TLS Handshake Types', 'Handshake Type'),
+                ('tls_version', 'tls_version', 'blue', 'TLS Versions Used', 'TLS Version')):
+            counts = df[column].value_counts(sort=False) if column in df.columns else None
+            if counts is not None and len(counts):
+                figures.append({'kind': 'bars', 'path': path(name), 'size': (12, 5), 'color': color,
+                                'labels': [str(label) for label in counts.index], 'counts': counts.to_numpy(),
+                                'title': f'{title} - {app_name}', 'xlabel': xlabel, 'ylabel': 'Count'})
 
         # Time Series of Packet Sizes - Plots packet size changes over time.
         # Helps in detecting burst traffic, network congestion, or consistent data flow.
-        plt.figure(figsize=(12, 6))
-        plt.plot(df['timestamp'], df['packet_size'], marker='o', linestyle='-', markersize=2)
-        plt.title(f'Time Series of Packet Sizes - {app_name}')
-        plt.xlabel('Timestamp')
-        plt.ylabel('Packet Size (Bytes)')
-        plt.grid(True)
-        plt.savefig(f"{app_graph_dir}/{app_name}_time_series.png")
-        plt.close()
+        times, sizes = _numeric(df['timestamp']), _numeric(df['packet_size'])
+        valid = ~(np.isnan(times) | np.isnan(sizes))
+        times, sizes = times[valid], sizes[valid]
+        if len(times) and np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind='stable')
+            times, sizes = times[order], sizes[order]
+        figures.append({'kind': 'line', 'path': path('time_series'), 'size': (12, 6),
+                        'points': TrafficVisualizer.downsample(times, sizes, max_points),
+                        'title': f'Time Series of Packet Sizes - {app_name}',
+                        'xlabel': 'Timestamp', 'ylabel': 'Packet Size (Bytes)'})
 
         # Inter-Packet Time Distribution - Shows the time gaps between consecutive packets.
         # Helps in detecting network jitter, delays, or unusual transmission patterns.
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(y=df['inter_packet_time'].dropna())
-        plt.title(f'Inter-Packet Time Distribution - {app_name}')
-        plt.ylabel('Inter-Packet Time (Seconds)')
-        plt.grid(True)
-        plt.savefig(f"{app_graph_dir}/{app_name}_inter_packet_time_boxplot.png")
-        plt.close()
+        gaps = _numeric(df['inter_packet_time'])
+        gaps = gaps[~np.isnan(gaps)]
+        if len(gaps):
+            figures.append({'kind': 'box', 'path': path('inter_packet_time_boxplot'), 'size': (10, 6),
+                            'stats': _box_stats(gaps, max_points),
+                            'title': f'Inter-Packet Time Distribution - {app_name}',
+                            'xlabel': '', 'ylabel': 'Inter-Packet Time (Seconds)'})
 
         # TCP/UDP Ratio - Compares the number of TCP and UDP packets.
         # Useful for identifying whether the traffic is more reliable (TCP) or low-latency (UDP).
         protocol_counts = df['transport'].value_counts()
-        plt.figure(figsize=(8, 5))
-        sns.barplot(x=protocol_counts.index, y=protocol_counts.values)
-        plt.title(f'TCP/UDP Ratio - {app_name}')
-        plt.xlabel('Protocol')
-        plt.ylabel('Count')
-        plt.savefig(f"{app_graph_dir}/{app_name}_tcp_udp_ratio.png")
-        plt.close()
+        figures.append({'kind': 'bars', 'path': path('tcp_udp_ratio'), 'size': (8, 5), 'color': None,
+                        'labels': [str(label) for label in protocol_counts.index],
+                        'counts': protocol_counts.to_numpy(), 'title': f'TCP/UDP Ratio - {app_name}',
+                        'xlabel': 'Protocol', 'ylabel': 'Count'})
+        return figures
 
+    @staticmethod
+    def downsample(x, y, max_points=MAX_PLOT_POINTS):
+        """
+        Largest-Triangle-Three-Buckets downsampling of a series sorted by x.
+
+        The first and last points are kept; the points in between are split into max_points - 2
+        buckets, and each bucket keeps the point forming the largest triangle with the point kept
+        in the previous bucket and the mean of the next one, so spikes and bursts survive.
+
+        Returns:
+            tuple: (x, y) of at most max_points points.
+        """
+        n = len(x)
+        if n <= max_points or max_points < 3:
+            return np.asarray(x), np.asarray(y)
+        edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+        kept = np.empty(max_points, dtype=np.int64)
+        kept[0], kept[-1] = 0, n - 1
+        for bucket in range(max_points - 2):
+            start, end = edges[bucket], edges[bucket + 1]
+            if bucket < max_points - 3:
+                next_x, next_y = x[end:edges[bucket + 2]].mean(), y[end:edges[bucket + 2]].mean()
+            else:
+                next_x, next_y = x[n - 1], y[n - 1]
+            prev_x, prev_y = x[kept[bucket]], y[kept[bucket]]
+            area = np.abs((prev_x - next_x) * (y[start:end] - prev_y) - (prev_x - x[start:end]) * (next_y - prev_y))
+            kept[bucket + 1] = start + int(np.argmax(area))
+        return x[kept], y[kept]
 
     @staticmethod
-    def compare_results(csv_file, output_dir="results/graphs/compare/"):
+    def compare_results(csv_file, output_dir="results/graphs/compare/", graphs="changed"):
         """
-        Generates comparison bar charts from the results CSV file.
+        Generates comparison bar charts from the results CSV (or Parquet) file.
         """
         if not os.path.exists(csv_file):
             print("⚠ No comparison CSV file found. Run the analysis first.")
-            return
+            return []
+
+        return TrafficVisualizer.compare_dataframe(DataProcessor.load_dataframe(csv_file), output_dir, graphs)
+
+    @staticmethod
+    def compare_dataframe(df, output_dir="results/graphs/compare/", graphs="changed"):
+        """
+        Generates the comparison bar charts of compare_results from an in-memory comparison table.
 
-        df = pd.read_csv(csv_file)
+        A chart is only redrawn when the columns it plots (COMPARISON_CHARTS) changed since it was
+        last drawn; graphs works as in plot_traffic_characteristics.
 
+        Returns:
+            list: Paths of the charts redrawn (or, in dry-run mode, that would be).
+        """
         os.makedirs(output_dir, exist_ok=True)
+        manifest = GraphManifest(output_dir, graphs)
+        stale = {name for name, columns in COMPARISON_CHARTS.items()
+                 if manifest.needs(name, GraphManifest.digest(GRAPH_STYLE_VERSION, name, df[columns]))}
+        if not stale:
+            print(manifest.report())
+            return manifest.stale
+        plt, sns = _plotting()
 
         # Set a larger figure size for readability
         plt.figure(figsize=(12, 6))
 
         # Compare Average Packet Sizes - Shows the average packet size for each application.
         # Helps in understanding whether an application transmits small or large packets.
-        plt.figure(figsize=(10, 5))
-        sns.barplot(x="Application", y="Avg_Packet_Size", hue="Application", data=df, palette="Blues_r", legend=False)
-        plt.title("Average Packet Size Comparison")
-        plt.title("Average Packet Size Comparison")
-        plt.ylabel("Packet Size (Bytes)")
-        plt.xticks(rotation=45)
-        plt.savefig(os.path.join(output_dir, "comparison_packet_size.png"))
-        plt.close()
+        if "comparison_packet_size.png" in stale:
+            plt.figure(figsize=(10, 5))
+            sns.barplot(x="Application", y="Avg_Packet_Size", hue="Application", data=df, palette="Blues_r", legend=False)
+            plt.title("Average Packet Size Comparison")
+            plt.title("Average Packet Size Comparison")
+            plt.ylabel("Packet Size (Bytes)")
+            plt.xticks(rotation=45)
+            plt.savefig(os.path.join(output_dir, "comparison_packet_size.png"))
+            plt.close()
 
         # Compare TCP Sequence Number Counts
         # plt.figure(figsize=(10, 5))
@@ -142,40 +239,142 @@ class TrafficVisualizer:
 
         # Compare TLS Handshake Counts - Shows how many unique TLS handshakes each application used.
         # Helps in identifying secure vs. insecure applications based on handshake behavior.
-        plt.figure(figsize=(10, 5))
-        sns.barplot(x="Application", y="TLS_Handshake_Count", hue="Application", data=df, palette="Purples_r",legend=False)
-        plt.title("TLS Handshake Type Count Comparison")
-        plt.ylabel("Count of Unique TLS Handshake Types")
-        plt.xticks(rotation=45)
-        plt.savefig(os.path.join(output_dir, "comparison_tls_handshake.png"))
-        plt.close()
+        if "comparison_tls_handshake.png" in stale:
+            plt.figure(figsize=(10, 5))
+            sns.barplot(x="Application", y="TLS_Handshake_Count", hue="Application", data=df, palette="Purples_r",legend=False)
+            plt.title("TLS Handshake Type Count Comparison")
+            plt.ylabel("Count of Unique TLS Handshake Types")
+            plt.xticks(rotation=45)
+            plt.savefig(os.path.join(output_dir, "comparison_tls_handshake.png"))
+            plt.close()
 
         # Compare Flow Size - Measures total bytes transferred by each application.
         # Helps in understanding which applications are heavy data consumers.
-        sns.barplot(x="Application", y="Flow_Size (Bytes)", hue="Application", data=df, palette="coolwarm",legend=False)
-        plt.title("Comparison of Flow Size Between Applications")
-        plt.ylabel("Total Flow Size (Bytes)")
-        plt.xticks(rotation=45)
-        plt.savefig(f"{output_dir}/comparison_flow_size.png")
-        plt.close()
+        if "comparison_flow_size.png" in stale:
+            sns.barplot(x="Application", y="Flow_Size (Bytes)", hue="Application", data=df, palette="coolwarm",legend=False)
+            plt.title("Comparison of Flow Size Between Applications")
+            plt.ylabel("Total Flow Size (Bytes)")
+            plt.xticks(rotation=45)
+            plt.savefig(f"{output_dir}/comparison_flow_size.png")
+            plt.close()
 
         # Compare Flow Volume - Shows how many packets each application transmitted.
         # Useful for distinguishing between chatty applications (many small packets) vs. bulk transfers.
-        plt.figure(figsize=(12, 6))
-        sns.barplot(x="Application", y="Flow_Volume (Packets)", hue="Application", data=df, palette="viridis",legend=False)
-        plt.title("Comparison of Flow Volume Between Applications")
-        plt.ylabel("Total Flow Volume (Packets)")
-        plt.xticks(rotation=45)
-        plt.savefig(f"{output_dir}/comparison_flow_volume.png")
-        plt.close()
+        if "comparison_flow_volume.png" in stale:
+            plt.figure(figsize=(12, 6))
+            sns.barplot(x="Application", y="Flow_Volume (Packets)", hue="Application", data=df, palette="viridis",legend=False)
+            plt.title("Comparison of Flow Volume Between Applications")
+            plt.ylabel("Total Flow Volume (Packets)")
+            plt.xticks(rotation=45)
+            plt.savefig(f"{output_dir}/comparison_flow_volume.png")
+            plt.close()
 
         # Feature Correlation Heatmap - Displays correlations between various traffic attributes.
         # Helps in identifying patterns, such as whether larger packets correlate with longer delays.
-        plt.figure(figsize=(10, 8))
-        corr = df[['Avg_Packet_Size', 'Inter_Packet_Time_Mean', 'Flow_Size (Bytes)', 'Flow_Volume (Packets)']].corr()
-        sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f")
-        plt.title("Feature Correlation Heatmap")
-        plt.savefig(f"{output_dir}/feature_correlation_heatmap.png")
-        plt.close()
-
-        print("✅ Comparison graphs saved in results/ folder.")
\ No newline at end of file
+        if "feature_correlation_heatmap.png" in stale:
+            plt.figure(figsize=(10, 8))
+            corr = df[['Avg_Packet_Size', 'Inter_Packet_Time_Mean', 'Flow_Size (Bytes)', 'Flow_Volume (Packets)']].corr()
+            sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f")
+            plt.title("Feature Correlation Heatmap")
+            plt.savefig(f"{output_dir}/feature_correlation_heatmap.png")
+            plt.close()
+
+        manifest.save()
+        print(manifest.report())
+        print("✅ Comparison graphs saved in results/ folder.")
+        return manifest.stale
+
+
+def _numeric(column):
+    """A column as a float64 array (missing values and non-numbers as NaN)."""
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _binned_kde(values, bin_width):
+    """
+    Gaussian KDE (Scott's bandwidth, like seaborn's) of the values over their range, scaled to
+    histogram counts. The values are binned on a KDE_GRID-point grid first and the grid is
+    convolved with the kernel, so the cost is one pass over the data.
+
+    Returns:
+        tuple: (grid, counts), or None when the values have no spread.
+    """
+    low, high = values.min(), values.max()
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5) if len(values) > 1 else 0.0
+    if not bandwidth > 0 or high <= low:
+        return None
+    counts, edges = np.histogram(values, bins=KDE_GRID, range=(low, high))
+    step = edges[1] - edges[0]
+    radius = min(int(np.ceil(4 * bandwidth / step)), KDE_GRID)
+    offsets = np.arange(-radius, radius + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    density = np.convolve(counts, kernel)[radius:radius + KDE_GRID] / len(values)
+    return (edges[:-1] + edges[1:]) / 2, density * len(values) * bin_width
+
+
+def _box_stats(values, max_fliers=MAX_PLOT_POINTS):
+    """
+    Box-plot statistics (Axes.bxp format, whiskers at 1.5 IQR like Axes.boxplot). Beyond
+    max_fliers outliers, evenly spaced ones of the sorted outliers are kept, extremes included.
+    """
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    fliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    if len(fliers) > max_fliers:
+        fliers = np.sort(fliers)[np.linspace(0, len(fliers) - 1, max_fliers).astype(np.int64)]
+    return {'med': median, 'q1': q1, 'q3': q3, 'whislo': inside.min(), 'whishi': inside.max(), 'fliers': fliers}
+
+
+def _render_figure(figure):
+    """
+    Draws one figure of TrafficVisualizer.traffic_figures and saves it. Uses matplotlib's Figure
+    directly (no pyplot state, no GUI backend), so figures can be drawn in any process or thread.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figure['size'])
+    ax = fig.subplots()
+    kind = figure['kind']
+    if kind == 'histogram':
+        ax.stairs(figure['counts'], figure['edges'], fill=True, color=figure['color'], alpha=0.5)
+        ax.stairs(figure['counts'], figure['edges'], color=figure['color'])
+        if figure['kde'] is not None:
+            ax.plot(*figure['kde'], color=figure['color'])
+    elif kind == 'bars':
+        colors = figure['color'] or [f"C{i % 10}" for i in range(len(figure['labels']))]
+        ax.bar(figure['labels'], figure['counts'], color=colors)
+    elif kind == 'line':
+        ax.plot(*figure['points'], marker='o', linestyle='-', markersize=2)
+        ax.grid(True)
+    elif kind == 'box':
+        ax.bxp([figure['stats']])
+        ax.set_xticks([])
+        ax.grid(True)
+    ax.set_title(figure['title'])
+    ax.set_xlabel(figure['xlabel'])
+    ax.set_ylabel(figure['ylabel'])
+    fig.savefig(figure['path'])
+    return figure['path']
+
+
+_POOL = {}
+
+
+def _render_pool(workers):
+    """Process pool drawing the figures, started on first use and reused by later captures."""
+    if workers not in _POOL:
+        from concurrent.futures import ProcessPoolExecutor
+        _POOL[workers] = ProcessPoolExecutor(max_workers=workers)
+        atexit.register(_POOL[workers].shutdown)
+    return _POOL[workers]
+
+
+def _plotting():
+    """
+    Imports pyplot and seaborn on first use: with SciPy they take over a second to import, a
+    cost runs that only analyse or classify should not pay.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
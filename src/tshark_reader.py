@@ -0,0 +1,133 @@
+import csv
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Fields every packet needs: the flow 5-tuple, frame time and frame length
+KEY_FIELDS = ['frame.time_epoch', 'frame.len', 'ip.src', 'ip.dst',
+              'tcp.srcport', 'tcp.dstport', 'udp.srcport', 'udp.dstport']
+
+# Output column -> tshark field that produces it
+COLUMN_FIELDS = {
+    'protocol': 'frame.protocols',
+    'tcp_seq': 'tcp.seq',
+    'tcp_ack': 'tcp.ack',
+    'tcp_window': 'tcp.window_size',
+    'tcp_flags': 'tcp.flags',
+    'tcp_len': 'tcp.len',
+    'tls_handshake_type': 'tls.handshake.type',
+    'tls_version': 'tls.record.version',
+    'tls_cipher_suite': 'tls.handshake.ciphersuite',
+}
+
+TLS_COLUMNS = ('tls_handshake_type', 'tls_version', 'tls_cipher_suite')
+
+# Columns that need the TLS dissector: the TLS fields, and the highest layer (TLS instead of TCP)
+TLS_DISSECTOR_COLUMNS = TLS_COLUMNS + ('protocol', 'highest_layer')
+
+# Fields kept as text; everything else is parsed as a number (hex fields are converted afterwards)
+TEXT_FIELDS = {'ip.src', 'ip.dst', 'tcp.srcport', 'tcp.dstport', 'udp.srcport', 'udp.dstport',
+               'frame.protocols', 'tcp.flags', 'tls.record.version', 'tls.handshake.ciphersuite'}
+
+# Same packets PacketAnalyzer keeps: IPv4 with a TCP or UDP header
+DISPLAY_FILTER = 'ip && (tcp || udp)'
+
+
+class TsharkFieldReader:
+    """
+    Runs tshark in `-T fields` mode with only the fields the requested columns need and parses
+    its output stream in bulk with the pandas CSV reader.
+    """
+
+    def __init__(self, pcap_file, columns):
+        self.pcap_file = pcap_file
+        self.columns = columns
+        self.fields = self.fields_for(columns)
+
+    @staticmethod
+    def fields_for(columns):
+        """Returns the tshark fields needed to produce the given output columns."""
+        fields = KEY_FIELDS + [COLUMN_FIELDS[col] for col in columns if col in COLUMN_FIELDS]
+        if 'tls_cipher_suite' in columns and 'tls.handshake.type' not in fields:
+            # The cipher suite is only kept for ServerHello messages
+            fields.append('tls.handshake.type')
+        return fields
+
+    def command(self):
+        """Builds the tshark command line."""
+        tshark = shutil.which('tshark')
+        if tshark is None:
+            raise FileNotFoundError("tshark not found on PATH (install Wireshark/tshark)")
+
+        cmd = [tshark, '-r', str(self.pcap_file), '-n', '-Y', DISPLAY_FILTER, '-T', 'fields',
+               '-E', 'separator=/t', '-E', 'occurrence=f', '-E', 'quote=n', '-E', 'header=n']
+        for field in self.fields:
+            cmd += ['-e', field]
+        if not any(col in self.columns for col in TLS_DISSECTOR_COLUMNS):
+            # Nothing TLS-related was requested: skip the TLS dissector (and its reassembly) entirely
+            cmd += ['--disable-protocol', 'tls']
+        return cmd
+
+    def read_table(self):
+        """
+        Runs tshark and parses its output.
+
+        Returns:
+            pd.DataFrame: One row per packet, one column per tshark field.
+        """
+        # Exhaust the generator so tshark's exit status is checked
+        tables = list(self.iter_tables())
+        return tables[0]
+
+    def iter_tables(self, chunk_size=None):
+        """
+        Runs tshark and parses its output while it is produced.
+
+        Args:
+            chunk_size (int): Packets per table (None: a single table with every packet).
+
+        Yields:
+            pd.DataFrame: One row per packet, one column per tshark field.
+        """
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(self.command(), stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                if chunk_size is None:
+                    yield parse_fields(proc.stdout, self.fields)
+                else:
+                    yield from parse_fields(proc.stdout, self.fields, chunk_size)
+            finally:
+                proc.stdout.close()
+                returncode = proc.wait()
+
+            # tshark exits with 2 on a capture cut short mid-packet; the packets before it are still valid
+            if returncode not in (0, 2):
+                stderr.seek(0)
+                message = stderr.read().decode(errors='replace').strip()
+                raise RuntimeError(f"tshark failed ({returncode}): {message}")
+
+
+def parse_fields(stream, fields, chunk_size=None):
+    """
+    Parses a tab-separated tshark `-T fields` stream into a DataFrame with typed columns.
+
+    With a chunk_size, returns an iterator of DataFrames of up to chunk_size rows instead.
+    """
+    dtypes = {field: str if field in TEXT_FIELDS else np.float64 for field in fields}
+    try:
+        return pd.read_csv(stream, sep='\t', names=fields, header=None, dtype=dtypes, chunksize=chunk_size,
+                           quoting=csv.QUOTE_NONE, na_values=[''], keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        if chunk_size is not None:
+            return iter(())
+        return pd.DataFrame({field: pd.Series(dtype=dtype) for field, dtype in dtypes.items()})
+
+
+def hex_to_int(series):
+    """Converts a column of hex strings ("0x0018") to floats, decoding each distinct value once."""
+    codes, uniques = pd.factorize(series)
+    values = np.array([int(value, 16) for value in uniques], dtype=np.float64)
+    return np.where(codes >= 0, values[np.maximum(codes, 0)] if len(values) else np.nan, np.nan)
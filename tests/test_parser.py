@@ -1,15 +1,73 @@
 import unittest
 import sys
 import os
+import io
+import struct
 import pandas as pd
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 #Add `src` directory to Python module search path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+# The training package (model/) comes last, so src/main.py keeps the name `main`
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'model')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
 
-from packet_analyzer import PacketAnalyzer
+from packet_analyzer import PacketAnalyzer, ALL_COLUMNS
 from file_manager import FileManager
 from data_processor import DataProcessor
+from tshark_reader import TsharkFieldReader, parse_fields, hex_to_int
+from flow_table import FlowTable
+from flow_aggregator import FlowAggregator
+from parse_cache import ParseCache
+from tcp_analyzer import TcpAnalyzer
+from results_store import ResultsStore
+from pipeline import Pipeline
+from forest_evaluator import FlatForest, FLAT_MAX_ROWS
+from traffic_classifier import TrafficClassifier
+from flow_stream import FlowStreamClassifier, STREAM_COLUMNS
+from flow_aggregator import MODEL_FEATURES
+from early_classifier import EarlyFlowClassifier
+from data_pipeline import FeaturePipeline, FEATURE_COLUMNS
+from model_tuner import ModelTuner
+from incremental import IncrementalTrainer
+from traffic_visualizer import TrafficVisualizer
+from graph_manifest import GraphManifest
+from traffic_generator import TrafficGenerator
+from run_metrics import RunMetrics
+import benchmark
+
+
+def build_frame(src, dst, sport, dport, proto=6, seq=0, ack=0, flags=0x10, payload=b"", options=b""):
+    """Builds an Ethernet/IPv4/TCP-or-UDP frame."""
+    if proto == 6:
+        offset = (20 + len(options)) // 4
+        transport = struct.pack("!HHIIBBHHH", sport, dport, seq, ack, offset << 4, flags, 1024, 0, 0) + options
+    else:
+        transport = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(transport) + len(payload), 0, 0, 64, proto, 0,
+                     bytes(map(int, src.split("."))), bytes(map(int, dst.split("."))))
+    return b"\x00" * 12 + b"\x08\x00" + ip + transport + payload
+
+
+def write_pcapng(path, frames):
+    """Writes (timestamp, frame) pairs as a single-interface pcapng file (microsecond timestamps)."""
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IIIHHqI", 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28))
+        f.write(struct.pack("<IIHHII", 1, 20, 1, 0, 65535, 20))
+        for timestamp, frame in frames:
+            units = round(timestamp * 1_000_000)
+            padded = frame + b"\x00" * (-len(frame) % 4)
+            length = 32 + len(padded)
+            f.write(struct.pack("<IIIIIII", 6, length, 0, units >> 32, units & 0xFFFFFFFF, len(frame), len(frame)))
+            f.write(padded + struct.pack("<I", length))
+
+
+def synthetic_profile():
+    """TrafficGenerator profile of the generated test captures (11 size and gap quantiles, 30% UDP)."""
+    import numpy as np
+    return {"tcp_sizes": np.linspace(60, 1500, 11), "udp_sizes": np.linspace(42, 1200, 11),
+            "gaps": np.linspace(0, 0.01, 11), "udp_share": 0.3}
+
 
 class TestPacketAnalyzer(unittest.TestCase):
 
@@ -110,5 +168,746 @@ class TestPacketAnalyzer(unittest.TestCase):
         except SystemExit:
             self.fail("FileManager.validate_file() raised SystemExit unexpectedly!")
 
+    def test_native_backend_features(self):
+        """Test the built-in pcapng reader on a handcrafted TCP handshake, TLS record and UDP datagram."""
+        pcap = os.path.join(self.test_results_dir, "native_backend.pcapng")
+        client_hello = bytes([22, 3, 1, 0, 8, 1, 0, 0, 4, 3, 3, 0, 0])
+        write_pcapng(pcap, [
+            (1.5, build_frame("10.0.0.1", "10.0.0.2", 5000, 443, seq=1000, flags=0x02,
+                              options=bytes([3, 3, 7, 0]))),
+            (1.75, build_frame("10.0.0.2", "10.0.0.1", 443, 5000, seq=9000, ack=1001, flags=0x12,
+                               options=bytes([3, 3, 2, 0]))),
+            (2.0, build_frame("10.0.0.1", "10.0.0.2", 5000, 443, seq=1001, ack=9001, flags=0x18,
+                              payload=client_hello)),
+            (2.5, build_frame("10.0.0.1", "10.0.0.3", 6000, 53, proto=17, payload=b"\x12\x34")),
+        ])
+
+        analyzer = PacketAnalyzer(pcap, backend="native")
+        df = analyzer.extract_features()
+
+        self.assertEqual(len(df), 4)
+        self.assertEqual(df["protocol"].tolist(), ["TCP", "TCP", "TLS", "DNS"])
+        self.assertEqual(df["tcp_seq"].tolist()[:3], [0.0, 0.0, 1.0])
+        self.assertEqual(df["tcp_ack"].tolist()[:3], [0.0, 1.0, 1.0])
+        self.assertEqual(df["tcp_window"].tolist()[:3], [1024.0, 1024.0, 1024.0 * 2 ** 7])
+        self.assertEqual(df["tcp_flags"].tolist()[:3], [2.0, 18.0, 24.0])
+        self.assertEqual(df["tls_version"].tolist()[2], "0x0301")
+        self.assertEqual(df["tls_handshake_type"].tolist()[2], 1.0)
+        self.assertEqual(df["flow_volume"].tolist(), [1.0, 1.0, 2.0, 1.0])
+        self.assertAlmostEqual(df["inter_packet_time"].tolist()[2], 0.5)
+        self.assertEqual(analyzer.flows[("10.0.0.1", "10.0.0.2", "TCP", "5000", "443")]["volume"], 2)
+
+    def test_native_backend_flow_totals(self):
+        """Test that the native backend's running flow totals agree with the per-flow packet counts."""
+        test_pcap = os.path.join(self.test_data_dir, "test_traffic.pcapng")
+        if not os.path.exists(test_pcap):
+            self.skipTest("Skipping test: Valid PCAP file not found in data directory.")
+
+        analyzer = PacketAnalyzer(test_pcap, backend="native")
+        df = analyzer._extract_with_native_reader()
+
+        self.assertFalse(df.empty, "Native reader should decode packets from the sample capture")
+        self.assertEqual(sum(flow["volume"] for flow in analyzer.flows.values()), len(df))
+        self.assertEqual(sum(flow["size"] for flow in analyzer.flows.values()), df["packet_size"].sum())
+        self.assertEqual(max(flow["volume"] for flow in analyzer.flows.values()), df["flow_volume"].max())
+
+    def test_native_backend_tls_reassembly(self):
+        """Test that a TLS record split over two TCP segments is reported on the segment completing it."""
+        pcap = os.path.join(self.test_results_dir, "native_tls_split.pcapng")
+        server_hello = bytes([22, 3, 3, 0, 42, 2, 0, 0, 38, 3, 3]) + bytes(32) + bytes([0, 0x13, 0x02, 0])
+        write_pcapng(pcap, [
+            (1.0, build_frame("10.0.0.2", "10.0.0.1", 443, 5000, seq=100, ack=1, payload=server_hello[:20])),
+            (1.1, build_frame("10.0.0.2", "10.0.0.1", 443, 5000, seq=120, ack=1, payload=server_hello[20:])),
+        ])
+
+        df = PacketAnalyzer(pcap, backend="native")._extract_with_native_reader()
+
+        self.assertEqual(df["protocol"].tolist(), ["TCP", "TLS"])
+        self.assertEqual(df["tls_handshake_type"].tolist()[1], 2)
+        self.assertEqual(df["tls_cipher_suite"].tolist()[1], "0x1302")
+
+    def test_native_backend_sharded_decoding(self):
+        """Test that decoding a capture in byte-range shards gives the same table and flow state as one pass."""
+        test_pcap = os.path.join(self.test_data_dir, "test_traffic.pcapng")
+        if not os.path.exists(test_pcap):
+            self.skipTest("Skipping test: Valid PCAP file not found in data directory.")
+
+        sequential = PacketAnalyzer(test_pcap, backend="native")
+        sharded = PacketAnalyzer(test_pcap, backend="native", workers=3)
+
+        pd.testing.assert_frame_equal(sequential._extract_with_native_reader(), sharded._extract_with_native_reader())
+        self.assertEqual(dict(sequential.flows), dict(sharded.flows))
+
+    def test_native_backend_streaming(self):
+        """Test that streamed chunks carry flow, TCP and TLS state across chunk boundaries."""
+        pcap = os.path.join(self.test_results_dir, "native_streaming.pcapng")
+        server_hello = bytes([22, 3, 3, 0, 42, 2, 0, 0, 38, 3, 3]) + bytes(32) + bytes([0, 0x13, 0x02, 0])
+        write_pcapng(pcap, [
+            (1.0, build_frame("10.0.0.1", "10.0.0.2", 5000, 443, seq=1000, flags=0x02,
+                              options=bytes([3, 3, 7, 0]))),
+            (1.25, build_frame("10.0.0.2", "10.0.0.1", 443, 5000, seq=9000, ack=1001, flags=0x12,
+                               options=bytes([3, 3, 2, 0]))),
+            (1.5, build_frame("10.0.0.2", "10.0.0.1", 443, 5000, seq=9001, ack=1001, payload=server_hello[:20])),
+            (2.0, build_frame("10.0.0.2", "10.0.0.1", 443, 5000, seq=9021, ack=1001, payload=server_hello[20:])),
+            (2.5, build_frame("10.0.0.1", "10.0.0.2", 5000, 443, seq=1001, ack=9048)),
+        ])
+        output_csv = os.path.join(self.test_results_dir, "native_streaming.csv")
+
+        expected = PacketAnalyzer(pcap, backend="native").extract_features()
+        analyzer = PacketAnalyzer(pcap, backend="native")
+        chunks = list(analyzer.iter_features(chunk_size=3, output_csv=output_csv))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 2])
+        df = pd.concat(chunks, ignore_index=True)
+        for col in ("protocol", "tcp_seq", "tcp_ack", "tcp_window", "flow_size", "flow_volume", "tls_cipher_suite"):
+            self.assertEqual(df[col].tolist(), expected[col].tolist(), col)
+        self.assertAlmostEqual(df["inter_packet_time"].tolist()[2], 0.25)
+        self.assertEqual(len(pd.read_csv(output_csv)), 5)
+        self.assertEqual(analyzer.flows[("10.0.0.2", "10.0.0.1", "TCP", "443", "5000")]["volume"], 3)
+
+        # The server direction ends (idle) before the last packet: its TCP and TLS state is freed
+        analyzer = PacketAnalyzer(pcap, backend="native", idle_timeout=0.4)
+        list(analyzer.iter_features(chunk_size=2))
+        self.assertNotIn(("10.0.0.2", "10.0.0.1", "TCP", "443", "5000"), analyzer.flows)
+        self.assertNotIn(("10.0.0.2", "10.0.0.1", "TCP", "443", "5000"), analyzer.tcp_state)
+        self.assertIn(("10.0.0.1", "10.0.0.2", "TCP", "5000", "443"), analyzer.tcp_state)
+        self.assertEqual(analyzer.tls_streams.ids, {})
+
+    def test_flow_table_timeouts(self):
+        """Test that flows expire on idle/active timeouts, per packet and in vectorized blocks alike."""
+        flow_a, flow_b = ("10.0.0.1", "10.0.0.2", "UDP", "5000", "53"), ("10.0.0.1", "10.0.0.3", "UDP", "5001", "53")
+        packets = [(flow_a, 0.0, 100), (flow_b, 0.5, 60), (flow_a, 1.0, 100), (flow_a, 4.0, 100),
+                   (flow_b, 4.5, 60), (flow_a, 5.0, 100), (flow_a, 6.0, 100), (flow_a, 7.5, 100)]
+
+        per_packet = FlowTable(idle_timeout=2.0, active_timeout=2.5)
+        expected = [per_packet.add_packet(key, timestamp, size) for key, timestamp, size in packets]
+        self.assertEqual([volume for _, volume, _ in expected], [1, 1, 2, 1, 1, 2, 3, 1])
+        self.assertIsNone(expected[3][2], "An idle gap should start a new flow")
+
+        vectorized = FlowTable(idle_timeout=2.0, active_timeout=2.5)
+        for block in (packets[:3], packets[3:]):
+            keys = list(dict.fromkeys(key for key, _, _ in block))
+            flow_ids = pd.Series([keys.index(key) for key, _, _ in block]).to_numpy()
+            _, volumes, _ = vectorized.update(keys, flow_ids, [p[1] for p in block], [p[2] for p in block])
+            self.assertEqual(volumes.tolist(), [volume for _, volume, _ in expected[:len(block)]])
+            expected = expected[len(block):]
+
+        self.assertEqual(dict(per_packet), dict(vectorized))
+        records = vectorized.pop_expired()
+        self.assertEqual(sorted(records["reason"]), ["active", "idle", "idle"])
+        self.assertEqual(per_packet.pop_expired()["volume"].sum(), records["volume"].sum())
+
+        # A long flow crosses many active periods in one block
+        per_packet, vectorized = FlowTable(active_timeout=1.0), FlowTable(active_timeout=1.0)
+        times = [i * 0.3 for i in range(200)]
+        expected = [per_packet.add_packet(flow_a, timestamp, 100)[1] for timestamp in times]
+        _, volumes, _ = vectorized.update([flow_a], pd.Series([0] * len(times)).to_numpy(), times, [100] * len(times))
+        self.assertEqual(volumes.tolist(), expected)
+        self.assertEqual(len(vectorized.pop_expired()), len(per_packet.pop_expired()))
+
+    def test_flow_aggregation(self):
+        """Test that both directions of a 5-tuple are aggregated into one flow record."""
+        df = pd.DataFrame({
+            "timestamp": [1.0, 1.5, 2.0, 3.0, 3.5],
+            "packet_size": [100, 1500, 60, 80, 200],
+            "ip_src": ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.1", "10.0.0.1"],
+            "ip_dst": ["10.0.0.2", "10.0.0.1", "10.0.0.1", "10.0.0.2", "10.0.0.2"],
+            "transport": ["TCP", "TCP", "UDP", "TCP", "UDP"],
+            "src_port": ["5000", "443", "53", "5000", "5000"],
+            "dst_port": ["443", "5000", "6000", "443", "443"],
+        })
+
+        flows = FlowAggregator.aggregate(df)
+
+        self.assertEqual(len(flows), 3)
+        first = flows.iloc[0]
+        self.assertEqual((first["SRC_IP"], first["DST_PORT"], first["PROTOCOL"]), ("10.0.0.1", "443", "TCP"))
+        self.assertEqual((first["BYTES"], first["BYTES_REV"]), (180, 1500))
+        self.assertEqual((first["PACKETS"], first["PACKETS_REV"]), (2, 1))
+        self.assertAlmostEqual(first["PKT_LENGTHS_MEAN"], 560.0)
+        self.assertAlmostEqual(first["INTERVALS_MEAN"], 1.0)
+        self.assertEqual(flows["Flow_Volume"].tolist(), [3, 1, 1])
+        self.assertEqual(flows["SRC_IP"].tolist()[1], "10.0.0.3", "Forward is the direction of the first packet")
+
+    def test_parse_cache(self):
+        """Test that the parse cache is keyed on capture content and evicts least recently used entries."""
+        cache_dir = os.path.join(self.test_results_dir, "parse_cache")
+        for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+            os.remove(os.path.join(cache_dir, name))
+        captures = []
+        for i in range(3):
+            captures.append(os.path.join(self.test_results_dir, f"cache_{i}.pcapng"))
+            write_pcapng(captures[-1], [(1.0 + i, build_frame("10.0.0.1", "10.0.0.2", 5000 + i, 443))])
+
+        cache = ParseCache(cache_dir)
+        keys = [cache.key(capture, "native", 1) for capture in captures]
+        self.assertNotEqual(cache.key(captures[0], "native", 1), cache.key(captures[0], "native", 2))
+        self.assertIsNone(cache.get(keys[0]))
+        cache.put(keys[0], ({"Application": "A"}, pd.DataFrame({"packet_size": [60.0]})))
+        summary, df = cache.get(keys[0])
+        self.assertEqual((summary["Application"], df["packet_size"].tolist()), ("A", [60.0]))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Room for two entries: storing a third evicts the least recently used one
+        cache.max_bytes = 2 * os.path.getsize(os.path.join(cache_dir, keys[0] + ".pkl")) + 16
+        cache.put(keys[1], ({"Application": "B"}, pd.DataFrame({"packet_size": [61.0]})))
+        os.utime(os.path.join(cache_dir, keys[1] + ".pkl"), (0, 0))
+        cache.put(keys[2], ({"Application": "C"}, pd.DataFrame({"packet_size": [62.0]})))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+
+    def test_parquet_output(self):
+        """Test that a cleaned table round-trips through typed Parquet and stays smaller than the CSV."""
+        try:
+            DataProcessor.check_output_format("parquet")
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        n = 2000
+        df = DataProcessor.clean_dataframe(pd.DataFrame({
+            "timestamp": [1.0 + i / 10 for i in range(n)],
+            "packet_size": [60 + i % 1400 for i in range(n)],
+            "protocol": ["TLS" if i % 3 else "TCP" for i in range(n)],
+            "ip_src": [f"10.0.0.{i % 4}" for i in range(n)],
+            "transport": ["TCP"] * n,
+            "tls_handshake_type": [1 if i % 5 == 0 else None for i in range(n)],
+            "flow_size": [60 * (i + 1) for i in range(n)],
+        }))
+        csv_file = os.path.join(self.test_results_dir, "typed.csv")
+        parquet_file = DataProcessor.output_path(csv_file, "parquet")
+        DataProcessor.save_dataframe(df, csv_file)
+        DataProcessor.save_dataframe(df, parquet_file)
+
+        loaded = DataProcessor.load_dataframe(parquet_file)
+        self.assertEqual(str(loaded["packet_size"].dtype), "int32")
+        self.assertEqual(str(loaded["ip_src"].dtype), "category")
+        self.assertEqual(loaded["tls_handshake_type"].astype(str).tolist()[:2], ["1.0", "Unknown"])
+        self.assertEqual(loaded["flow_size"].tolist(), df["flow_size"].tolist())
+        self.assertLess(os.path.getsize(parquet_file), os.path.getsize(csv_file))
+
+    def test_compact_dtypes(self):
+        """Test that compact cleaning keeps missing values as nullable integers and shrinks the table."""
+        df = pd.DataFrame({
+            "timestamp": [1.0, 1.5, 2.0, 2.5],
+            "packet_size": [60.0, 1500.0, 80.0, 60.0],
+            "protocol": ["TLS", "TCP", "DNS", "TLS"],
+            "ip_src": ["10.0.0.1", "10.0.0.2", "10.0.0.1", None],
+            "ip_dst": ["10.0.0.2", "10.0.0.1", "8.8.8.8", "10.0.0.2"],
+            "transport": ["TCP", "TCP", "UDP", "TCP"],
+            "src_port": ["5000", "443", "5001", "5000"],
+            "dst_port": ["443", "5000", "53", "443"],
+            "tcp_flags": [24.0, 16.0, None, 24.0],
+            "tcp_window": [1000.0, None, 2000.0, 6000.0],
+        })
+        compact = DataProcessor.clean_dataframe(df.copy(), compact=True)
+
+        self.assertEqual(str(compact["ip_src"].dtype), "UInt32")
+        self.assertEqual(int(compact["ip_src"].iloc[0]), 0x0A000001)
+        self.assertTrue(pd.isna(compact["ip_src"].iloc[3]))
+        self.assertEqual(str(compact["packet_size"].dtype), "UInt16")
+        self.assertEqual(str(compact["tcp_flags"].dtype), "UInt8")
+        self.assertTrue(pd.isna(compact["tcp_flags"].iloc[2]), "Missing flags are not median-filled")
+        self.assertEqual(str(compact["src_port"].dtype), "UInt16")
+        self.assertEqual(compact["dst_port"].tolist(), [443, 5000, 53, 443])
+        expanded = DataProcessor.expand_dataframe(compact)
+        self.assertEqual(expanded["ip_src"].tolist(), ["10.0.0.1", "10.0.0.2", "10.0.0.1", "Unknown"])
+        self.assertEqual(expanded["src_port"].tolist(), df["src_port"].tolist())
+
+        # The stored summary does not depend on the mode: missing numbers count as their median in both
+        from main import summarize_packets
+        self.assertEqual(summarize_packets(compact, "APP"),
+                         summarize_packets(DataProcessor.clean_dataframe(df.copy()), "APP"))
+
+        # Dictionaries only pay off past a few rows
+        df = pd.concat([df] * 1000, ignore_index=True)
+        report = DataProcessor.memory_report(DataProcessor.clean_dataframe(df.copy()),
+                                             DataProcessor.clean_dataframe(df.copy(), compact=True))
+        self.assertLess(report.loc["total", "after"], report.loc["total", "before"])
+
+    def test_tcp_rtt_and_retransmissions(self):
+        """Test that TCP segments are matched to their ACKs and a repeated segment counts as a retransmission."""
+        pcap = os.path.join(self.test_results_dir, "tcp_rtt.pcapng")
+        client, server = ("10.0.0.1", "10.0.0.2", 5000, 443), ("10.0.0.2", "10.0.0.1", 443, 5000)
+        write_pcapng(pcap, [
+            (1.00, build_frame(*client, seq=1000, flags=0x02)),
+            (1.05, build_frame(*server, seq=7000, ack=1001, flags=0x12)),
+            (1.06, build_frame(*client, seq=1001, ack=7001, flags=0x10)),
+            (1.10, build_frame(*client, seq=1001, ack=7001, flags=0x18, payload=b"a" * 100)),
+            (1.15, build_frame(*server, seq=7001, ack=1101, flags=0x10)),
+            (1.20, build_frame(*client, seq=1101, ack=7001, flags=0x18, payload=b"b" * 100)),
+            (1.50, build_frame(*client, seq=1101, ack=7001, flags=0x18, payload=b"b" * 100)),
+            (1.55, build_frame(*server, seq=7001, ack=1201, flags=0x10)),
+        ])
+        df = PacketAnalyzer(pcap, backend="native", columns=ALL_COLUMNS)._extract_with_native_reader()
+
+        flows = TcpAnalyzer.analyze(df)
+
+        self.assertEqual(len(flows), 1)
+        flow = flows.iloc[0]
+        self.assertEqual((flow["SRC_PORT"], flow["DATA_SEGMENTS"], flow["RETRANSMISSIONS"]), ("5000", 5, 1))
+        self.assertAlmostEqual(flow["LOSS_RATE"], 0.2)
+        # SYN, SYN-ACK and the first data segment; the retransmitted one is ambiguous (Karn)
+        self.assertEqual(flow["RTT_SAMPLES"], 3)
+        self.assertAlmostEqual(flow["RTT_P50"], 0.05, places=6)
+        self.assertAlmostEqual(TcpAnalyzer.summarize(flows)["RTT"], (0.05 + 0.01 + 0.05) / 3, places=6)
+
+    def test_results_store(self):
+        """Test that summaries are upserted per (application, capture hash) and exported as a comparison CSV."""
+        db_path = os.path.join(self.test_results_dir, "results.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        with ResultsStore(db_path) as store:
+            store.import_table(pd.DataFrame({"Application": ["ZOOM", "ZOOM"], "Avg_Packet_Size": [343.0, 343.0],
+                                             "TYPE": ["Video", "Video"]}))
+            store.upsert({"Application": "ZOOM", "Capture_Hash": "abc", "Avg_Packet_Size": 300.0}, analyzed_at=10.0)
+            store.upsert({"Application": "CHROME", "Capture_Hash": "def", "Avg_Packet_Size": 430.0}, analyzed_at=20.0)
+            stored = store.upsert({"Application": "ZOOM", "Capture_Hash": "abc", "Avg_Packet_Size": 310.0,
+                                   "RTT": float("nan")}, analyzed_at=30.0)
+            self.assertEqual(stored, {"Application": "ZOOM", "Capture_Hash": "abc", "Avg_Packet_Size": 310.0,
+                                      "RTT": None})
+
+            self.assertEqual(len(store), 3, "Identical imported rows and re-analysed captures are stored once")
+            zoom = store.query(application="ZOOM")
+            self.assertEqual(zoom["Avg_Packet_Size"].tolist(), [343.0, 310.0])
+            self.assertEqual(store.query(since=15, until=25)["Application"].tolist(), ["CHROME"])
+
+            csv_file = os.path.join(self.test_results_dir, "comparison_results.csv")
+            store.export(csv_file)
+            exported = pd.read_csv(csv_file)
+            self.assertEqual(exported["Application"].tolist(), ["ZOOM", "CHROME", "ZOOM"])
+            self.assertEqual(exported.loc[0, "TYPE"], "Video")
+
+    def test_pipeline_handoff(self):
+        """Test that stages share tables in memory and each changed table is written once by persist()."""
+        comparison_csv = os.path.join(self.test_results_dir, "pipeline_comparison.csv")
+        classified_csv = os.path.join(self.test_results_dir, "pipeline_classified.csv")
+        for path in (comparison_csv, classified_csv):
+            if os.path.exists(path):
+                os.remove(path)
+        pipeline = Pipeline()
+        pipeline.register("comparison", comparison_csv)
+        pipeline.register("classified", classified_csv)
+        self.assertFalse(pipeline.exists("comparison"))
+        self.assertIsNone(pipeline.get("comparison"))
+
+        df = pd.DataFrame({"Application": ["ZOOM"], "Avg_Packet_Size": [343.0]})
+        pipeline.put("comparison", df)
+        self.assertIs(pipeline.get("comparison"), df, "A table is handed over without a file round-trip")
+        self.assertFalse(os.path.exists(comparison_csv), "Nothing is written before persist()")
+
+        pipeline.persist()
+        self.assertEqual(pd.read_csv(comparison_csv)["Avg_Packet_Size"].tolist(), [343.0])
+        self.assertFalse(os.path.exists(classified_csv), "Artifacts no stage produced are not written")
+        mtime = os.path.getmtime(comparison_csv)
+        pipeline.persist()
+        self.assertEqual(os.path.getmtime(comparison_csv), mtime, "Unchanged artifacts are written once")
+
+        # A later run (e.g. classification only) reads the persisted file
+        reloaded = Pipeline()
+        reloaded.register("comparison", comparison_csv)
+        self.assertEqual(reloaded.get("comparison")["Application"].tolist(), ["ZOOM"])
+        reloaded.put("summaries", df)
+        reloaded.persist()
+        self.assertIs(reloaded.get("summaries"), df, "Unregistered artifacts stay in memory")
+
+    def test_flat_forest(self):
+        """Test that the flattened forest predicts exactly like the scikit-learn forest (missing values included)."""
+        import numpy as np
+        from sklearn.ensemble import RandomForestClassifier
+
+        rng = np.random.default_rng(0)
+        X = rng.lognormal(mean=[12, 5, 6, -3], sigma=2.0, size=(3000, 4))
+        y = np.digitize(np.log(X[:, 0]) - np.log(X[:, 1]) + rng.normal(0, 1, len(X)), [5, 6, 7])
+        X[rng.random(X.shape) < 0.02] = np.nan
+        model = RandomForestClassifier(n_estimators=25, random_state=42).fit(X[:2000], y[:2000])
+
+        forest = FlatForest.from_sklearn(model)
+        test = X[2000:]
+        leaves = np.array([estimator.apply(test.astype(np.float32)) for estimator in model.estimators_])
+        np.testing.assert_array_equal(forest.apply(test) - forest.roots[:, None], leaves)
+        np.testing.assert_array_equal(forest.predict_proba(test, batch_rows=128), model.predict_proba(test))
+        np.testing.assert_array_equal(forest.predict(test), model.predict(test))
+        with self.assertRaises(ValueError):
+            forest.predict(test[:, :3])
+
+    def test_model_loading(self):
+        """Test that a pickled forest is exported once and then loaded memory-mapped with the same predictions."""
+        import pickle
+        import shutil
+        import numpy as np
+        from sklearn.ensemble import RandomForestClassifier
+
+        rng = np.random.default_rng(1)
+        X = rng.random((500, 4))
+        model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, np.where(X[:, 0] > 0.5, "Video", "Chat"))
+        model_path = os.path.join(self.test_results_dir, "model.pkl")
+        forest_path = os.path.join(self.test_results_dir, "model.forest")
+        shutil.rmtree(forest_path, ignore_errors=True)
+        with open(model_path, "wb") as f:
+            pickle.dump(model, f)
+
+        self.assertIs(type(TrafficClassifier.load_model(model_path)), RandomForestClassifier)
+        self.assertTrue(os.path.isdir(forest_path), "The first load exports the flattened forest")
+        classifier = TrafficClassifier(model_path, feature_columns=["a", "b", "c", "d"])
+        self.assertIsInstance(classifier.model, FlatForest)
+        self.assertFalse(classifier.model.value.flags.owndata, "Node arrays are memory-mapped, not read")
+        np.testing.assert_array_equal(classifier.predict(X), model.predict(X))
+        self.assertIsNone(classifier.pickled_model, "Small batches never unpickle the model")
+        X_large = rng.random((FLAT_MAX_ROWS + 1, 4))
+        np.testing.assert_array_equal(classifier.predict(X_large), model.predict(X_large))
+        self.assertIs(type(classifier.pickled_model), RandomForestClassifier, "Large batches go through sklearn")
+
+        # A newly analysed application has no TYPE label yet
+        unlabelled = pd.DataFrame(X[:2], columns=["a", "b", "c", "d"]).assign(Application="NEW")
+        self.assertEqual(classifier.classify_dataframe(unlabelled)["Predicted_Type"].tolist(), model.predict(X[:2]).tolist())
+
+    def test_lazy_imports(self):
+        """Test that importing the CLI does not import the plotting, ML or PyShark libraries."""
+        import subprocess
+        src_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+        heavy = ["matplotlib", "seaborn", "scipy", "sklearn", "joblib", "pyshark"]
+        loaded = subprocess.run(
+            [sys.executable, "-c", f"import sys, main; print([m for m in {heavy!r} if m in sys.modules])"],
+            cwd=src_dir, capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(loaded, "[]")
+
+    def test_flow_stream(self):
+        """Test that streamed flows match FlowAggregator's and are labelled as they expire during a paced replay."""
+        import time
+        import numpy as np
+        from sklearn.ensemble import RandomForestClassifier
+
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.lognormal(mean=[10, 3, 6, -3], sigma=2.0, size=(1000, 4)), columns=list(MODEL_FEATURES))
+        model = RandomForestClassifier(n_estimators=10, random_state=0).fit(
+            X, np.where(X["Avg_Packet_Size"] > 400, "Video", "Browsing"))
+        classifier = TrafficClassifier(model, feature_columns=list(MODEL_FEATURES))
+        test_pcap = os.path.join(self.test_data_dir, "test_traffic.pcapng")
+
+        # Without timeouts every flow ends with the capture, as one FlowAggregator row
+        stream = FlowStreamClassifier(classifier, batch_size=4, idle_timeout=None, active_timeout=None)
+        predictions = pd.concat(list(stream.replay(test_pcap, chunk_size=5)), ignore_index=True)
+        packets = pd.concat(PacketAnalyzer(test_pcap, backend="native", columns=STREAM_COLUMNS).iter_features())
+        flows = FlowAggregator.aggregate(packets)
+        predictions = predictions.sort_values("first_timestamp", kind="stable").reset_index(drop=True)
+        flows = flows.sort_values("TIME_FIRST", kind="stable").reset_index(drop=True)
+        self.assertEqual(predictions["volume"].tolist(), flows["Flow_Volume"].tolist())
+        self.assertEqual(predictions["ip_src"].tolist(), flows["SRC_IP"].tolist())
+        self.assertEqual(predictions["label"].tolist(), classifier.predict(flows[list(MODEL_FEATURES)]).tolist())
+        stats = stream.stats()
+        self.assertEqual((stats["packets"], stats["flows"], stats["batches"]), (len(packets), len(flows), 4))
+
+        # Replayed at 100x with a 1 s idle timeout, flows are labelled before the capture ends
+        paced = FlowStreamClassifier(classifier, batch_size=1, max_delay=0, idle_timeout=1.0)
+        start = time.perf_counter()
+        reasons = pd.concat(list(paced.replay(test_pcap, speedup=100)))["reason"]
+        span = packets["timestamp"].max() - packets["timestamp"].min()
+        self.assertGreaterEqual(time.perf_counter() - start, span / 100)
+        self.assertIn("idle", reasons.tolist())
+        self.assertEqual(paced.stats()["flows"], len(reasons))
+
+    def test_early_classifier(self):
+        """Test that flows are labelled at their n-th packet on the features the offline extraction trains on."""
+        import numpy as np
+        from sklearn.ensemble import RandomForestClassifier
+
+        test_pcap = os.path.join(self.test_data_dir, "test_traffic.pcapng")
+        packets = pd.concat(PacketAnalyzer(test_pcap, backend="native", columns=STREAM_COLUMNS).iter_features(),
+                            ignore_index=True)
+        columns = list(EarlyFlowClassifier.feature_columns(2))
+        flows = EarlyFlowClassifier.extract(packets, packets=2)
+        self.assertEqual(flows["Flow_Volume"].sum(), len(packets))
+        self.assertTrue((flows["Packet_Direction_1"] == 1).all())
+        self.assertTrue(((flows["Flow_Volume"] >= 2) == (flows["Packet_Size_2"] > 0)).all())
+
+        model = RandomForestClassifier(n_estimators=10, random_state=0).fit(
+            flows[columns], np.where(flows["Packet_Size_1"] > 100, "Video", "Browsing"))
+        classifier = TrafficClassifier(model, feature_columns=columns)
+        stream = EarlyFlowClassifier(classifier, packets=2, batch_size=3, idle_timeout=None, active_timeout=None)
+        predictions = pd.concat([batch for start in range(0, len(packets), 3)
+                                 for batch in stream.feed(packets.iloc[start:start + 3])] + stream.close(),
+                                ignore_index=True)
+
+        # Flows with two packets are decided at the second one, the others when the capture ends
+        predictions = predictions.sort_values("first_timestamp", kind="stable").reset_index(drop=True)
+        flows = flows.sort_values("TIME_FIRST", kind="stable").reset_index(drop=True)
+        self.assertEqual(predictions["reason"].tolist(), np.where(flows["Flow_Volume"] >= 2, "early", "end").tolist())
+        self.assertEqual(predictions["label"].tolist(), classifier.predict(flows[columns]).tolist())
+        self.assertEqual(stream.stats()["early"], (flows["Flow_Volume"] >= 2).sum())
+        self.assertFalse(stream.prefix_slots)  # Nothing is kept once every flow is decided
+
+        # An idle gap cuts a 5-tuple into two flow records, and two training samples, as in the stream
+        gapped = pd.DataFrame({"timestamp": [0.0, 0.1, 5.0, 5.1, 5.2], "packet_size": [100, 200, 300, 400, 500],
+                               "ip_src": ["10.0.0.1", "10.0.0.2", "10.0.0.2", "10.0.0.1", "10.0.0.1"],
+                               "ip_dst": ["10.0.0.2", "10.0.0.1", "10.0.0.1", "10.0.0.2", "10.0.0.2"],
+                               "transport": "TCP", "src_port": ["1000", "443", "443", "1000", "1000"],
+                               "dst_port": ["443", "1000", "1000", "443", "443"]})
+        self.assertEqual(len(EarlyFlowClassifier.extract(gapped, packets=2)), 1)
+        samples = EarlyFlowClassifier.extract(gapped, packets=2, idle_timeout=1.0)
+        self.assertEqual(samples["Flow_Volume"].tolist(), [2, 3])
+        self.assertEqual(samples["TIME_FIRST"].tolist(), [0.0, 5.0])
+        self.assertEqual(samples[["Packet_Size_1", "Packet_Size_2"]].values.tolist(), [[100, 200], [300, 400]])
+        self.assertEqual(samples[["Packet_Direction_1", "Packet_Direction_2"]].values.tolist(), [[1, -1], [-1, 1]])
+        self.assertEqual(samples["Inter_Packet_Time_1"].tolist(), [0.0, 0.0])
+
+        with self.assertRaises(ValueError):
+            EarlyFlowClassifier(classifier, packets=4)  # Trained on the first two packets only
+
+    def test_feature_pipeline(self):
+        """Test that the chunked training pipeline writes the same features as cleaning the whole dataset at once."""
+        import tempfile
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        n = 1000
+        raw = pd.DataFrame({
+            "BYTES": rng.integers(0, 10 ** 9, n), "BYTES_REV": rng.integers(0, 10 ** 9, n),
+            "PACKETS": rng.integers(1, 10 ** 5, n), "PACKETS_REV": rng.integers(0, 10 ** 5, n),
+            "PKT_LENGTHS_MEAN": rng.random(n) * 1500, "INTERVALS_MEAN": rng.random(n),
+            "PPI": "[1|2|3]", "TYPE": rng.choice(list("DLMPUW"), n),
+        })
+        raw.loc[::7, "BYTES"] = np.nan
+        raw.loc[3::11, "TYPE"] = np.nan
+        with tempfile.TemporaryDirectory() as tmp:
+            raw.to_csv(os.path.join(tmp, "dataset.csv"), index=False)
+            pipeline = FeaturePipeline(os.path.join(tmp, "dataset.csv"), os.path.join(tmp, "features.parquet"),
+                                       chunk_rows=64)
+            self.assertFalse(pipeline.is_current())
+            expected = raw.dropna(subset=["BYTES", "TYPE"])
+            self.assertEqual(pipeline.build(), (n, len(expected)))
+            self.assertTrue(pipeline.is_current())
+            features = pipeline.load()
+
+        self.assertEqual(list(features.columns), FEATURE_COLUMNS + ["TYPE"])
+        self.assertEqual(str(features["Flow_Volume"].dtype), "uint32")
+        self.assertEqual(features["TYPE"].dtype, "category")
+        self.assertEqual(features["Flow_Size"].tolist(), (expected["BYTES"] + expected["BYTES_REV"]).astype("int64").tolist())
+        self.assertEqual(features["TYPE"].astype(str).tolist(), expected["TYPE"].tolist())
+        np.testing.assert_allclose(features["Avg_Packet_Size"], expected["PKT_LENGTHS_MEAN"], rtol=1e-6)
+
+    def test_model_tuner(self):
+        """Test that the parameter search caches every (candidate, fold) pair and resumes instead of refitting."""
+        import tempfile
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.random((300, 4)), columns=FEATURE_COLUMNS)
+        y = pd.Series(np.where(X["Flow_Size"] > 0.5, "Video", "Browsing"))
+        grid = {"n_estimators": [5], "max_depth": [None, 2]}
+        with tempfile.TemporaryDirectory() as tmp:
+            tuner = ModelTuner(X, y, folds=3, cache_dir=tmp, n_jobs=2, keep_models=True)
+            report = tuner.search(grid)
+            self.assertEqual(len(report), 2)
+            self.assertEqual(report["cached"].tolist(), [0, 0])
+            self.assertTrue((report["fit_seconds"] > 0).all())
+            self.assertIsNone(report.loc[report["max_depth"].isna(), "max_depth"].iloc[0])
+            self.assertIsNotNone(tuner.load_model(tuner.best_params, fold=0))
+
+            # An interrupted search (one pair missing) and an extended grid only fit what is new;
+            # by default only scores are cached, not the forests
+            os.remove(tuner._result_path(tuner._task_key({"max_depth": 2, "n_estimators": 5}, 1)))
+            resumed = ModelTuner(X, y, folds=3, cache_dir=tmp, n_jobs=2).search(dict(grid, max_depth=[None, 2, 4]))
+            cached = dict(zip(map(str, resumed["max_depth"]), resumed["cached"]))
+            self.assertEqual(cached, {"None": 3, "2": 2, "4": 0})
+            self.assertIsNone(ModelTuner(X, y, folds=3, cache_dir=tmp).load_model({"max_depth": 4, "n_estimators": 5}, 0))
+            pd.testing.assert_series_equal(resumed.set_index("candidate")["mean_accuracy"].loc[[0, 1]],
+                                           report.set_index("candidate")["mean_accuracy"].loc[[0, 1]])
+
+    def test_incremental_update(self):
+        """Test that an update appends trees, snapshots every version and only promotes what passes the holdout."""
+        import pickle
+        import tempfile
+        import numpy as np
+        from sklearn.ensemble import RandomForestClassifier
+
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.random((600, 4)), columns=FEATURE_COLUMNS)
+        y = pd.Series(np.where(X["Flow_Size"] > 0.5, "Video", "Browsing"))
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, "my_trained_model.pkl")
+            trainer = IncrementalTrainer(model_path, os.path.join(tmp, "snapshots"), update_trees=3, replay_rows=50)
+            model = RandomForestClassifier(n_estimators=5, random_state=42).fit(X[:200], y[:200])
+            self.assertEqual(trainer.start(model, X[:200], y[:200])["version"], 1)
+            self.assertEqual(len(trainer._load_replay()), 50)
+
+            entry = trainer.update(X[200:400], y[200:400], X[400:], y[400:])
+            self.assertEqual((entry["version"], entry["parent"], entry["trees"]), (2, 1, 8))
+            self.assertTrue(entry["promoted"])
+            with open(model_path, "rb") as f:
+                self.assertEqual(len(pickle.load(f).estimators_), 8)
+
+            # A candidate that loses holdout accuracy stays a snapshot; any version can be promoted back
+            strict = IncrementalTrainer(model_path, os.path.join(tmp, "snapshots"), update_trees=3, tolerance=-1.0)
+            self.assertFalse(strict.update(X[200:400], y[200:400], X[400:], y[400:])["promoted"])
+            strict.promote(1)
+            self.assertEqual(trainer.history()["promoted"].tolist(), [True, False, False])
+            with open(model_path, "rb") as f:
+                self.assertEqual(len(pickle.load(f).estimators_), 5)
+            with self.assertRaises(ValueError):
+                trainer.update(X[:10], pd.Series(["Chat"] * 10), X[400:], y[400:])
+
+    def test_downsampled_traffic_figures(self):
+        """Test that the per-application figures are reduced to a bounded size and keep the series' peaks."""
+        import tempfile
+        import numpy as np
+
+        n = 50_000
+        sizes = np.full(n, 100.0)
+        sizes[12_345] = 1500.0
+        df = pd.DataFrame({"timestamp": np.arange(n) * 0.001, "packet_size": sizes,
+                           "tcp_flags": ["None"] * n, "inter_packet_time": np.r_[0.0, np.full(n - 1, 0.001)],
+                           "transport": ["TCP"] * (n - 10) + ["UDP"] * 10})
+        x, y = TrafficVisualizer.downsample(df["timestamp"].to_numpy(), sizes, 500)
+        self.assertEqual(len(x), 500)
+        self.assertEqual((x[0], x[-1]), (0.0, (n - 1) * 0.001))
+        self.assertIn(1500.0, y)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            figures = {figure["path"]: figure for figure in TrafficVisualizer.traffic_figures(df, "APP", tmp, 500)}
+            line = figures[os.path.join(tmp, "APP", "APP_time_series.png")]
+            self.assertEqual(len(line["points"][0]), 500)
+            histogram = figures[os.path.join(tmp, "APP", "APP_packet_size.png")]
+            self.assertEqual(histogram["counts"].sum(), n)
+            self.assertEqual(list(figures[os.path.join(tmp, "APP", "APP_tcp_udp_ratio.png")]["counts"]), [n - 10, 10])
+            box = figures[os.path.join(tmp, "APP", "APP_inter_packet_time_boxplot.png")]["stats"]
+            self.assertEqual((box["med"], len(box["fliers"])), (0.001, 1))
+
+            TrafficVisualizer.plot_traffic_characteristics(df, "APP", tmp, max_points=500)
+            images = [name for name in os.listdir(os.path.join(tmp, "APP")) if name.endswith(".png")]
+            self.assertEqual(sorted(images), sorted(os.path.basename(p) for p in figures))
+
+    def test_graph_manifest(self):
+        """Test that only graphs whose inputs changed are redrawn, and that a dry run draws nothing."""
+        import tempfile
+        import numpy as np
+
+        df = pd.DataFrame({"timestamp": np.arange(200) * 0.01, "packet_size": np.arange(200) % 7 * 100.0 + 60,
+                           "inter_packet_time": np.full(200, 0.01), "transport": ["TCP"] * 150 + ["UDP"] * 50})
+        comparison = pd.DataFrame({"Application": ["A", "B"], "Avg_Packet_Size": [100.0, 200.0],
+                                   "TLS_Handshake_Count": [1, 2], "Flow_Size (Bytes)": [1000, 3000],
+                                   "Flow_Volume (Packets)": [10, 15], "Inter_Packet_Time_Mean": [0.1, 0.3]})
+        with tempfile.TemporaryDirectory() as tmp:
+            app_dir = os.path.join(tmp, "APP")
+            self.assertEqual(len(TrafficVisualizer.plot_traffic_characteristics(df, "APP", tmp)), 4)
+            self.assertEqual(TrafficVisualizer.plot_traffic_characteristics(df, "APP", tmp), [])
+
+            # New UDP packets only change the ratio chart; a dry run lists it without drawing it
+            df.loc[:10, "transport"] = "UDP"
+            ratio = os.path.join(app_dir, "APP_tcp_udp_ratio.png")
+            os.remove(ratio)
+            self.assertEqual(TrafficVisualizer.plot_traffic_characteristics(df, "APP", tmp, graphs="dry-run"), [ratio])
+            self.assertFalse(os.path.exists(ratio))
+            self.assertEqual(TrafficVisualizer.plot_traffic_characteristics(df, "APP", tmp), [ratio])
+            self.assertEqual(len(TrafficVisualizer.plot_traffic_characteristics(df, "APP", tmp, graphs="all")), 4)
+
+            compare_dir = os.path.join(tmp, "compare")
+            self.assertEqual(len(TrafficVisualizer.compare_dataframe(comparison, compare_dir)), 5)
+            comparison["TLS_Handshake_Count"] = [3, 2]
+            self.assertEqual(TrafficVisualizer.compare_dataframe(comparison, compare_dir),
+                             [os.path.join(compare_dir, "comparison_tls_handshake.png")])
+            self.assertEqual(GraphManifest.digest(comparison), GraphManifest.digest(comparison.copy()))
+
+    def test_benchmark_baseline_comparison(self):
+        """Test that the benchmark report flags metrics that got worse than the threshold, in their own direction."""
+        current = benchmark.summarize_times([0.2, 0.1, 0.3], items=1000, peak_bytes=3 << 20)
+        self.assertEqual((current["items_per_s"], current["latency_p50_s"], current["peak_mib"]), (5000.0, 0.2, 3.0))
+        self.assertIsNone(current["latency_p95_s"], "Tail percentiles of 3 runs are not reported")
+        many = benchmark.summarize_times([0.01] * 99 + [0.5], items=1, peak_bytes=0)
+        self.assertEqual((many["latency_p95_s"], many["latency_max_s"]), (0.01, 0.5))
+        self.assertIsNotNone(many["latency_p99_s"])
+
+        baseline = {"parse": {"items_per_s": 8000.0, "latency_p50_s": 0.19, "peak_mib": 3.0}}
+        report = benchmark.compare({"parse": current, "render": current}, baseline, threshold=0.25).set_index("metric")
+        self.assertEqual(len(report), 3)  # Benchmarks without a baseline are skipped
+        self.assertTrue(report.loc["items_per_s", "regression"])
+        self.assertFalse(report.loc["latency_p50_s", "regression"])
+        self.assertAlmostEqual(report.loc["items_per_s", "change"], -0.375)
+
+        df = pd.DataFrame({"timestamp": [5.0, 6.0, 9.0], "inter_packet_time": [0.0, 1.0, 3.0], "packet_size": [1, 2, 3]})
+        scaled = benchmark.scaled_packets(df, 100)
+        self.assertEqual(len(scaled), 100)
+        self.assertTrue(scaled["timestamp"].is_monotonic_increasing)
+
+    def test_synthetic_capture_ground_truth(self):
+        """Test that a generated capture parses into exactly the flows of its ground-truth table, with TLS hellos."""
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            capture = os.path.join(tmp, "synthetic.pcapng")
+            generator = TrafficGenerator(3000, 40, synthetic_profile(), concurrency=8, seed=3, chunk_packets=700)
+            summary = generator.write(capture)
+            truth = pd.read_csv(os.path.join(tmp, "synthetic_flows.csv"))
+            df = PacketAnalyzer(capture, backend="native", columns=ALL_COLUMNS).extract_features()
+
+        self.assertEqual(len(df), 3000)
+        self.assertEqual(summary["flows"], len(truth))
+        self.assertEqual(set(truth["PROTOCOL"]), {"TCP", "UDP"})
+        flows = FlowAggregator.aggregate(df)
+        flows[["SRC_PORT", "DST_PORT"]] = flows[["SRC_PORT", "DST_PORT"]].astype(int)
+        pd.testing.assert_frame_equal(flows[truth.columns], truth, check_dtype=False)
+
+        hellos = df[df["tls_handshake_type"].astype(str).isin(["1", "1.0", "2", "2.0"])]
+        self.assertEqual(len(hellos), 2 * (truth["PROTOCOL"] == "TCP").sum())
+        self.assertEqual(set(df.loc[df["tls_cipher_suite"] != "Unknown", "tls_cipher_suite"]), {"0x1302"})
+
+    def test_run_metrics_stages_and_export(self):
+        """Test that the parser reports its stages, and that worker metrics merge and export to JSON and Prometheus."""
+        import json
+        import tempfile
+        metrics = RunMetrics()
+        with tempfile.TemporaryDirectory() as tmp:
+            capture = os.path.join(tmp, "synthetic.pcapng")
+            TrafficGenerator(500, 10, synthetic_profile(), seed=1).write(capture)
+            df = PacketAnalyzer(capture, backend="native", metrics=metrics).extract_features()
+
+            stages = metrics.to_dict()["stages"]
+            self.assertEqual(stages["dissect"]["bytes"], os.path.getsize(capture))
+            self.assertEqual((stages["dissect"]["packets"], stages["extract"]["packets"], stages["clean"]["rows"]),
+                             (500, 500, 500))
+            self.assertEqual(stages["extract"]["bytes"], df["packet_size"].sum())
+            self.assertGreater(stages["write"]["bytes"], 0)
+
+            self.assertIn("wall_%", metrics.report().columns)
+            worker = RunMetrics()
+            with worker.stage("extract") as stage:
+                stage["packets"] = 7
+            worker.skip("extract", "AttributeError", 3)
+            worker.fail("RuntimeError")
+            self.assertEqual(list(worker.timed(range(3), "dissect")), [0, 1, 2])
+            metrics.merge(json.loads(json.dumps(worker.to_dict())))
+
+            self.assertNotIn("wall_%", metrics.report().columns, "Overlapping worker times have no share of the run")
+
+            json_path, prom_path = metrics.write(tmp)
+            with open(json_path) as f:
+                report = json.load(f)
+            with open(prom_path) as f:
+                prom = f.read()
+            self.assertNotEqual(worker.write(tmp)[0], json_path, "Runs started in the same second keep their reports")
+        self.assertEqual(report["stages"]["extract"]["calls"], 2)
+        self.assertEqual(report["stages"]["extract"]["packets"], 507)
+        self.assertEqual(report["stages"]["dissect"]["calls"], 4)
+        self.assertEqual(report["skipped"], {"extract": {"AttributeError": 3}})
+        self.assertIn('traffic_skipped_packets_total{stage="extract",error="AttributeError"} 3\n', prom)
+        self.assertIn('traffic_failed_captures_total{error="RuntimeError"} 1\n', prom)
+        self.assertIn('traffic_stage_packets_total{stage="extract"} 507\n', prom)
+        self.assertIn("# TYPE traffic_stage_wall_seconds_total counter", prom)
+
+    def test_tshark_field_selection(self):
+        """Test that the tshark backend only requests the fields of the wanted columns (without running TShark)."""
+        fields = TsharkFieldReader.fields_for(("timestamp", "packet_size", "flow_size"))
+        self.assertFalse([field for field in fields if field.startswith(("tls.", "tcp.seq", "tcp.flags"))])
+        self.assertIn("tls.handshake.type", TsharkFieldReader.fields_for(("tls_cipher_suite",)))
+        with patch("shutil.which", return_value="/usr/bin/tshark"):
+            self.assertIn("--disable-protocol", TsharkFieldReader("x.pcap", ("timestamp", "flow_size")).command())
+            self.assertNotIn("--disable-protocol", TsharkFieldReader("x.pcap", ("timestamp", "protocol")).command())
+
+        fields = TsharkFieldReader.fields_for(("tcp_flags",))
+        stream = io.BytesIO(b"1.5\t60\t10.0.0.1\t10.0.0.2\t5000\t443\t\t\t0x0018\n"
+                            b"2.5\t80\t10.0.0.1\t10.0.0.3\t\t\t6000\t53\t\n")
+        table = parse_fields(stream, fields)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table["tcp.srcport"].tolist()[0], "5000")
+        self.assertEqual(hex_to_int(table["tcp.flags"])[0], 24)
+        self.assertTrue(pd.isna(hex_to_int(table["tcp.flags"])[1]))
+
 if __name__ == '__main__':
     unittest.main()